@@ -0,0 +1,324 @@
+# Copyright (c) 2025, K. Ronoh and contributors
+# For license information, please see license.txt
+
+"""Columnar snapshot of ESG Metric Entries and the ESG Emission Ledger.
+
+A nightly job streams both tables out of MariaDB into
+`<site>/private/esg_snapshot`, partitioned by company and year. Every column
+is a `.npy` file that can be memory-mapped; string columns are dictionary
+encoded as int32 codes with a JSON list of values next to them. The new
+snapshot is built beside the old one and swapped in with a rename.
+
+Entries that `entry_archive` moved out of the database are read back from their
+archive files into the `entries` partitions, so the snapshot keeps every year.
+
+`aggregate` groups a value column over any partitions without touching the
+database, so long-range analyses can run off the snapshot.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from itertools import chain, groupby, islice
+
+import frappe
+import numpy as np
+from frappe.utils import cstr, getdate, now_datetime
+
+from esg_compliance.entry_archive import read_archive
+
+SNAPSHOT_DIR = "esg_snapshot"
+MANIFEST = "manifest.json"
+
+# Rows converted to column arrays at a time, so a partition is never held as row dicts
+CHUNK_SIZE = 50000
+
+# column: kind, where kind is "str" (dictionary encoded), "date", "float" or "int"
+TABLES = {
+	"entries": {
+		"query": """
+			SELECT company, YEAR(reporting_period) as year, metric, reporting_period, value,
+				source_doctype, party_type, party, performance, verification_status, data_source, is_anomalous
+			FROM `tabESG Metric Entry`
+			WHERE reporting_period IS NOT NULL
+			ORDER BY company, year
+		""",
+		"columns": {
+			"metric": "str",
+			"reporting_period": "date",
+			"value": "float",
+			"source_doctype": "str",
+			"party_type": "str",
+			"party": "str",
+			"performance": "str",
+			"verification_status": "str",
+			"data_source": "str",
+			"is_anomalous": "int",
+		},
+	},
+	"ledger": {
+		"query": """
+			SELECT company, YEAR(posting_date) as year, posting_date, voucher_type, voucher_no,
+				carbon_scope, emission_source, emissions_kg_co2e
+			FROM `tabESG Emission Ledger`
+			WHERE is_cancelled = 0
+			ORDER BY company, year
+		""",
+		"columns": {
+			"posting_date": "date",
+			"voucher_type": "str",
+			"voucher_no": "str",
+			"carbon_scope": "str",
+			"emission_source": "str",
+			"emissions_kg_co2e": "float",
+		},
+	},
+}
+
+
+def get_snapshot_path(*parts):
+	return frappe.get_site_path("private", SNAPSHOT_DIR, *parts)
+
+
+def get_partition_dir(table, company, year):
+	digest = hashlib.md5(cstr(company).encode()).hexdigest()[:8]
+	return os.path.join(table, f"company={frappe.scrub(cstr(company)) or 'none'}-{digest}", f"year={year}")
+
+
+def build_snapshot():
+	"""Nightly: rebuild every table of the snapshot and swap it in atomically"""
+	target = get_snapshot_path()
+	staging = f"{target}.{frappe.generate_hash(length=8)}"
+	os.makedirs(staging)
+
+	try:
+		partitions = []
+		for table, spec in TABLES.items():
+			archived = get_archived_partitions() if table == "entries" else {}
+			partitions += write_table(staging, table, spec, archived)
+
+		manifest = {"built_on": str(now_datetime()), "partitions": partitions}
+		with open(os.path.join(staging, MANIFEST), "w") as f:
+			json.dump(manifest, f, indent=1)
+
+		previous = f"{target}.old"
+		if os.path.exists(target):
+			os.rename(target, previous)
+		os.rename(staging, target)
+		shutil.rmtree(previous, ignore_errors=True)
+	except Exception:
+		shutil.rmtree(staging, ignore_errors=True)
+		frappe.log_error(title="ESG Analytics Snapshot Failed")
+		raise
+
+
+def get_archived_partitions():
+	"""{(company, year): [ESG Entry Archive]} for the entries no longer in the database"""
+	partitions = {}
+	for archive in frappe.get_all(
+		"ESG Entry Archive",
+		filters={"entry_count": [">", 0]},
+		fields=["name", "company", "month", "file_path"],
+		order_by="month asc",
+	):
+		partitions.setdefault((archive.company or "", getdate(archive.month).year), []).append(archive)
+
+	return partitions
+
+
+def read_archives(archives):
+	for archive in archives:
+		yield from read_archive(archive)
+
+
+def write_table(root, table, spec, archived=None):
+	"""Stream the table from an unbuffered cursor and write one partition per (company, year).
+
+	`archived` maps (company, year) to archives whose entries are appended to that partition.
+	"""
+	archived = dict(archived or {})
+	partitions = []
+
+	def write(company, year, rows):
+		path = get_partition_dir(table, company, year)
+		rows = chain(rows, read_archives(archived.pop((company, year), [])))
+		count = write_partition(os.path.join(root, path), spec["columns"], rows)
+		partitions.append({"table": table, "company": company, "year": year, "path": path, "rows": count})
+
+	with frappe.db.unbuffered_cursor():
+		rows = frappe.db.sql(spec["query"], as_dict=True, as_iterator=True)
+		for (company, year), group in groupby(rows, key=lambda row: (row.company or "", row.year)):
+			write(company, year, group)
+
+	# Years whose entries are all archived
+	for company, year in sorted(archived):
+		write(company, year, [])
+
+	return partitions
+
+
+def write_partition(path, columns, rows):
+	"""Write one `.npy` file per column, converting `rows` to arrays CHUNK_SIZE rows at a time"""
+	os.makedirs(path)
+	chunks = {column: [] for column in columns}
+	dictionaries = {column: {} for column, kind in columns.items() if kind == "str"}
+	count = 0
+	while chunk := list(islice(rows, CHUNK_SIZE)):
+		count += len(chunk)
+		for column, kind in columns.items():
+			chunks[column].append(to_array([row[column] for row in chunk], kind, dictionaries.get(column)))
+
+	for column, kind in columns.items():
+		array = np.concatenate(chunks.pop(column))
+		if kind == "str":
+			array, dictionary = sort_dictionary(array, dictionaries[column])
+			with open(os.path.join(path, f"{column}.dict.json"), "w") as f:
+				json.dump(dictionary, f)
+		np.save(os.path.join(path, f"{column}.npy"), array)
+
+	return count
+
+
+def to_array(values, kind, dictionary=None):
+	"""Column array of one chunk; strings are coded in order of first appearance in `dictionary`"""
+	if kind == "str":
+		return np.array([dictionary.setdefault(cstr(v), len(dictionary)) for v in values], dtype=np.int32)
+	if kind == "date":
+		return np.array(values, dtype="datetime64[D]")
+	if kind == "float":
+		return np.array(values, dtype=np.float64)
+	return np.array([v or 0 for v in values], dtype=np.int64)
+
+
+def sort_dictionary(codes, dictionary):
+	"""Renumber codes into a sorted dictionary; empty values share the code of ""."""
+	values = list(dictionary)
+	order = np.argsort(np.array(values, dtype=object), kind="stable")
+	remap = np.empty(len(values), dtype=np.int32)
+	remap[order] = np.arange(len(values), dtype=np.int32)
+	return remap[codes], [values[i] for i in order]
+
+
+def get_manifest():
+	path = get_snapshot_path(MANIFEST)
+	if not os.path.exists(path):
+		return None
+	with open(path) as f:
+		return json.load(f)
+
+
+def snapshot_available():
+	return get_manifest() is not None
+
+
+def get_partitions(table, companies=None, from_year=None, to_year=None):
+	manifest = get_manifest() or {"partitions": []}
+	companies = set(companies) if companies else None
+	return [
+		p
+		for p in manifest["partitions"]
+		if p["table"] == table
+		and (companies is None or p["company"] in companies)
+		and (from_year is None or p["year"] >= from_year)
+		and (to_year is None or p["year"] <= to_year)
+	]
+
+
+def load_column(partition, column):
+	"""Memory-mapped array of a column, with the dictionary for string columns"""
+	path = get_snapshot_path(partition["path"])
+	array = np.load(os.path.join(path, f"{column}.npy"), mmap_mode="r")
+	dictionary_path = os.path.join(path, f"{column}.dict.json")
+	if os.path.exists(dictionary_path):
+		with open(dictionary_path) as f:
+			return array, json.load(f)
+	return array, None
+
+
+def aggregate(
+	table,
+	value_column,
+	group_by=(),
+	date_column=None,
+	from_date=None,
+	to_date=None,
+	companies=None,
+	where=None,
+	distinct=None,
+):
+	"""Sum `value_column` per group over the snapshot.
+
+	`group_by` may include "company" and any string column. `where` maps string
+	columns to an allowed value. With `distinct`, a string column or a tuple of
+	them, the number of distinct values (or value combinations) per group is
+	returned as well. Returns
+	{group tuple: {"sum": float, "count": int[, "distinct": int]}}.
+	"""
+	from_date, to_date = from_date and getdate(from_date), to_date and getdate(to_date)
+	partitions = get_partitions(
+		table, companies, from_date.year if from_date else None, to_date.year if to_date else None
+	)
+
+	results, distinct_values = {}, {}
+	distinct_names = (distinct,) if isinstance(distinct, str) else tuple(distinct or ())
+	for partition in partitions:
+		values, _dictionary = load_column(partition, value_column)
+		mask = np.ones(len(values), dtype=bool)
+		if date_column and (from_date or to_date):
+			dates, _dictionary = load_column(partition, date_column)
+			if from_date:
+				mask &= dates >= np.datetime64(from_date, "D")
+			if to_date:
+				mask &= dates <= np.datetime64(to_date, "D")
+
+		for column, allowed in (where or {}).items():
+			codes, dictionary = load_column(partition, column)
+			code = dictionary.index(allowed) if allowed in dictionary else -1
+			mask &= codes == code
+
+		if not mask.any():
+			continue
+
+		keys = []
+		for column in group_by:
+			if column == "company":
+				keys.append(np.zeros(len(values), dtype=np.int32)[mask])
+				continue
+			codes, _dictionary = load_column(partition, column)
+			keys.append(np.asarray(codes)[mask])
+
+		dictionaries = [
+			[partition["company"]] if column == "company" else load_column(partition, column)[1]
+			for column in group_by
+		]
+		if keys:
+			combined, inverse = np.unique(np.stack(keys, axis=1), axis=0, return_inverse=True)
+			inverse = inverse.reshape(-1)
+		else:
+			combined, inverse = np.zeros((1, 0), dtype=np.int32), np.zeros(int(mask.sum()), dtype=np.int64)
+
+		sums = np.bincount(inverse, weights=np.asarray(values)[mask], minlength=len(combined))
+		counts = np.bincount(inverse, minlength=len(combined))
+		if distinct:
+			distinct_columns = [load_column(partition, column) for column in distinct_names]
+			distinct_codes = np.stack(
+				[np.asarray(codes)[mask] for codes, _dictionary in distinct_columns], axis=1
+			)
+
+		for index, key_codes in enumerate(combined):
+			key = tuple(dictionaries[i][code] for i, code in enumerate(key_codes))
+			result = results.setdefault(key, {"sum": 0.0, "count": 0})
+			result["sum"] += float(sums[index])
+			result["count"] += int(counts[index])
+			if distinct:
+				seen = distinct_values.setdefault(key, set())
+				seen.update(
+					tuple(distinct_columns[i][1][c] for i, c in enumerate(codes))
+					for codes in np.unique(distinct_codes[inverse == index], axis=0)
+				)
+
+	for key, seen in distinct_values.items():
+		results[key]["distinct"] = len(seen)
+
+	return results
@@ -0,0 +1,220 @@
+# Copyright (c) 2025, K. Ronoh and contributors
+# For license information, please see license.txt
+
+"""Anomaly detection for ESG Metric Entry values.
+
+New entries are compared with the median of the preceding HISTORY_WINDOW
+entries of the same company, metric and party. An entry is flagged when its
+robust z-score (median / MAD) exceeds Z_THRESHOLD, or when it is a factor of
+UNIT_SCALE_RATIO or more away from the median, which is what a kg / tonne mix
+up looks like.
+
+All groups are evaluated in one vectorized pass: values are laid out in a
+single NumPy array with HISTORY_WINDOW NaNs between groups, so the trailing
+window of any entry never reaches into another group.
+"""
+
+import warnings
+
+import frappe
+import numpy as np
+from frappe.utils import add_to_date, get_datetime, now_datetime
+from numpy.lib.stride_tricks import sliding_window_view
+
+from esg_compliance.period_close import REVERSAL_DATA_SOURCE
+
+WATERMARK_KEY = "esg_anomaly_watermark"
+WATERMARK_OVERLAP_MINUTES = 10
+
+HISTORY_WINDOW = 24
+MIN_HISTORY = 8
+Z_THRESHOLD = 3.5
+
+# Lower bound on the MAD relative to the median, so short, tight histories do not
+# turn ordinary noise into outliers
+MIN_RELATIVE_MAD = 0.02
+UNIT_SCALE_RATIO = 500
+
+# Groups evaluated per query, to bound memory on the first run
+GROUP_BATCH_SIZE = 500
+
+
+def detect_anomalies():
+	"""Scheduled job: evaluate entries created since the last run"""
+	started = now_datetime()
+	watermark = frappe.db.get_global(WATERMARK_KEY)
+	since = add_to_date(get_datetime(watermark), minutes=-WATERMARK_OVERLAP_MINUTES) if watermark else None
+
+	groups = get_new_entry_groups(since)
+	flagged = 0
+	for i in range(0, len(groups), GROUP_BATCH_SIZE):
+		rows = load_group_values(groups[i : i + GROUP_BATCH_SIZE])
+		flagged += save_anomalies(find_anomalies(rows, since))
+		frappe.db.commit()
+
+	frappe.db.set_global(WATERMARK_KEY, str(started))
+	frappe.db.commit()
+	return flagged
+
+
+def get_new_entry_groups(since):
+	condition = "creation >= %(since)s" if since else "1 = 1"
+	return frappe.db.sql(
+		f"""
+		SELECT DISTINCT IFNULL(company, ''), metric, IFNULL(party, '')
+		FROM `tabESG Metric Entry`
+		WHERE {condition} AND value IS NOT NULL AND IFNULL(data_source, '') != %(reversal)s
+		""",
+		{"since": since, "reversal": REVERSAL_DATA_SOURCE},
+	)
+
+
+def load_group_values(groups):
+	"""Entries of the given groups, ordered by group and period.
+
+	Reversals of closed-period entries are left out. They are bookkeeping
+	offsets, not measurements, so they are neither scored nor part of any history.
+	"""
+	return frappe.db.sql(
+		"""
+		SELECT name, IFNULL(company, '') as company, metric, IFNULL(party, '') as party,
+			reporting_period, value, creation
+		FROM `tabESG Metric Entry`
+		WHERE (IFNULL(company, ''), metric, IFNULL(party, '')) IN %(groups)s AND value IS NOT NULL
+			AND IFNULL(data_source, '') != %(reversal)s
+		ORDER BY company, metric, party, reporting_period, creation
+		""",
+		{"groups": tuple(tuple(g) for g in groups), "reversal": REVERSAL_DATA_SOURCE},
+		as_dict=True,
+	)
+
+
+def find_anomalies(rows, since=None):
+	"""Score entries created since `since` (all entries if None) against their group history"""
+	if not rows:
+		return []
+
+	values = np.array([row.value for row in rows], dtype=float)
+	keys = [(row.company, row.metric, row.party) for row in rows]
+	group_index = np.cumsum([i > 0 and keys[i] != keys[i - 1] for i in range(len(keys))])
+
+	# Offset every group by HISTORY_WINDOW NaNs so windows stay inside their group
+	offsets = np.arange(len(rows)) + HISTORY_WINDOW * (group_index + 1)
+	padded = np.full(len(rows) + HISTORY_WINDOW * (group_index[-1] + 1), np.nan)
+	padded[offsets] = values
+
+	since = get_datetime(since) if since else None
+	new = np.array([since is None or get_datetime(row.creation) >= since for row in rows])
+	if not new.any():
+		return []
+
+	# Window of the HISTORY_WINDOW values preceding each new entry
+	windows = sliding_window_view(padded, HISTORY_WINDOW)[offsets[new] - HISTORY_WINDOW]
+	current = values[new]
+
+	with warnings.catch_warnings(), np.errstate(all="ignore"):
+		warnings.simplefilter("ignore", RuntimeWarning)
+		history = np.sum(~np.isnan(windows), axis=1)
+		median = np.nanmedian(windows, axis=1)
+		mad = np.nanmedian(np.abs(windows - median[:, None]), axis=1)
+		# Fall back to the mean absolute deviation when more than half the values are equal
+		mad = np.where(mad > 0, mad, np.nanmean(np.abs(windows - median[:, None]), axis=1) * 0.7979)
+		mad = np.maximum(mad, np.abs(median) * MIN_RELATIVE_MAD)
+		score = np.where(mad > 0, 0.6745 * (current - median) / mad, 0)
+		ratio = np.abs(current / median)
+
+	unit_scale = (
+		(median != 0) & (current != 0) & ((ratio >= UNIT_SCALE_RATIO) | (ratio <= 1 / UNIT_SCALE_RATIO))
+	)
+	outlier = np.abs(score) > Z_THRESHOLD
+	flagged = (history >= MIN_HISTORY) & (unit_scale | outlier)
+
+	new_rows = [row for row, is_new in zip(rows, new, strict=True) if is_new]
+	return [
+		frappe._dict(
+			row,
+			reason="Unit Scale" if unit_scale[i] else "Outlier",
+			expected_value=float(median[i]),
+			deviation_score=float(np.round(score[i], 2)),
+		)
+		for i, row in enumerate(new_rows)
+		if flagged[i]
+	]
+
+
+def save_anomalies(anomalies):
+	"""Insert anomalies not recorded yet and flag their entries"""
+	if not anomalies:
+		return 0
+
+	names = [a.name for a in anomalies]
+	existing = set(
+		frappe.get_all("ESG Anomaly", filters={"metric_entry": ["in", names]}, pluck="metric_entry")
+	)
+	anomalies = [a for a in anomalies if a.name not in existing]
+	if not anomalies:
+		return 0
+
+	now, user = now_datetime(), frappe.session.user
+	frappe.db.bulk_insert(
+		"ESG Anomaly",
+		fields=[
+			"name",
+			"creation",
+			"modified",
+			"owner",
+			"modified_by",
+			"metric_entry",
+			"company",
+			"metric",
+			"party",
+			"reporting_period",
+			"reason",
+			"value",
+			"expected_value",
+			"deviation_score",
+			"status",
+			"detected_on",
+		],
+		values=[
+			(
+				frappe.generate_hash(length=10),
+				now,
+				now,
+				user,
+				user,
+				a.name,
+				a.company or None,
+				a.metric,
+				a.party,
+				a.reporting_period,
+				a.reason,
+				a.value,
+				a.expected_value,
+				a.deviation_score,
+				"Open",
+				now,
+			)
+			for a in anomalies
+		],
+	)
+
+	frappe.db.sql(
+		"UPDATE `tabESG Metric Entry` SET is_anomalous = 1 WHERE name IN %(names)s",
+		{"names": tuple(a.name for a in anomalies)},
+	)
+	return len(anomalies)
+
+
+def sync_entry_flag(doc, method=None):
+	"""on_update / on_trash hook for ESG Anomaly: keep the entry flag in step with open anomalies"""
+	if not doc.metric_entry:
+		return
+
+	flagged = frappe.db.exists(
+		"ESG Anomaly",
+		{"metric_entry": doc.metric_entry, "status": ["!=", "Dismissed"], "name": ["!=", doc.name]},
+	) or (method != "on_trash" and doc.status != "Dismissed")
+	frappe.db.set_value(
+		"ESG Metric Entry", doc.metric_entry, "is_anomalous", 1 if flagged else 0, update_modified=False
+	)
@@ -1,6 +1,8 @@
 import frappe
 from frappe.utils import getdate, nowtime, add_days
 
+from esg_compliance.period_close import is_period_closed, reverse_entry
+
 def create_esg_metric_entry(doc, method):
     if not doc.custom_total_carbon_emissions_kg_co2e:
         return
@@ -52,13 +54,18 @@ def delete_esg_metric_entry(doc, method):
     # Find and delete linked ESG entries
     esg_entries = frappe.get_all("ESG Metric Entry",
         filters={
-            "source_doctype": "Sales Invoice",
+            "source_doctype": doc.doctype,
             "source_document": doc.name
-        }
+        },
+        fields=["name", "company", "reporting_period"]
     )
     
     for entry in esg_entries:
-        frappe.delete_doc("ESG Metric Entry", entry.name, ignore_permissions=True)
+        # Closed periods are frozen: offset the entry in the next open period instead
+        if is_period_closed(entry.company, entry.reporting_period):
+            reverse_entry(entry.name)
+        else:
+            frappe.delete_doc("ESG Metric Entry", entry.name, ignore_permissions=True)
     
     frappe.db.commit()
 
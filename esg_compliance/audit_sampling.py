@@ -0,0 +1,242 @@
+# Copyright (c) 2025, K. Ronoh and contributors
+# For license information, please see license.txt
+
+"""Statistical sampling of ESG Metric Entries for an ESG Audit.
+
+Entries in the audit scope are streamed from the database in primary key order
+and fed through reservoir samplers, so memory is bounded by the sample size:
+
+- Stratified Random: the sample is split over metrics in proportion to their
+  entry counts, and every metric keeps its own uniform reservoir (Algorithm R).
+- Monetary Unit (kg CO2e): one weighted reservoir (Efraimidis-Spirakis A-Res)
+  where the chance of selection is proportional to the entry value.
+
+Both samplers draw from a `random.Random` seeded from the audit, so drawing
+again with the same seed and scope reproduces the sample.
+
+Archived entries are not in the database and cannot be linked from an audit,
+so a scope that covers an archived period is refused until it is restored.
+"""
+
+import heapq
+import math
+import random
+
+import frappe
+from frappe import _
+from frappe.utils import cint, flt, get_first_day, getdate
+
+from esg_compliance.utils import get_metric_entry_keys
+
+STRATIFIED = "Stratified Random"
+MONETARY_UNIT = "Monetary Unit (kg CO2e)"
+
+
+@frappe.whitelist()
+def draw_audit_sample(audit):
+	"""Draw a sample for the audit scope and attach it to the audit"""
+	doc = frappe.get_doc("ESG Audit", audit)
+	doc.check_permission("write")
+	if doc.docstatus != 0:
+		frappe.throw(_("Samples can only be drawn for draft audits"))
+
+	if not (doc.sample_from_date and doc.sample_to_date):
+		frappe.throw(_("Set the Sample From Date and Sample To Date first"))
+	if getdate(doc.sample_from_date) > getdate(doc.sample_to_date):
+		frappe.throw(_("Sample From Date cannot be greater than Sample To Date"))
+	validate_not_archived(doc.company, doc.sample_from_date, doc.sample_to_date)
+
+	if not doc.sample_seed:
+		doc.sample_seed = random.SystemRandom().randint(1, 2**31 - 1)
+
+	metrics = [d.metric for d in doc.metrics_under_review if d.metric]
+	sample = draw_sample(
+		company=doc.company,
+		metrics=metrics,
+		from_date=doc.sample_from_date,
+		to_date=doc.sample_to_date,
+		size=cint(doc.sample_size) or 25,
+		method=doc.sampling_method or STRATIFIED,
+		seed=doc.sample_seed,
+	)
+
+	doc.set("sampled_entries", [])
+	for row in sample:
+		doc.append(
+			"sampled_entries",
+			{
+				"metric_entry": row.name,
+				"metric": row.metric,
+				"stratum": row.stratum,
+				"reporting_period": row.reporting_period,
+				"value": row.value,
+				"selection_weight": row.weight,
+			},
+		)
+
+	doc.save()
+	return {"sampled": len(sample), "seed": doc.sample_seed}
+
+
+def validate_not_archived(company, from_date, to_date):
+	filters = {"month": ["between", [get_first_day(from_date), getdate(to_date)]]}
+	if company:
+		filters["company"] = company
+
+	archives = frappe.get_all("ESG Entry Archive", filters=filters, pluck="name", order_by="month asc")
+	if archives:
+		frappe.throw(
+			_(
+				"Entries of the sample period are archived in {0}. Restore them before drawing a sample."
+			).format(", ".join(archives))
+		)
+
+
+def draw_sample(company, metrics, from_date, to_date, size, method=STRATIFIED, seed=None):
+	"""Return the sampled entries, ordered by metric and entry name"""
+	rng = random.Random(seed)
+	conditions, params = get_scope_conditions(company, metrics, from_date, to_date)
+
+	if method == MONETARY_UNIT:
+		sample = monetary_unit_sample(stream_entries(conditions, params), size, rng)
+	else:
+		allocation = allocate_strata(get_stratum_sizes(conditions, params), size)
+		sample = stratified_sample(stream_entries(conditions, params), allocation, rng)
+
+	return sorted(sample, key=lambda row: (row.metric, row.name))
+
+
+def get_scope_conditions(company, metrics, from_date, to_date):
+	conditions = ["reporting_period BETWEEN %(from_date)s AND %(to_date)s"]
+	params = {"from_date": getdate(from_date), "to_date": getdate(to_date)}
+
+	if company:
+		conditions.append("company = %(company)s")
+		params["company"] = company
+
+	if metrics:
+		params["metrics"] = tuple(set(get_metric_entry_keys(metrics)) | set(metrics))
+		conditions.append("metric IN %(metrics)s")
+
+	return " AND ".join(conditions), params
+
+
+def get_stratum_sizes(conditions, params):
+	return dict(
+		frappe.db.sql(
+			f"""
+			SELECT metric, COUNT(*)
+			FROM `tabESG Metric Entry`
+			WHERE {conditions}
+			GROUP BY metric
+			""",
+			params,
+		)
+	)
+
+
+def allocate_strata(sizes, total):
+	"""Allocate exactly `total` samples (or the whole population) over strata.
+
+	Every non-empty stratum gets one sample while `total` allows it, otherwise
+	only the largest strata do. The rest is shared in proportion to stratum size
+	by largest remainder, so rounding never pushes the sample past `total`.
+	"""
+	sizes = {stratum: count for stratum, count in sizes.items() if count > 0}
+	total = min(cint(total), sum(sizes.values()))
+	if total <= 0:
+		return {}
+
+	by_size = sorted(sizes, key=lambda stratum: sizes[stratum], reverse=True)
+	if total < len(sizes):
+		return dict.fromkeys(by_size[:total], 1)
+
+	allocation = dict.fromkeys(sizes, 1)
+	rest, spare = total - len(sizes), sum(sizes.values()) - len(sizes)
+	if not rest:
+		return allocation
+
+	quotas = {stratum: rest * (sizes[stratum] - 1) / spare for stratum in by_size}
+	for stratum, quota in quotas.items():
+		allocation[stratum] += math.floor(quota)
+
+	remaining = rest - sum(math.floor(quota) for quota in quotas.values())
+	by_remainder = sorted(quotas, key=lambda stratum: quotas[stratum] % 1, reverse=True)
+	for stratum in by_remainder[:remaining]:
+		allocation[stratum] += 1
+
+	return allocation
+
+
+def stream_entries(conditions, params):
+	"""Yield entries in the scope one at a time from an unbuffered cursor, in primary key order"""
+	with frappe.db.unbuffered_cursor():
+		yield from frappe.db.sql(
+			f"""
+			SELECT name, metric, company, reporting_period, value
+			FROM `tabESG Metric Entry`
+			WHERE {conditions}
+			ORDER BY name
+			""",
+			params,
+			as_dict=True,
+			as_iterator=True,
+		)
+
+
+def stratified_sample(entries, allocation, rng):
+	"""Uniform reservoir per stratum (Algorithm R)"""
+	reservoirs = {stratum: [] for stratum in allocation}
+	seen = dict.fromkeys(allocation, 0)
+
+	for entry in entries:
+		stratum = entry.metric
+		if stratum not in reservoirs:
+			continue
+
+		seen[stratum] += 1
+		reservoir, size = reservoirs[stratum], allocation[stratum]
+		if len(reservoir) < size:
+			reservoir.append(entry)
+		else:
+			j = rng.randrange(seen[stratum])
+			if j < size:
+				reservoir[j] = entry
+
+	sample = []
+	for stratum, reservoir in reservoirs.items():
+		for entry in reservoir:
+			entry.stratum = stratum
+			entry.weight = flt(seen[stratum] / len(reservoir), 6)
+			sample.append(entry)
+
+	return sample
+
+
+def monetary_unit_sample(entries, size, rng):
+	"""Weighted reservoir (A-Res): keep the `size` entries with the largest u ** (1 / weight).
+
+	The key is compared as log(u) / weight, which orders the same way without
+	underflowing for large weights.
+	"""
+	heap = []
+	total = 0.0
+	for idx, entry in enumerate(entries):
+		weight = abs(flt(entry.value))
+		if not weight:
+			continue
+
+		total += weight
+		key = math.log(1.0 - rng.random()) / weight
+		if len(heap) < size:
+			heapq.heappush(heap, (key, idx, entry))
+		elif key > heap[0][0]:
+			heapq.heapreplace(heap, (key, idx, entry))
+
+	sample = []
+	for _key, _idx, entry in heap:
+		entry.stratum = MONETARY_UNIT
+		entry.weight = flt(abs(flt(entry.value)) / total, 6) if total else 0
+		sample.append(entry)
+
+	return sample
@@ -0,0 +1,127 @@
+# Copyright (c) 2025, K. Ronoh and contributors
+# For license information, please see license.txt
+
+import hashlib
+import json
+
+import frappe
+from frappe.utils import cstr
+
+# Redis keys of the ESG data generation counters. A write bumps the counter of
+# its scope, which orphans the cached results computed from older data in it:
+# the global counter for configuration (metrics, policies, dashboards), the
+# company counter for that company's data. Every company write also bumps the
+# "any company" counter, which results spanning all companies are keyed by.
+GENERATION_KEY = "esg_compliance:generation"
+COMPANY_GENERATION_KEY = "esg_compliance:generation:company:{0}"
+ANY_COMPANY_GENERATION_KEY = "esg_compliance:generation:any_company"
+
+# Doctypes whose writes only affect the data of the document's company
+COMPANY_SCOPED_DOCTYPES = ("ESG Metric Entry", "ESG Initiative")
+
+REPORT_CACHE_TTL = 15 * 60
+
+
+def get_generation(company=None):
+	"""Return the generations a result for `company` (or all companies) depends on"""
+	cache = frappe.cache()
+	scope_key = COMPANY_GENERATION_KEY.format(company) if company else ANY_COMPANY_GENERATION_KEY
+	return [int(cache.get(cache.make_key(key)) or 0) for key in (GENERATION_KEY, scope_key)]
+
+
+def bump_generation(company=None):
+	"""Advance the ESG data generation of a company, or of everything when no company is given.
+
+	Pass "" for data that has no company; it only affects results spanning all companies.
+	"""
+	cache = frappe.cache()
+	if company is None:
+		return cache.incr(cache.make_key(GENERATION_KEY))
+
+	if company:
+		cache.incr(cache.make_key(COMPANY_GENERATION_KEY.format(company)))
+	return cache.incr(cache.make_key(ANY_COMPANY_GENERATION_KEY))
+
+
+def get_affected_companies(doc):
+	"""Companies whose data a write of `doc` changes, or None when it affects every company"""
+	if not doc or doc.doctype not in COMPANY_SCOPED_DOCTYPES:
+		return None
+
+	companies = {doc.get("company") or ""}
+	before = doc.get_doc_before_save()
+	if before:
+		companies.add(before.get("company") or "")
+	return companies
+
+
+def invalidate(doc=None, method=None, company=None):
+	"""Document event hook for ESG data writes.
+
+	Entries and initiatives bump the generation of their company only; other
+	documents, or a call without a document or company, bump every scope. The
+	generation is bumped immediately and again once the transaction commits,
+	so a report that read the old rows between the write and the commit can never
+	be cached under the new generation.
+	"""
+	companies = {company} if company is not None else get_affected_companies(doc)
+	for scope in companies or [None]:
+		bump_generation(scope)
+		frappe.db.after_commit.add(lambda scope=scope: bump_generation(scope))
+
+
+def normalize_filters(filters):
+	"""Return a canonical, JSON-serialisable form of report filters"""
+	normalized = {}
+	for key, value in (filters or {}).items():
+		if value in (None, "", [], {}):
+			continue
+		if isinstance(value, (list, tuple)):
+			value = [cstr(v) for v in value]
+		else:
+			value = cstr(value)
+		normalized[key] = value
+
+	return normalized
+
+
+def get_permission_scope(user=None):
+	"""Describe what the user is allowed to see, for use in cache keys"""
+	user = user or frappe.session.user
+	user_permissions = frappe.permissions.get_user_permissions(user)
+
+	return {
+		"roles": sorted(frappe.get_roles(user)),
+		"company": sorted(d.get("doc") for d in user_permissions.get("Company", [])),
+	}
+
+
+def make_cache_key(namespace, filters, user=None):
+	payload = json.dumps(
+		{
+			"filters": normalize_filters(filters),
+			"scope": get_permission_scope(user),
+			"generation": get_generation(cstr(filters.get("company")) if filters else None),
+		},
+		sort_keys=True,
+	)
+	digest = hashlib.sha1(payload.encode()).hexdigest()
+	return f"esg_compliance:{frappe.scrub(namespace)}:{digest}"
+
+
+def get_cached_result(namespace, filters, compute, ttl=REPORT_CACHE_TTL, user=None):
+	"""Return `compute()` for the given filters, served from Redis when possible.
+
+	Results are keyed by the normalized filters, the user's permission scope and
+	the ESG data generation of the filtered company (or of all companies), so a
+	write to ESG data never serves a stale result.
+	"""
+	key = make_cache_key(namespace, filters, user=user)
+	cache = frappe.cache()
+
+	result = cache.get_value(key)
+	if result is None:
+		result = compute()
+		cache.set_value(key, result, expires_in_sec=ttl)
+
+	return result
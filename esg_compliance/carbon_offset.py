@@ -0,0 +1,125 @@
+# Copyright (c) 2025, K. Ronoh and contributors
+# For license information, please see license.txt
+
+"""Carbon offset pricing for Sales Invoices.
+
+Prices per tonne CO2e come from `ESG Carbon Offset Price`, effective dated per
+offset type and optionally per company; a company specific price wins over a
+price for all companies. The table is compiled into sorted date lists in Redis
+and applied on Sales Invoice validate, so invoices created through the API get
+the same offset cost as those entered in the form.
+
+When a price changes, draft invoices are repriced in one UPDATE.
+"""
+
+from bisect import bisect_right
+
+import frappe
+from frappe.utils import flt, getdate
+
+PRICES_KEY = "esg_compliance:carbon_offset_prices"
+
+# Used when no price is configured for the offset type and date
+DEFAULT_PRICE_PER_TONNE = 25
+
+OFFSET_TYPES = ("Optional", "Mandatory")
+
+
+def get_offset_prices():
+	"""{(offset_type, company): (effective dates, prices)}, both sorted by date"""
+	return frappe.cache().get_value(PRICES_KEY, generator=load_offset_prices)
+
+
+def load_offset_prices():
+	prices = {}
+	for row in frappe.get_all(
+		"ESG Carbon Offset Price",
+		fields=["offset_type", "company", "effective_from", "price_per_tonne"],
+		order_by="effective_from asc",
+	):
+		dates, values = prices.setdefault((row.offset_type, row.company or ""), ([], []))
+		dates.append(getdate(row.effective_from))
+		values.append(flt(row.price_per_tonne))
+	return prices
+
+
+def clear_offset_prices(doc=None, method=None):
+	frappe.cache().delete_value(PRICES_KEY)
+
+
+def get_offset_price(offset_type, posting_date, company=None):
+	posting_date = getdate(posting_date)
+	prices = get_offset_prices()
+	for key in ((offset_type, company or ""), (offset_type, "")):
+		if key not in prices:
+			continue
+		dates, values = prices[key]
+		index = bisect_right(dates, posting_date)
+		if index:
+			return values[index - 1]
+
+	return DEFAULT_PRICE_PER_TONNE
+
+
+def get_offset_type(customer):
+	preference = customer and frappe.get_cached_value("Customer", customer, "custom_carbon_offset_preference")
+	return preference if preference in OFFSET_TYPES else "Optional"
+
+
+def set_offset_cost(doc, method=None):
+	"""validate hook for Sales Invoice"""
+	offset_type = get_offset_type(doc.customer)
+	if offset_type == "Mandatory":
+		doc.custom_carbon_offset_required = 1
+
+	if not doc.custom_carbon_offset_required:
+		doc.custom_carbon_offset_cost = 0
+		return
+
+	tonnes = flt(doc.custom_total_carbon_emissions_kg_co2e) / 1000
+	price = get_offset_price(offset_type, doc.posting_date or getdate(), doc.company)
+	doc.custom_carbon_offset_cost = flt(tonnes * price, doc.precision("custom_carbon_offset_cost"))
+
+
+@frappe.whitelist()
+def get_offset_cost(customer, company, posting_date, emissions_kg_co2e):
+	"""Offset cost shown in the Sales Invoice form before the document is saved"""
+	price = get_offset_price(get_offset_type(customer), posting_date or getdate(), company)
+	return flt(emissions_kg_co2e) / 1000 * price
+
+
+def on_price_change(doc, method=None):
+	"""on_update / on_trash hook for ESG Carbon Offset Price"""
+	clear_offset_prices()
+	frappe.enqueue(
+		"esg_compliance.carbon_offset.recompute_offset_costs",
+		queue="long",
+		job_id="esg_recompute_offset_costs",
+		deduplicate=True,
+		enqueue_after_commit=True,
+	)
+
+
+def recompute_offset_costs():
+	"""Reprice the offset cost of every draft Sales Invoice that requires an offset"""
+	frappe.db.sql(
+		"""
+		UPDATE `tabSales Invoice` si
+		LEFT JOIN `tabCustomer` c ON c.name = si.customer
+		SET si.custom_carbon_offset_cost = ROUND(
+			IFNULL(si.custom_total_carbon_emissions_kg_co2e, 0) / 1000 * IFNULL((
+				SELECT p.price_per_tonne
+				FROM `tabESG Carbon Offset Price` p
+				WHERE p.offset_type = IF(c.custom_carbon_offset_preference = 'Mandatory', 'Mandatory', 'Optional')
+					AND p.effective_from <= si.posting_date
+					AND (p.company = si.company OR IFNULL(p.company, '') = '')
+				ORDER BY IFNULL(p.company, '') = '', p.effective_from DESC
+				LIMIT 1
+			), %(default_price)s),
+			2
+		)
+		WHERE si.docstatus = 0 AND si.custom_carbon_offset_required = 1
+		""",
+		{"default_price": DEFAULT_PRICE_PER_TONNE},
+	)
+	frappe.db.commit()
@@ -0,0 +1,287 @@
+# Copyright (c) 2025, K. Ronoh and contributors
+# For license information, please see license.txt
+
+"""Carbon footprint statements for customers that require them.
+
+Emissions of every reporting customer are read in one grouped query over
+submitted Sales Invoices and Delivery Notes. Statements are rendered from
+plain dicts in a process pool (HTML through Jinja, PDF through wkhtmltopdf) and
+saved as private File attachments on the Customer. Invoiced product emissions
+come from the Sales Invoice; only transport emissions are taken from the
+Delivery Note, so goods that are both delivered and invoiced count once.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+
+import frappe
+from frappe import _
+from frappe.utils import add_months, cint, flt, get_first_day, get_last_day, getdate, now_datetime
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(__file__), "templates", "carbon_statement.html")
+
+OUTPUT_FORMATS = ("PDF", "HTML")
+
+# Below this many statements the pool start-up costs more than it saves
+MIN_POOL_STATEMENTS = 20
+
+# Statements handed to a pool worker at a time
+POOL_CHUNK_SIZE = 25
+
+# Commit attachments in batches so a failure late in a run keeps earlier statements
+COMMIT_EVERY = 200
+
+PDF_OPTIONS = {"encoding": "UTF-8", "page-size": "A4", "quiet": ""}
+
+_template = None
+
+
+def get_customer_emissions(from_date, to_date):
+	"""Monthly emissions of every reporting customer, ordered by customer, company and month"""
+	return frappe.db.sql(
+		"""
+		SELECT
+			e.customer, c.customer_name, c.custom_carbon_offset_preference as offset_preference,
+			e.company, e.month,
+			SUM(e.invoiced) as invoiced, SUM(e.transport) as transport,
+			SUM(e.invoices) as invoices, SUM(e.deliveries) as deliveries
+		FROM (
+			SELECT customer, company, DATE_FORMAT(posting_date, '%%Y-%%m-01') as month,
+				IFNULL(custom_total_carbon_emissions_kg_co2e, 0) as invoiced, 0 as transport,
+				1 as invoices, 0 as deliveries
+			FROM `tabSales Invoice`
+			WHERE docstatus = 1 AND posting_date BETWEEN %(from_date)s AND %(to_date)s
+			UNION ALL
+			SELECT customer, company, DATE_FORMAT(posting_date, '%%Y-%%m-01') as month,
+				0 as invoiced, IFNULL(custom_transport_carbon_emissions_kg_co2e, 0) as transport,
+				0 as invoices, 1 as deliveries
+			FROM `tabDelivery Note`
+			WHERE docstatus = 1 AND posting_date BETWEEN %(from_date)s AND %(to_date)s
+		) e
+		INNER JOIN `tabCustomer` c
+			ON c.name = e.customer AND c.custom_requires_carbon_footprint_reporting = 1
+		GROUP BY e.customer, e.company, e.month
+		ORDER BY e.customer, e.company, e.month
+		""",
+		{"from_date": from_date, "to_date": to_date},
+		as_dict=True,
+	)
+
+
+def build_statements(rows, from_date, to_date):
+	"""Group the monthly rows into one picklable statement context per (customer, company)"""
+	generated_on = str(now_datetime().replace(microsecond=0))
+	for (customer, company), group in groupby(rows, key=lambda row: (row.customer, row.company)):
+		group = list(group)
+		months = [
+			{
+				"label": getdate(row.month).strftime("%b %Y"),
+				"invoices": cint(row.invoices),
+				"invoiced": flt(row.invoiced),
+				"deliveries": cint(row.deliveries),
+				"transport": flt(row.transport),
+				"total": flt(row.invoiced) + flt(row.transport),
+			}
+			for row in group
+		]
+		yield {
+			"title": "Carbon Footprint Statement",
+			"customer": customer,
+			"customer_name": group[0].customer_name or customer,
+			"offset_preference": group[0].offset_preference,
+			"company": company,
+			"from_date": str(from_date),
+			"to_date": str(to_date),
+			"months": months,
+			"totals": {
+				key: sum(row[key] for row in months)
+				for key in ("invoices", "invoiced", "deliveries", "transport", "total")
+			},
+			"generated_on": generated_on,
+		}
+
+
+def _get_template():
+	global _template
+	if _template is None:
+		from jinja2 import Environment
+
+		with open(TEMPLATE_PATH) as f:
+			_template = Environment(autoescape=True).from_string(f.read())
+	return _template
+
+
+def render_statement(context, output_format="PDF"):
+	"""Render one statement; runs in pool workers, so it must not touch frappe.local or the database"""
+	html = _get_template().render(**context)
+	if output_format == "HTML":
+		return html.encode()
+
+	import pdfkit
+
+	return pdfkit.from_string(html, False, options=PDF_OPTIONS)
+
+
+def _render_in_worker(args):
+	context, output_format = args
+	try:
+		return context, render_statement(context, output_format), None
+	except Exception as e:
+		return context, None, repr(e)
+
+
+def render_statements(statements, output_format):
+	"""Yield (context, content, error) for every statement, in a process pool for large runs"""
+	args = ((context, output_format) for context in statements)
+	if len(statements) < MIN_POOL_STATEMENTS:
+		yield from map(_render_in_worker, args)
+		return
+
+	workers = cint(frappe.conf.get("esg_statement_workers")) or min(4, os.cpu_count() or 1)
+	with ProcessPoolExecutor(max_workers=workers) as pool:
+		yield from pool.map(_render_in_worker, args, chunksize=POOL_CHUNK_SIZE)
+
+
+def get_file_name(context, output_format):
+	return "Carbon Statement {} {} {} to {}.{}".format(
+		context["customer"],
+		context["company"],
+		context["from_date"],
+		context["to_date"],
+		output_format.lower(),
+	)
+
+
+def generate_statements(from_date, to_date, output_format="PDF"):
+	"""Render and attach statements for every reporting customer with activity in the period"""
+	if output_format not in OUTPUT_FORMATS:
+		frappe.throw(_("Invalid output format {0}").format(output_format))
+
+	from_date, to_date = getdate(from_date), getdate(to_date)
+	statements = list(build_statements(get_customer_emissions(from_date, to_date), from_date, to_date))
+	if not statements:
+		return {"generated": 0, "failed": 0}
+
+	replace_existing_files([get_file_name(context, output_format) for context in statements])
+
+	generated = failed = 0
+	for context, content, error in render_statements(statements, output_format):
+		if error:
+			failed += 1
+			frappe.log_error(
+				message=f"Customer {context['customer']}: {error}",
+				title="ESG Carbon Statement Failed",
+			)
+			continue
+
+		attach_statement("Customer", context["customer"], get_file_name(context, output_format), content)
+		generated += 1
+		if generated % COMMIT_EVERY == 0:
+			frappe.db.commit()
+
+	frappe.db.commit()
+	return {"generated": generated, "failed": failed}
+
+
+def replace_existing_files(file_names):
+	"""Remove statements of an earlier run for the same customers and period"""
+	existing = frappe.get_all(
+		"File",
+		filters={"attached_to_doctype": "Customer", "file_name": ["in", file_names]},
+		pluck="name",
+	)
+	for name in existing:
+		frappe.delete_doc("File", name, ignore_permissions=True)
+
+
+def attach_statement(doctype, name, file_name, content):
+	return frappe.get_doc(
+		{
+			"doctype": "File",
+			"file_name": file_name,
+			"attached_to_doctype": doctype,
+			"attached_to_name": name,
+			"is_private": 1,
+			"content": content,
+		}
+	).insert(ignore_permissions=True)
+
+
+def generate_last_month_statements():
+	"""Monthly: statements for the previous calendar month"""
+	last_month = add_months(getdate(), -1)
+	generate_statements(get_first_day(last_month), get_last_day(last_month))
+
+
+@frappe.whitelist()
+def enqueue_carbon_statements(from_date, to_date, output_format="PDF"):
+	frappe.only_for("System Manager")
+	frappe.enqueue(
+		"esg_compliance.carbon_statement.generate_statements",
+		queue="long",
+		timeout=3600,
+		job_id=f"esg_carbon_statements::{from_date}::{to_date}",
+		deduplicate=True,
+		enqueue_after_commit=True,
+		from_date=from_date,
+		to_date=to_date,
+		output_format=output_format,
+	)
+
+
+@frappe.whitelist()
+def generate_carbon_certificate(sales_invoice):
+	"""Render a carbon footprint certificate for one Sales Invoice and attach it to the invoice"""
+	doc = frappe.get_doc("Sales Invoice", sales_invoice)
+	doc.check_permission("read")
+	if doc.docstatus != 1:
+		frappe.throw(_("Carbon footprint certificates can only be generated for submitted invoices"))
+
+	transport = flt(
+		frappe.db.sql(
+			"""
+			SELECT SUM(d.transport) FROM (
+				SELECT DISTINCT dn.name, IFNULL(dn.custom_transport_carbon_emissions_kg_co2e, 0) as transport
+				FROM `tabDelivery Note` dn
+				INNER JOIN `tabSales Invoice Item` sii ON sii.delivery_note = dn.name
+				WHERE sii.parent = %(invoice)s AND dn.docstatus = 1
+			) d
+			""",
+			{"invoice": doc.name},
+		)[0][0]
+	)
+	invoiced = flt(doc.custom_total_carbon_emissions_kg_co2e)
+	customer = (
+		frappe.db.get_value(
+			"Customer", doc.customer, ["customer_name", "custom_carbon_offset_preference"], as_dict=True
+		)
+		or frappe._dict()
+	)
+
+	month = {
+		"label": getdate(doc.posting_date).strftime("%b %Y"),
+		"invoices": 1,
+		"invoiced": invoiced,
+		"deliveries": 1 if transport else 0,
+		"transport": transport,
+		"total": invoiced + transport,
+	}
+	context = {
+		"title": "Carbon Footprint Certificate",
+		"customer": doc.customer,
+		"customer_name": customer.customer_name or doc.customer,
+		"offset_preference": customer.custom_carbon_offset_preference,
+		"company": doc.company,
+		"reference": doc.name,
+		"from_date": str(doc.posting_date),
+		"to_date": str(doc.posting_date),
+		"months": [month],
+		"totals": month,
+		"generated_on": str(now_datetime().replace(microsecond=0)),
+	}
+
+	file_doc = attach_statement(
+		"Sales Invoice", doc.name, f"Carbon Certificate {doc.name}.pdf", render_statement(context)
+	)
+	return file_doc.file_url
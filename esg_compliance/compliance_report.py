@@ -0,0 +1,398 @@
+# Copyright (c) 2025, K. Ronoh and contributors
+# For license information, please see license.txt
+
+"""Generate the metric analysis of an ESG Compliance Report.
+
+For the report's period and included categories, every active metric (or
+every metric of the report template, when one is set) gets a row with its actual value, target, variance and trend against the preceding
+period of the same length. Values come from the monthly `ESG Metric Series`
+in one grouped query covering both periods, so the period bounds are taken
+at whole months. Percentage and ratio metrics are averaged, all others summed.
+
+Metrics that miss their target become risk assessment rows, rated by how far
+off target they are and by their trend; High and Critical risks also get an
+action item. Rows entered by hand are kept when the report is regenerated.
+
+Generation runs as a background job and publishes progress on
+`esg_compliance_report_progress`.
+"""
+
+import frappe
+from frappe import _
+from frappe.utils import add_months, date_diff, flt, get_first_day, get_last_day, getdate, now_datetime
+
+from esg_compliance.kpi import AVERAGED_DATA_TYPES
+from esg_compliance.performance import get_metric_bands
+from esg_compliance.period_close import MONTHLY_TOTALS
+from esg_compliance.report_template import get_template_plan, render_plan
+from esg_compliance.utils import get_metric_entry_keys
+
+CATEGORIES = ("Environmental", "Social", "Governance")
+
+# Relative change below which a metric is considered Stable
+STABLE_CHANGE = 0.02
+
+# Metrics listed under "Furthest From Target" in the performance summary
+OFF_TARGET_LIMIT = 5
+
+# Impact of missing a target by at least this many percent
+IMPACT_THRESHOLDS = ((50, "High"), (20, "Medium"), (0, "Low"))
+
+# Likelihood that a missed target stays missed, by trend
+TREND_PROBABILITY = {"Declining": "High", "Stable": "Medium", "Improving": "Low"}
+
+# (probability, impact) -> risk level; anything else is Medium
+RISK_LEVELS = {
+	("High", "High"): "Critical",
+	("High", "Medium"): "High",
+	("Medium", "High"): "High",
+	("Low", "Low"): "Low",
+	("Low", "Medium"): "Low",
+	("Medium", "Low"): "Low",
+}
+
+ACTION_PRIORITY = {"Critical": "Urgent", "High": "High"}
+
+# Months after the report period within which a generated action is due
+ACTION_DUE_MONTHS = 3
+
+STEPS = (
+	"Loading metrics",
+	"Aggregating entries",
+	"Loading targets",
+	"Building metric rows",
+	"Rendering summary",
+	"Saving report",
+)
+
+
+@frappe.whitelist()
+def generate_compliance_report(report):
+	doc = frappe.get_doc("ESG Compliance Report", report)
+	doc.check_permission("write")
+	if doc.docstatus != 0:
+		frappe.throw(_("Only draft reports can be regenerated"))
+
+	frappe.enqueue(
+		"esg_compliance.compliance_report.build_compliance_report",
+		queue="long",
+		timeout=1800,
+		job_id=f"esg_compliance_report::{report}",
+		deduplicate=True,
+		enqueue_after_commit=True,
+		report=report,
+		user=frappe.session.user,
+	)
+	return {"queued": True}
+
+
+def publish_progress(report, step, user=None):
+	"""`step` steps are done; the message names the next one"""
+	frappe.publish_realtime(
+		"esg_compliance_report_progress",
+		{
+			"report": report,
+			"progress": step,
+			"total": len(STEPS),
+			"message": _(STEPS[step]) if step < len(STEPS) else "",
+		},
+		user=user,
+		doctype="ESG Compliance Report",
+		docname=report,
+	)
+
+
+def get_periods(from_date, to_date):
+	"""Whole-month bounds of the report period and of the preceding period of equal length"""
+	from_date, to_date = get_first_day(from_date), get_last_day(to_date)
+	months = (to_date.year - from_date.year) * 12 + to_date.month - from_date.month + 1
+	previous_from = add_months(from_date, -months)
+	return from_date, to_date, previous_from
+
+
+def get_report_metrics(categories, company=None, names=None):
+	filters = {"active": 1, "category": ["in", categories]}
+	if names is not None:
+		filters["name"] = ["in", names or [""]]
+	or_filters = [["company", "=", company], ["company", "is", "not set"]] if company else None
+	return frappe.get_all(
+		"ESG Metric",
+		filters=filters,
+		or_filters=or_filters,
+		fields=["name", "metric_name", "category", "data_type", "target_value"],
+		order_by="category asc, metric_name asc",
+	)
+
+
+def get_period_values(from_date, to_date, previous_from, company=None):
+	"""{ESG Metric: row} with current and previous totals and entry counts, from one grouped query"""
+	conditions = "month BETWEEN %(previous_from)s AND %(to_date)s"
+	if company:
+		conditions += " AND company = %(company)s"
+
+	rows = frappe.db.sql(
+		f"""
+		SELECT
+			metric,
+			SUM(CASE WHEN month >= %(from_date)s THEN total_value ELSE 0 END) as current_total,
+			SUM(CASE WHEN month >= %(from_date)s THEN entry_count ELSE 0 END) as current_count,
+			SUM(CASE WHEN month < %(from_date)s THEN total_value ELSE 0 END) as previous_total,
+			SUM(CASE WHEN month < %(from_date)s THEN entry_count ELSE 0 END) as previous_count
+		FROM {MONTHLY_TOTALS} s
+		WHERE {conditions}
+		GROUP BY metric
+		""",
+		{"from_date": from_date, "to_date": to_date, "previous_from": previous_from, "company": company},
+		as_dict=True,
+	)
+
+	# Series rows may be keyed by metric name or document name; fold both onto the document
+	keys = get_metric_entry_keys()
+	values = {}
+	for row in rows:
+		name = keys.get(row.metric)
+		if not name:
+			continue
+		total = values.setdefault(
+			name, frappe._dict(current_total=0, current_count=0, previous_total=0, previous_count=0)
+		)
+		for field in total:
+			total[field] += flt(row[field])
+
+	return values
+
+
+def get_targets(metrics, to_date):
+	"""Target per metric: the first ESG Target due on or after the period end, else the latest one"""
+	targets, settled = {}, set()
+	for row in frappe.get_all(
+		"ESG Target",
+		filters={"metric": ["in", metrics]},
+		fields=["metric", "target_value", "target_date"],
+		order_by="target_date asc",
+	):
+		if row.metric in settled:
+			continue
+		targets[row.metric] = flt(row.target_value)
+		if row.target_date and getdate(row.target_date) >= to_date:
+			settled.add(row.metric)
+
+	return targets
+
+
+def get_lower_is_better(metric, bands):
+	"""Direction from the metric's thresholds; without them, lower is better for Environmental metrics"""
+	band = bands.get(metric.name)
+	if band:
+		return band[0] > 0
+	return metric.category == "Environmental"
+
+
+def get_value(total, count, data_type):
+	if data_type in AVERAGED_DATA_TYPES:
+		return flt(total) / count if count else 0
+	return flt(total)
+
+
+def get_trend(current, previous, lower_is_better):
+	if not previous:
+		return "Stable"
+
+	change = (current - previous) / abs(previous)
+	if abs(change) < STABLE_CHANGE:
+		return "Stable"
+
+	return "Improving" if (change < 0) == lower_is_better else "Declining"
+
+
+def build_metric_rows(metrics, values, targets, bands):
+	rows = []
+	for metric in metrics:
+		value = values.get(metric.name) or frappe._dict(
+			current_total=0, current_count=0, previous_total=0, previous_count=0
+		)
+		current = get_value(value.current_total, value.current_count, metric.data_type)
+		previous = get_value(value.previous_total, value.previous_count, metric.data_type)
+		target = targets.get(metric.name, flt(metric.target_value))
+		lower_is_better = get_lower_is_better(metric, bands)
+
+		variance = current - target
+		variance_pct = variance / abs(target) * 100 if target else 0
+		change_pct = (current - previous) / abs(previous) * 100 if previous else 0
+		rows.append(
+			frappe._dict(
+				metric=metric.name,
+				metric_name=metric.metric_name or metric.name,
+				category=metric.category,
+				has_data=bool(value.current_count),
+				current_value=flt(current, 3),
+				target_value=flt(target, 3),
+				previous_value=flt(previous, 3),
+				variance_pct=variance_pct,
+				on_target=bool(target) and (current <= target if lower_is_better else current >= target),
+				trend=get_trend(current, previous, lower_is_better),
+				analysis=_("{0:+.1f}% vs target, {1:+.1f}% vs previous period").format(
+					variance_pct, change_pct
+				)
+				if target
+				else _("{0:+.1f}% vs previous period").format(change_pct),
+			)
+		)
+
+	return rows
+
+
+def get_impact(variance_pct):
+	return next(impact for threshold, impact in IMPACT_THRESHOLDS if abs(variance_pct) >= threshold)
+
+
+def build_risk_rows(rows):
+	"""Risk assessment rows for metrics with data that miss their target, furthest first.
+
+	The mitigation plan is left to the report's author.
+	"""
+	risks = []
+	for row in sorted(rows, key=lambda row: abs(row.variance_pct), reverse=True):
+		if not (row.target_value and row.has_data) or row.on_target:
+			continue
+
+		probability, impact = TREND_PROBABILITY[row.trend], get_impact(row.variance_pct)
+		risks.append(
+			frappe._dict(
+				risk_area=row.metric_name,
+				risk_level=RISK_LEVELS.get((probability, impact), "Medium"),
+				probability=probability,
+				impact=impact,
+			)
+		)
+
+	return risks
+
+
+def get_action(metric_name):
+	return _("Bring {0} back on target").format(metric_name)
+
+
+def build_action_rows(risks, to_date):
+	"""An open action item per High or Critical risk"""
+	due_date = get_last_day(add_months(to_date, ACTION_DUE_MONTHS))
+	return [
+		frappe._dict(
+			action=get_action(risk.risk_area),
+			priority=ACTION_PRIORITY[risk.risk_level],
+			due_date=due_date,
+			status="Open",
+		)
+		for risk in risks
+		if risk.risk_level in ACTION_PRIORITY
+	]
+
+
+def replace_generated_rows(doc, fieldname, key, generated_keys, rows):
+	"""Replace the rows a previous run generated (matched on `key`), keeping rows entered by hand"""
+	kept = [row for row in doc.get(fieldname) if row.get(key) not in generated_keys]
+	doc.set(fieldname, [*kept, *rows])
+
+
+def render_performance_summary(rows, from_date, to_date, template_sections=None):
+	categories = []
+	for category in CATEGORIES:
+		category_rows = [row for row in rows if row.category == category]
+		if not category_rows:
+			continue
+		categories.append(
+			frappe._dict(
+				category=category,
+				metrics=len(category_rows),
+				with_data=sum(1 for row in category_rows if row.has_data),
+				on_target=sum(1 for row in category_rows if row.on_target),
+				improving=sum(1 for row in category_rows if row.trend == "Improving"),
+				declining=sum(1 for row in category_rows if row.trend == "Declining"),
+			)
+		)
+
+	off_target = sorted(
+		(row for row in rows if row.target_value and row.has_data and not row.on_target),
+		key=lambda row: abs(row.variance_pct),
+		reverse=True,
+	)[:OFF_TARGET_LIMIT]
+
+	return frappe.render_template(
+		"esg_compliance/templates/compliance_report_summary.html",
+		{
+			"categories": categories,
+			"off_target": off_target,
+			"template_sections": template_sections or [],
+			"total_metrics": len(rows),
+			"from_date": frappe.format(from_date, {"fieldtype": "Date"}),
+			"to_date": frappe.format(to_date, {"fieldtype": "Date"}),
+		},
+	)
+
+
+def build_compliance_report(report, user=None):
+	doc = frappe.get_doc("ESG Compliance Report", report)
+	if date_diff(doc.reporting_period_to, doc.reporting_period_from) < 0:
+		frappe.throw(_("Reporting Period From cannot be after Reporting Period To"))
+
+	publish_progress(report, 0, user)
+	categories = [row.category for row in doc.esg_categories if row.include and row.category] or list(
+		CATEGORIES
+	)
+	from_date, to_date, previous_from = get_periods(doc.reporting_period_from, doc.reporting_period_to)
+	plan = get_template_plan(doc.report_template) if doc.report_template else None
+	metrics = get_report_metrics(categories, doc.get("company"), list(plan["metrics"]) if plan else None)
+
+	publish_progress(report, 1, user)
+	values = get_period_values(from_date, to_date, previous_from, doc.get("company"))
+
+	publish_progress(report, 2, user)
+	targets = get_targets([m.name for m in metrics], to_date) if metrics else {}
+
+	publish_progress(report, 3, user)
+	rows = build_metric_rows(metrics, values, targets, get_metric_bands())
+	doc.set(
+		"esg_report_metric",
+		[
+			{
+				"metric": row.metric,
+				"current_value": row.current_value,
+				"target_value": row.target_value,
+				"previous_value": row.previous_value,
+				"trend": row.trend,
+				"analysis": row.analysis,
+			}
+			for row in rows
+		],
+	)
+
+	# Every metric of the report could have produced a risk or action row on an earlier run
+	labels = {row.metric_name for row in rows}
+	risks = build_risk_rows(rows)
+	replace_generated_rows(doc, "risk_assessment", "risk_area", labels, risks)
+	replace_generated_rows(
+		doc,
+		"action_items",
+		"action",
+		{get_action(label) for label in labels},
+		build_action_rows(risks, to_date),
+	)
+
+	publish_progress(report, 4, user)
+	template_sections = None
+	if plan:
+		company = doc.get("company")
+		rendered = render_plan(
+			plan, from_date, to_date, [company] if company else None, consolidate=not company
+		)
+		template_sections = rendered.get(company or "", [])
+	doc.performance_summary_html = render_performance_summary(rows, from_date, to_date, template_sections)
+	doc.generated_on = now_datetime()
+
+	publish_progress(report, 5, user)
+	doc.flags.ignore_permissions = True
+	doc.save()
+	frappe.db.commit()
+
+	publish_progress(report, len(STEPS), user)
+	return len(rows)
@@ -253,7 +253,7 @@ esg_doctypes = [
             {"fieldname": "variance_percentage", "label": "Variance %", "fieldtype": "Percent", "read_only": 1, "idx": 14},
             {"fieldname": "performance_indicator", "label": "Performance", "fieldtype": "Select", "options": "Green\nYellow\nRed", "read_only": 1, "idx": 15},
             {"fieldname": "section_break_2", "fieldtype": "Section Break", "label": "Data Source & Validation", "idx": 16},
-            {"fieldname": "data_source", "label": "Data Source", "fieldtype": "Select", "options": "Manual Entry\nSystem Generated\nImported\nCalculated", "default": "Manual Entry", "idx": 17},
+            {"fieldname": "data_source", "label": "Data Source", "fieldtype": "Select", "options": "Manual Entry\nSystem Generated\nImported\nCalculated\nReversal", "default": "Manual Entry", "idx": 17},
             {"fieldname": "source_doctype", "label": "Source DocType", "fieldtype": "Select", "options": "\nPurchase Invoice\nSales Invoice\nStock Entry\nDelivery Note\nPurchase Receipt\nPayroll Entry", "idx": 18},
             {"fieldname": "source_document", "label": "Source Document", "fieldtype": "Dynamic Link", "options": "source_doctype", "idx": 19},
             {"fieldname": "column_break_3", "fieldtype": "Column Break", "idx": 20},
@@ -924,26 +924,26 @@ try:
             "charts": [
                 {
                     "chart_name": "Energy Consumption Trend",
-                    "chart_type": "Line",
+                    "chart_type": "Custom",
                     "doctype": "Dashboard Chart",
-                    "filters_json": "{}",
+                    "filters_json": '{"metric": "Total Energy Consumption"}',
                     "is_custom": 1,
                     "is_public": 1,
                     "owner": "Administrator",
-                    "source": "ESG Metric Entry",
+                    "source": "ESG Metric Series",
                     "time_interval": "Monthly",
                     "timeseries": 1,
                     "type": "Line"
                 },
                 {
                     "chart_name": "Carbon Footprint Analysis",
-                    "chart_type": "Bar",
+                    "chart_type": "Custom",
                     "doctype": "Dashboard Chart",
-                    "filters_json": "{}",
+                    "filters_json": '{"metric": "Carbon Footprint"}',
                     "is_custom": 1,
                     "is_public": 1,
                     "owner": "Administrator",
-                    "source": "ESG Metric Entry",
+                    "source": "ESG Metric Series",
                     "time_interval": "Monthly",
                     "timeseries": 1,
                     "type": "Bar"
@@ -0,0 +1,162 @@
+# Copyright (c) 2025, K. Ronoh and contributors
+# For license information, please see license.txt
+
+"""Per-scope emission ledger.
+
+On submit, the carbon emissions of a document are split by the GHG scope and
+emission source of its items and written as a few `ESG Emission Ledger` rows,
+one per (scope, source). Cancelling marks the rows as cancelled, like GL
+Entries, so scope reporting never has to read line items again.
+"""
+
+import frappe
+from frappe.utils import flt, getdate, now_datetime
+
+from esg_compliance.cache import invalidate
+
+UNCLASSIFIED = "Unclassified"
+
+# Line item field holding the emissions of the row, per voucher type
+LINE_EMISSION_FIELDS = {
+	"Sales Invoice": "custom_carbon_emissions_kg_co2e",
+	"Purchase Invoice": "custom_carbon_emissions_kg_co2e",
+	"Delivery Note": "custom_carbon_emissions_kg_co2e",
+	"Stock Entry": "custom_carbon_impact_kg_co2e",
+}
+
+# Header totals the line items are reconciled against
+HEADER_TOTAL_FIELDS = {
+	"Sales Invoice": "custom_total_carbon_emissions_kg_co2e",
+	"Purchase Invoice": "custom_total_carbon_emissions_kg_co2e",
+	"Delivery Note": "custom_product_carbon_emissions_kg_co2e",
+	"Stock Entry": "custom_total_carbon_impact_kg_co2e",
+}
+
+
+def get_item_classification(item_codes):
+	"""Scope, emission source and emission factor of the given items in one query"""
+	if not item_codes:
+		return {}
+
+	return {
+		d.name: d
+		for d in frappe.get_all(
+			"Item",
+			filters={"name": ["in", list(item_codes)]},
+			fields=[
+				"name",
+				"custom_carbon_scope as scope",
+				"custom_emission_source as source",
+				"custom_carbon_emission_factor_kg_co2e_per_unit as factor",
+			],
+		)
+	}
+
+
+def get_line_subtotals(doc):
+	"""Sum line item emissions per (scope, source)"""
+	line_field = LINE_EMISSION_FIELDS[doc.doctype]
+	items = get_item_classification({row.item_code for row in doc.items if row.item_code})
+
+	subtotals = {}
+	for row in doc.items:
+		item = items.get(row.item_code) or frappe._dict()
+		emissions = flt(row.get(line_field))
+		if not emissions and item.factor:
+			emissions = flt(row.get("stock_qty") or row.get("transfer_qty") or row.qty) * flt(item.factor)
+		if not emissions:
+			continue
+
+		key = (item.scope or UNCLASSIFIED, item.source or UNCLASSIFIED)
+		subtotals[key] = subtotals.get(key, 0) + emissions
+
+	# Header totals entered or adjusted by hand are kept; the difference stays unclassified
+	header_total = flt(doc.get(HEADER_TOTAL_FIELDS[doc.doctype]))
+	difference = header_total - sum(subtotals.values())
+	if header_total and abs(difference) > 0.001:
+		key = (UNCLASSIFIED, UNCLASSIFIED)
+		subtotals[key] = subtotals.get(key, 0) + difference
+
+	return subtotals
+
+
+def get_subtotals(doc):
+	if doc.doctype == "Work Order":
+		return {
+			("Scope 3 - Other Indirect", "Raw Material"): flt(doc.custom_raw_material_emissions_kg_co2e),
+			("Scope 1 - Direct", "Direct Manufacturing"): flt(
+				doc.custom_manufacturing_process_emissions_kg_co2e
+			),
+		}
+
+	subtotals = get_line_subtotals(doc)
+	if doc.doctype == "Delivery Note" and flt(doc.custom_transport_carbon_emissions_kg_co2e):
+		key = ("Scope 3 - Other Indirect", "Transportation")
+		subtotals[key] = subtotals.get(key, 0) + flt(doc.custom_transport_carbon_emissions_kg_co2e)
+
+	return subtotals
+
+
+def make_ledger_entries(doc, method=None):
+	"""on_submit hook: write one ledger row per (scope, emission source)"""
+	subtotals = {key: value for key, value in get_subtotals(doc).items() if value}
+	if not subtotals:
+		return
+
+	posting_date = getdate(doc.get("posting_date") or doc.get("planned_start_date") or doc.creation)
+	now, user = now_datetime(), frappe.session.user
+	frappe.db.bulk_insert(
+		"ESG Emission Ledger",
+		fields=[
+			"name",
+			"creation",
+			"modified",
+			"owner",
+			"modified_by",
+			"company",
+			"posting_date",
+			"voucher_type",
+			"voucher_no",
+			"carbon_scope",
+			"emission_source",
+			"emissions_kg_co2e",
+			"is_cancelled",
+		],
+		values=[
+			(
+				frappe.generate_hash(length=10),
+				now,
+				now,
+				user,
+				user,
+				doc.company,
+				posting_date,
+				doc.doctype,
+				doc.name,
+				scope,
+				source,
+				flt(value, 3),
+				0,
+			)
+			for (scope, source), value in subtotals.items()
+		],
+	)
+	invalidate(company=doc.company)
+
+
+def cancel_ledger_entries(doc, method=None):
+	"""on_cancel hook"""
+	frappe.db.sql(
+		"""
+		UPDATE `tabESG Emission Ledger`
+		SET is_cancelled = 1, modified = %(now)s, modified_by = %(user)s
+		WHERE voucher_type = %(voucher_type)s AND voucher_no = %(voucher_no)s
+		""",
+		{
+			"now": now_datetime(),
+			"user": frappe.session.user,
+			"voucher_type": doc.doctype,
+			"voucher_no": doc.name,
+		},
+	)
+	invalidate(company=doc.company)
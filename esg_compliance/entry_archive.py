@@ -0,0 +1,332 @@
+# Copyright (c) 2025, K. Ronoh and contributors
+# For license information, please see license.txt
+
+"""Archival of ESG Metric Entries of old closed periods into compressed files.
+
+Once a period closed by an `ESG Period Close` is older than the archive horizon
+(`esg_archive_after_months` in site config, 24 months by default), its entries
+and their `ESG Document` rows are written to
+`<site>/private/esg_archive/<company>/<YYYY-MM>.jsonl.gz` and deleted from the
+database. The file holds one gzip member per metric; the `ESG Entry Archive`
+row keeps the byte range of each member, so a drill-down into one metric
+decompresses only that member. Monthly totals stay available from the
+period's `ESG Period Snapshot`. ESG Anomalies and ESG Audit Samples of the
+archived entries keep their own copy of metric, period and value; their link
+to the entry is cleared and kept in the archive instead.
+
+An archive can be restored, which puts the entries back and allows the period
+to be reopened.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+from itertools import groupby
+
+import frappe
+from frappe import _
+from frappe.utils import add_months, cint, cstr, get_first_day, getdate, now_datetime, today
+
+from esg_compliance.cache import invalidate
+from esg_compliance.metric_series import add_dirty_buckets
+from esg_compliance.partitioning import get_stored_company
+from esg_compliance.utils import check_company_access
+
+ARCHIVE_DIR = "esg_archive"
+
+DEFAULT_ARCHIVE_AFTER_MONTHS = 24
+
+CHUNK_SIZE = 1000
+
+# doctype: field linking it to an ESG Metric Entry
+ENTRY_LINKS = {"ESG Anomaly": "metric_entry", "ESG Audit Sample": "metric_entry"}
+
+
+def get_archive_path(*parts):
+	return frappe.get_site_path("private", ARCHIVE_DIR, *parts)
+
+
+def get_archive_horizon():
+	"""First month that is still kept in the database"""
+	months = cint(frappe.conf.get("esg_archive_after_months")) or DEFAULT_ARCHIVE_AFTER_MONTHS
+	return get_first_day(add_months(getdate(today()), -months))
+
+
+def archive_closed_periods():
+	"""Daily: archive every closed period older than the horizon"""
+	closes = frappe.db.sql_list(
+		"""
+		SELECT pc.name FROM `tabESG Period Close` pc
+		WHERE pc.docstatus = 1 AND pc.month < %(horizon)s
+			AND NOT EXISTS (SELECT 1 FROM `tabESG Entry Archive` a WHERE a.period_close = pc.name)
+		ORDER BY pc.month
+		""",
+		{"horizon": get_archive_horizon()},
+	)
+	for period_close in closes:
+		try:
+			archive_period(period_close)
+		except Exception:
+			frappe.db.rollback()
+			frappe.log_error(
+				title="ESG Entry Archive Failed",
+				reference_doctype="ESG Period Close",
+				reference_name=period_close,
+			)
+
+
+def get_documents(company, month, period_end):
+	"""{entry name: [ESG Document rows]} for the entries of a period"""
+	documents = {}
+	for row in frappe.db.sql(
+		"""
+		SELECT d.* FROM `tabESG Document` d
+		JOIN `tabESG Metric Entry` e ON e.name = d.parent
+		WHERE d.parenttype = 'ESG Metric Entry'
+			AND e.company = %(company)s AND e.reporting_period BETWEEN %(month)s AND %(period_end)s
+		ORDER BY d.parent, d.idx
+		""",
+		{"company": company, "month": month, "period_end": period_end},
+		as_dict=True,
+	):
+		documents.setdefault(row.parent, []).append(row)
+	return documents
+
+
+def get_links(company, month, period_end):
+	"""{entry name: [[doctype, name]]} of the rows in ENTRY_LINKS that link to the entries of a period"""
+	links = {}
+	for doctype, field in ENTRY_LINKS.items():
+		for row in frappe.db.sql(
+			f"""
+			SELECT l.name, l.`{field}` as entry FROM `tab{doctype}` l
+			JOIN `tabESG Metric Entry` e ON e.name = l.`{field}`
+			WHERE e.company = %(company)s AND e.reporting_period BETWEEN %(month)s AND %(period_end)s
+			""",
+			{"company": company, "month": month, "period_end": period_end},
+			as_dict=True,
+		):
+			links.setdefault(row.entry, []).append([doctype, row.name])
+	return links
+
+
+def write_archive(path, company, month, period_end, documents, links):
+	"""Stream the entries of a period into `path`, one gzip member per metric.
+
+	Returns (metric index, names of the archived entries).
+	"""
+	index, names = {}, []
+	with open(path, "wb") as f, frappe.db.unbuffered_cursor():
+		rows = frappe.db.sql(
+			"""
+			SELECT * FROM `tabESG Metric Entry`
+			WHERE company = %(company)s AND reporting_period BETWEEN %(month)s AND %(period_end)s
+			ORDER BY metric, name
+			""",
+			{"company": company, "month": month, "period_end": period_end},
+			as_dict=True,
+			as_iterator=True,
+		)
+		for metric, entries in groupby(rows, key=lambda row: row.metric or ""):
+			offset, count = f.tell(), 0
+			with gzip.GzipFile(fileobj=f, mode="wb") as member:
+				for entry in entries:
+					entry["supporting_documents"] = documents.get(entry.name, [])
+					entry["links"] = links.get(entry.name, [])
+					member.write(json.dumps(entry, default=str).encode() + b"\n")
+					names.append(entry.name)
+					count += 1
+			index[metric] = [offset, f.tell() - offset, count]
+
+	return index, names
+
+
+def archive_period(period_close):
+	"""Move the entries of a closed period into a compressed file and delete them"""
+	close = frappe.get_doc("ESG Period Close", period_close)
+	if close.docstatus != 1:
+		frappe.throw(_("Only closed periods can be archived"))
+
+	digest = hashlib.md5(cstr(close.company).encode()).hexdigest()[:8]
+	file_path = os.path.join(
+		f"{frappe.scrub(close.company)}-{digest}", f"{getdate(close.month).strftime('%Y-%m')}.jsonl.gz"
+	)
+	path = get_archive_path(file_path)
+	os.makedirs(os.path.dirname(path), exist_ok=True)
+
+	staging = f"{path}.{frappe.generate_hash(length=8)}"
+	documents = get_documents(close.company, close.month, close.period_end)
+	links = get_links(close.company, close.month, close.period_end)
+	try:
+		index, names = write_archive(staging, close.company, close.month, close.period_end, documents, links)
+		checksum = hashlib.sha256()
+		with open(staging, "rb") as f:
+			for block in iter(lambda: f.read(1 << 20), b""):
+				checksum.update(block)
+		os.replace(staging, path)
+
+		frappe.get_doc(
+			{
+				"doctype": "ESG Entry Archive",
+				"period_close": close.name,
+				"company": close.company,
+				"month": close.month,
+				"archived_on": now_datetime(),
+				"entry_count": len(names),
+				"document_count": sum(len(rows) for rows in documents.values()),
+				"file_path": file_path,
+				"file_size": os.path.getsize(path),
+				"checksum": checksum.hexdigest(),
+				"metric_index": json.dumps(index, indent=1),
+			}
+		).insert(ignore_permissions=True)
+
+		deleted = 0
+		for i in range(0, len(names), CHUNK_SIZE):
+			chunk = tuple(names[i : i + CHUNK_SIZE])
+			frappe.db.sql(
+				"DELETE FROM `tabESG Document` WHERE parenttype = 'ESG Metric Entry' AND parent IN %(names)s",
+				{"names": chunk},
+			)
+			for doctype, field in ENTRY_LINKS.items():
+				frappe.db.sql(
+					f"UPDATE `tab{doctype}` SET `{field}` = NULL WHERE `{field}` IN %(names)s",
+					{"names": chunk},
+				)
+			frappe.db.sql("DELETE FROM `tabESG Metric Entry` WHERE name IN %(names)s", {"names": chunk})
+			deleted += frappe.db.sql("SELECT ROW_COUNT()")[0][0]
+
+		if deleted != len(names):
+			frappe.throw(_("Archived {0} entries but deleted {1}").format(len(names), deleted))
+		frappe.db.commit()
+	except Exception:
+		frappe.db.rollback()
+		remove_file(staging)
+		remove_file(path)
+		raise
+
+	invalidate(company=close.company)
+	# The raw DELETE bypasses the on_trash hook that keeps ESG Metric Series in sync
+	add_dirty_buckets(get_buckets(close.company, close.month, close.period_end, index))
+	return len(names)
+
+
+def get_buckets(company, month, period_end, index):
+	"""(company, metric, month) series buckets covered by an archive"""
+	months = []
+	month, period_end = get_first_day(month), getdate(period_end)
+	while month <= period_end:
+		months.append(month)
+		month = add_months(month, 1)
+	return [(company, metric, m) for metric in index for m in months]
+
+
+def validate_not_archived(doc, method=None):
+	"""before_cancel hook for ESG Period Close: an archived period must be restored first"""
+	archive = frappe.db.get_value("ESG Entry Archive", {"period_close": doc.name})
+	if archive:
+		frappe.throw(
+			_(
+				"The entries of this period are archived in {0}. Restore it before reopening the period."
+			).format(archive)
+		)
+
+
+def read_member(archive, metric):
+	"""Entries of one metric, decompressing only its member of the file"""
+	offset, length, _count = json.loads(archive.metric_index).get(metric) or (0, 0, 0)
+	if not length:
+		return []
+
+	with open(get_archive_path(archive.file_path), "rb") as f:
+		f.seek(offset)
+		data = gzip.decompress(f.read(length))
+	return [frappe._dict(json.loads(line)) for line in data.splitlines()]
+
+
+def read_archive(archive):
+	"""Every archived entry, streamed"""
+	with gzip.open(get_archive_path(archive.file_path), "rb") as f:
+		for line in f:
+			yield frappe._dict(json.loads(line))
+
+
+@frappe.whitelist()
+def get_archived_entries(archive, metric=None, party=None, limit=500):
+	"""Drill down into an archive: entries of one metric, or the per-metric index"""
+	archive = frappe.get_doc("ESG Entry Archive", archive)
+	archive.check_permission("read")
+	check_company_access(archive.company)
+	if not metric:
+		return {
+			metric: count for metric, (_offset, _length, count) in json.loads(archive.metric_index).items()
+		}
+
+	entries = [e for e in read_member(archive, metric) if not party or e.party == party]
+	for entry in entries:
+		entry.pop("supporting_documents", None)
+	return entries[: cint(limit)]
+
+
+@frappe.whitelist()
+def restore_archive(archive):
+	"""Put the entries of an archive back into the database and delete the archive"""
+	frappe.only_for("System Manager")
+	archive = frappe.get_doc("ESG Entry Archive", archive)
+	path = get_archive_path(archive.file_path)
+
+	batch, restored = [], 0
+	for entry in read_archive(archive):
+		batch.append(entry)
+		if len(batch) >= CHUNK_SIZE:
+			restored += insert_entries(batch)
+			batch = []
+	restored += insert_entries(batch)
+
+	if restored != archive.entry_count:
+		frappe.throw(_("Archive holds {0} entries, expected {1}").format(restored, archive.entry_count))
+
+	archive.delete(ignore_permissions=True)
+	frappe.db.after_commit.add(lambda: remove_file(path))
+	invalidate(company=archive.company)
+	# Restored rows keep their old `modified`, so the series refresh would not pick them up
+	period_end = frappe.db.get_value("ESG Period Close", archive.period_close, "period_end")
+	add_dirty_buckets(
+		get_buckets(
+			archive.company, archive.month, period_end or archive.month, json.loads(archive.metric_index)
+		)
+	)
+	return restored
+
+
+def remove_file(path):
+	if os.path.exists(path):
+		os.remove(path)
+
+
+def insert_entries(entries):
+	if not entries:
+		return 0
+
+	for entry in entries:
+		entry.company = get_stored_company(entry.company)
+	documents = [row for entry in entries for row in entry.pop("supporting_documents", [])]
+	links = [(doctype, name, entry.name) for entry in entries for doctype, name in entry.pop("links", [])]
+	fields = list(entries[0])
+	frappe.db.bulk_insert(
+		"ESG Metric Entry", fields=fields, values=[[entry.get(f) for f in fields] for entry in entries]
+	)
+	if documents:
+		fields = list(documents[0])
+		frappe.db.bulk_insert(
+			"ESG Document", fields=fields, values=[[row.get(f) for f in fields] for row in documents]
+		)
+	# Relink the anomalies and audit samples that still exist and were not linked elsewhere meanwhile
+	for doctype, name, entry in links:
+		field = ENTRY_LINKS[doctype]
+		frappe.db.sql(
+			f"UPDATE `tab{doctype}` SET `{field}` = %(entry)s WHERE name = %(name)s AND `{field}` IS NULL",
+			{"entry": entry, "name": name},
+		)
+	return len(entries)
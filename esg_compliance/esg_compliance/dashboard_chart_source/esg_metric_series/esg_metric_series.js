@@ -0,0 +1,29 @@
+// Copyright (c) 2025, K. Ronoh and contributors
+// For license information, please see license.txt
+
+frappe.provide("frappe.dashboards.chart_sources");
+
+frappe.dashboards.chart_sources["ESG Metric Series"] = {
+	method: "esg_compliance.esg_compliance.dashboard_chart_source.esg_metric_series.esg_metric_series.get",
+	filters: [
+		{
+			fieldname: "company",
+			label: __("Company"),
+			fieldtype: "Link",
+			options: "Company",
+			default: frappe.defaults.get_user_default("Company")
+		},
+		{
+			fieldname: "metric",
+			label: __("ESG Metric"),
+			fieldtype: "Link",
+			options: "ESG Metric"
+		},
+		{
+			fieldname: "category",
+			label: __("Category"),
+			fieldtype: "Select",
+			options: "\nEnvironmental\nSocial\nGovernance"
+		}
+	]
+};
@@ -0,0 +1,57 @@
+# Copyright (c) 2025, K. Ronoh and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.utils import add_months, flt, getdate
+from frappe.utils.dashboard import cache_source
+
+from esg_compliance.metric_series import get_series
+from esg_compliance.utils import check_company_access
+
+# Months folded into one point for coarser chart intervals
+INTERVAL_MONTHS = {"Quarterly": 3, "Half Yearly": 6, "Yearly": 12}
+
+
+@frappe.whitelist()
+@cache_source
+def get(
+	chart_name=None,
+	chart=None,
+	no_cache=None,
+	filters=None,
+	from_date=None,
+	to_date=None,
+	timespan=None,
+	time_interval=None,
+	heatmap_year=None,
+):
+	"""Chart data read from the materialized ESG Metric Series"""
+	filters = frappe.parse_json(filters) or {}
+	company = filters.get("company")
+	check_company_access(company)
+	to_date = getdate(to_date)
+	from_date = getdate(from_date) if from_date else add_months(to_date, -11)
+
+	series = get_series(
+		company=company,
+		# Series rows store entries without a company under ""
+		companies=None if company else ["", *frappe.get_list("Company", pluck="name")],
+		metric=filters.get("metric"),
+		category=filters.get("category"),
+		from_date=from_date,
+		to_date=to_date,
+	)
+
+	step = INTERVAL_MONTHS.get(time_interval, 1)
+	labels, values = [], []
+	for i in range(0, len(series), step):
+		chunk = series[i : i + step]
+		labels.append(chunk[-1][0].strftime("%b %Y"))
+		values.append(flt(sum(value for _month, value in chunk), 2))
+
+	return {
+		"labels": labels,
+		"datasets": [
+			{"name": filters.get("metric") or filters.get("category") or "ESG Metrics", "values": values}
+		],
+	}
@@ -336,20 +336,16 @@ class ESGOverview {
 		this.show_loading();
 		
 		try {
-			// Fetch all data in parallel for better performance
-			const [kpiData, chartData, statsData, activitiesData, alertsData] = await Promise.all([
-				this.get_kpi_data(),
-				this.get_chart_data(),
-				this.get_stats_data(),
-				this.get_recent_activities(),
-				this.get_priority_alerts()
-			]);
-
-			this.update_kpi_cards(kpiData);
-			this.update_charts(chartData);
-			this.update_stats(statsData);
-			this.update_activities(activitiesData);
-			this.update_alerts(alertsData);
+			// Every widget arrives with one batched call, computed on the server
+			const dashboardData = await this.get_dashboard_data();
+			const widget = (key, fallback) => dashboardData.widgets[key]?.data || fallback;
+
+			this.dashboard_data = dashboardData;
+			this.update_kpi_cards(widget('scores', { trends: {} }));
+			this.update_charts(widget('initiative_categories', { labels: [], data: [], colors: [] }), dashboardData);
+			this.update_stats(widget('stats', { policies: {}, initiatives: {}, actions: {} }));
+			this.update_activities(widget('activities', []));
+			this.update_alerts(widget('alerts', []));
 			
 		} catch (error) {
 			frappe.msgprint(__('Error loading dashboard data: ') + error.message);
@@ -358,99 +354,6 @@ class ESGOverview {
 		this.hide_loading();
 	}
 
-	async get_kpi_data() {
-		// Get ESG Metric Entries
-		const entries = await frappe.call({
-			method: 'frappe.client.get_list',
-			args: {
-				doctype: 'ESG Metric Entry',
-				fields: [
-					'name', 'metric', 'measured_value', 'target_value',
-					'performance', 'variance', 'source_doctype',
-					'verification_status', 'entry_date'
-				],
-				filters: {
-					...this.get_base_filters(),
-					docstatus: 0
-				},
-				order_by: 'entry_date desc',
-				limit_page_length: 1000
-			}
-		}).then(r => r.message || []);
-
-		// Group by metric type
-		const metricGroups = {
-			Environmental: entries.filter(e => 
-				e.metric.includes('Carbon') || 
-				e.source_doctype === 'Stock Entry'
-			),
-			Social: entries.filter(e => 
-				e.source_doctype === 'Work Order' || 
-				e.source_doctype === 'Production Plan'
-			),
-			Governance: entries.filter(e => 
-				e.source_doctype === 'Purchase Invoice' || 
-				e.verification_status === 'Verified'
-			)
-		};
-
-		// Calculate scores
-		const scores = {
-			environmental: this.calculateScore(metricGroups.Environmental),
-			social: this.calculateScore(metricGroups.Social),
-			governance: this.calculateScore(metricGroups.Governance)
-		};
-
-		// Calculate overall score
-		scores.overall = Math.round((scores.environmental + scores.social + scores.governance) / 3);
-
-		// Calculate trends (compare with last month)
-		const trends = await this.calculateTrends(entries);
-
-		return {
-			...scores,
-			trends
-		};
-	}
-
-	calculateScore(entries) {
-		if (!entries.length) return 0;
-		
-		const greenCount = entries.filter(e => e.performance === 'Green').length;
-		return Math.round((greenCount / entries.length) * 100);
-	}
-
-	async calculateTrends(entries) {
-		const lastMonth = frappe.datetime.add_months(frappe.datetime.get_today(), -1);
-		
-		const oldEntries = entries.filter(e => 
-			frappe.datetime.str_to_obj(e.entry_date) < frappe.datetime.str_to_obj(lastMonth)
-		);
-		
-		const currentEntries = entries.filter(e => 
-			frappe.datetime.str_to_obj(e.entry_date) >= frappe.datetime.str_to_obj(lastMonth)
-		);
-
-		return {
-			environmental: this.calculateTrendChange(
-				this.calculateScore(oldEntries.filter(e => e.metric.includes('Carbon'))),
-				this.calculateScore(currentEntries.filter(e => e.metric.includes('Carbon')))
-			),
-			social: this.calculateTrendChange(
-				this.calculateScore(oldEntries.filter(e => ['Work Order', 'Production Plan'].includes(e.source_doctype))),
-				this.calculateScore(currentEntries.filter(e => ['Work Order', 'Production Plan'].includes(e.source_doctype)))
-			),
-			governance: this.calculateTrendChange(
-				this.calculateScore(oldEntries.filter(e => e.verification_status === 'Verified')),
-				this.calculateScore(currentEntries.filter(e => e.verification_status === 'Verified'))
-			)
-		};
-	}
-
-	calculateTrendChange(oldScore, newScore) {
-		return newScore - oldScore;
-	}
-
 	update_kpi_cards(data) {
 		$('#environmental-score').text(data.environmental || 0);
 		$('#social-score').text(data.social || 0);
@@ -474,12 +377,13 @@ class ESGOverview {
 			.addClass(this.getTrendClass(data.trends.governance));
 		
 		$('#overall-change')
-			.text(this.formatTrend((data.trends.environmental + data.trends.social + data.trends.governance) / 3))
+			.text(this.formatTrend(data.trends.overall))
 			.removeClass('text-success text-danger text-muted')
 			.addClass(this.getTrendClass(data.trends.overall));
 	}
 
 	formatTrend(value) {
+		value = value || 0;
 		if (value > 0) return `↗ +${value.toFixed(1)}%`;
 		if (value < 0) return `↘ ${value.toFixed(1)}%`;
 		return `→ ${value.toFixed(1)}%`;
@@ -491,47 +395,16 @@ class ESGOverview {
 		return 'text-muted';
 	}
 
-	async get_chart_data() {
-		const initiatives = await frappe.call({
-			method: 'frappe.client.get_list',
+	async get_dashboard_data() {
+		// One batched call for every widget of the dashboard
+		return frappe.call({
+			method: 'esg_compliance.esg_compliance.page.esg_overview.esg_overview.get_dashboard_data',
 			args: {
-				doctype: 'ESG Initiative',
-				fields: [
-					'name', 
-					'initiative_name',
-					'status',
-					'related_policy',
-					'start_date',
-					'end_date',
-					'progress_',
-					'priority',
-					'budget',
-					'actual_cost'
-				],
-				filters: {
-					...this.get_base_filters(),
-					docstatus: 0,
-					status: ['!=', 'Completed']
-				}
-			}
-		});
-
-		// Also fetch policies for categorization
-		const policies = await frappe.call({
-			method: 'frappe.client.get_list',
-			args: {
-				doctype: 'ESG Policy',
-				fields: ['name', 'policy_name', 'description'],
-				filters: {
-					docstatus: 0
-				}
+				company: this.filters.company,
+				from_date: this.filters.from_date,
+				to_date: this.filters.to_date
 			}
-		});
-
-		return { 
-			initiatives: initiatives.message || [], 
-			policies: policies.message || [] 
-		};
+		}).then(r => r.message || { widgets: {} });
 	}
 
 	render_initiative_chart(data) {
@@ -546,47 +419,14 @@ class ESGOverview {
 			this.initiativeChart.destroy();
 		}
 
-		// Group initiatives by policy category
-		const categoryMap = {
-			'Environmental': ['carbon', 'emission', 'environmental', 'energy', 'waste'],
-			'Social': ['social', 'employee', 'community', 'health', 'safety'],
-			'Governance': ['governance', 'compliance', 'risk', 'policy', 'regulatory']
-		};
-
-		const policyTypes = {
-			'Environmental': 0,
-			'Social': 0,
-			'Governance': 0
-		};
-
-		data.initiatives.forEach(initiative => {
-			let categorized = false;
-			const policyDesc = data.policies.find(p => p.name === initiative.related_policy)?.description?.toLowerCase() || '';
-			
-			for (const [category, keywords] of Object.entries(categoryMap)) {
-				if (keywords.some(keyword => 
-					policyDesc.includes(keyword) || 
-					initiative.initiative_name?.toLowerCase().includes(keyword)
-				)) {
-					policyTypes[category]++;
-					categorized = true;
-					break;
-				}
-			}
-			
-			if (!categorized) {
-				// Default to Governance if no clear category
-				policyTypes['Governance']++;
-			}
-		});
-
 		this.initiativeChart = new Chart(ctx, {
 			type: 'doughnut',
 			data: {
-				labels: Object.keys(policyTypes),
+				// Initiatives per ESG category, counted on the server
+				labels: data.labels,
 				datasets: [{
-					data: Object.values(policyTypes),
-					backgroundColor: ['#4ade80', '#60a5fa', '#a78bfa'],
+					data: data.data,
+					backgroundColor: data.colors,
 					borderWidth: 0
 				}]
 			},
@@ -611,7 +451,7 @@ class ESGOverview {
 		});
 	}
 
-	render_metrics_trend_chart() {
+	render_metrics_trend_chart(dashboardData) {
 		if (!window.Chart) {
 			console.error('Chart.js not loaded');
 			return;
@@ -624,38 +464,33 @@ class ESGOverview {
 			this.metricsChart.destroy();
 		}
 
-		frappe.call({
-			method: 'esg_compliance.esg_compliance.page.esg_overview.esg_overview.get_metrics_trend',
-			args: {
-				filters: this.get_base_filters()
-			}
-		}).then(r => {
-			const { labels, datasets } = r.message;
-			
-			this.metricsChart = new Chart(ctx, {
-				type: 'line',
-				data: {
-					labels,
-					datasets: datasets.map(d => ({
-						label: d.label,
-						data: d.data,
-						borderColor: d.color,
-						backgroundColor: `${d.color}20`,
-						fill: true,
-						tension: 0.4
-					}))
-				},
-				options: {
-					responsive: true,
-					maintainAspectRatio: false,
-					scales: {
-						y: {
-							beginAtZero: true,
-							max: 100
-						}
+		// Trend series arrives with the batched dashboard payload
+		const trend = dashboardData?.widgets?.initiative_trend?.data || { labels: [], datasets: [] };
+		const { labels, datasets } = trend;
+
+		this.metricsChart = new Chart(ctx, {
+			type: 'line',
+			data: {
+				labels,
+				datasets: datasets.map(d => ({
+					label: d.label,
+					data: d.data,
+					borderColor: d.color,
+					backgroundColor: `${d.color}20`,
+					fill: true,
+					tension: 0.4
+				}))
+			},
+			options: {
+				responsive: true,
+				maintainAspectRatio: false,
+				scales: {
+					y: {
+						beginAtZero: true,
+						max: 100
 					}
 				}
-			});
+			}
 		});
 	}
 
@@ -663,19 +498,19 @@ class ESGOverview {
 		$('#active-policies').text(stats.policies.active || 0);
 		$('#total-policies').text(stats.policies.total || 0);
 		$('#running-initiatives').text(stats.initiatives.running || 0);
-		$('#avg-completion').text(stats.initiatives.avgCompletion || 0);
+		$('#avg-completion').text(stats.initiatives.avg_completion || 0);
 		$('#overdue-actions').text(stats.actions.overdue || 0);
-		$('#due-this-week').text(stats.actions.dueThisWeek || 0);
+		$('#due-this-week').text(stats.actions.due_this_week || 0);
 	}
 
 	update_activities(activities) {
 		const html = activities.map(activity => `
 			<div class="activity-item">
 				<div class="d-flex justify-content-between">
-					<strong>${activity.type}: ${activity.name}</strong>
-					<small class="activity-time">${activity.time}</small>
+					<strong>${activity.type}: ${frappe.utils.escape_html(activity.name)}</strong>
+					<small class="activity-time">${frappe.datetime.comment_when(activity.modified)}</small>
 				</div>
-				<div class="text-muted small">${activity.action} by ${activity.user}</div>
+				<div class="text-muted small">${__('Status changed to {0} by {1}', [activity.status, frappe.utils.escape_html(activity.user)])}</div>
 			</div>
 		`).join('');
 		
@@ -693,141 +528,9 @@ class ESGOverview {
 		$('#priority-alerts').html(html);
 	}
 
-	update_kpi_cards(scores) {
-		const formatTrend = (value) => {
-			if (value > 0) return `↗ +${value}%`;
-			if (value < 0) return `↘ ${value}%`;
-			return `→ ${value}%`;
-		};
-
-		// Update scores
-		$('#environmental-score').text(scores.environmental || 0);
-		$('#social-score').text(scores.social || 0);
-		$('#governance-score').text(scores.governance || 0);
-		$('#overall-score').text(scores.overall || 0);
-
-		// Mock trends (you can replace with actual trend calculation)
-		$('#env-change')
-			.text(formatTrend(2.3))
-			.removeClass('text-success text-danger text-muted')
-			.addClass('text-success');
-		
-		$('#social-change')
-			.text(formatTrend(-1.1))
-			.removeClass('text-success text-danger text-muted')
-			.addClass('text-danger');
-		
-		$('#gov-change')
-			.text(formatTrend(0))
-			.removeClass('text-success text-danger text-muted')
-			.addClass('text-muted');
-		
-		$('#overall-change')
-			.text(formatTrend(0.8))
-			.removeClass('text-success text-danger text-muted')
-			.addClass('text-success');
-	}
-
-	update_charts(data) {
+	update_charts(data, dashboardData) {
 		this.render_initiative_chart(data);
-		this.render_metrics_trend_chart();
-	}
-
-	async get_stats_data() {
-		const [policies, initiatives, actions] = await Promise.all([
-			this.get_policy_stats(),
-			this.get_initiative_stats(),
-			this.get_action_stats()
-		]);
-
-		return { policies, initiatives, actions };
-	}
-
-	async get_policy_stats() {
-		const today = frappe.datetime.get_today();
-		
-		const [active, total] = await Promise.all([
-			frappe.db.get_list('ESG Policy', {
-				filters: {
-					...this.get_base_filters(),
-					docstatus: 0,
-					effective_date: ['<=', today],
-					expiry_date: ['>=', today]
-				},
-				limit: 0
-			}),
-			frappe.db.get_list('ESG Policy', {
-				filters: {
-					...this.get_base_filters(),
-					docstatus: 0
-				},
-				limit: 0
-			})
-		]);
-
-		return { 
-			active: active.length, 
-			total: total.length,
-			expiring_soon: active.filter(p => 
-				frappe.datetime.get_day_diff(p.expiry_date, today) <= 30
-			).length
-		};
-	}
-
-	async get_initiative_stats() {
-		const data = await frappe.db.get_list('ESG Initiative', {
-			fields: [
-				'name', 'status', 'start_date', 'end_date', 
-				'progress_', 'budget', 'actual_cost'
-			],
-			filters: {
-				...this.get_base_filters(),
-				docstatus: 0,
-				status: ['in', ['Planned', 'Ongoing']]
-			}
-		});
-
-		const running = data.length;
-		const avgProgress = data.length ? 
-			Math.round(data.reduce((sum, i) => sum + (i.progress_ || 0), 0) / data.length) : 0;
-		const totalBudget = data.reduce((sum, i) => sum + (i.budget || 0), 0);
-		const totalCost = data.reduce((sum, i) => sum + (i.actual_cost || 0), 0);
-
-		return { 
-			running, 
-			avgProgress,
-			budget_utilization: totalBudget ? Math.round((totalCost / totalBudget) * 100) : 0
-		};
-	}
-
-	async get_action_stats() {
-		const today = frappe.datetime.get_today();
-		const weekLater = frappe.datetime.add_days(today, 7);
-		
-		const [overdue, dueThisWeek] = await Promise.all([
-			frappe.db.count('ESG Action Item', {
-				filters: {
-					...this.get_base_filters(),
-					status: ['!=', 'Completed'],
-					due_date: ['<', today]
-				}
-			}),
-			frappe.db.count('ESG Action Item', {
-				filters: {
-					...this.get_base_filters(),
-					status: ['!=', 'Completed'],
-					due_date: ['between', [today, weekLater]]
-				}
-			})
-		]);
-
-		return { overdue, dueThisWeek };
-	}
-
-	get_base_filters() {
-		const filters = {};
-		if (this.filters.company) filters.company = this.filters.company;
-		return filters;
+		this.render_metrics_trend_chart(dashboardData);
 	}
 
 	show_loading() {
@@ -842,100 +545,4 @@ class ESGOverview {
 		frappe.route_options = this.filters;
 		frappe.set_route('query-report', 'ESG Activity Log');
 	}
-
-	async get_recent_activities() {
-		const activities = await frappe.db.get_list('ESG Initiative', {
-			fields: ['name', 'initiative_name', 'status', 'modified', 'modified_by', 'responsible_person'],
-			filters: {
-				...this.get_base_filters(),
-				docstatus: 0,
-				modified: ['>', frappe.datetime.add_days(frappe.datetime.now_date(), -7)]
-			},
-			order_by: 'modified desc',
-			limit: 5
-		});
-
-		// Get employee names
-		const employeeMap = new Map();
-		const employeeNames = await frappe.db.get_list('Employee', {
-			fields: ['name', 'employee_name'],
-			filters: {
-				name: ['in', activities.map(a => a.responsible_person).filter(Boolean)]
-			}
-		});
-		employeeNames.forEach(e => employeeMap.set(e.name, e.employee_name));
-
-		return activities.map(activity => ({
-			type: 'Initiative',
-			name: activity.initiative_name || activity.name,
-			action: `Status changed to ${activity.status}`,
-			time: frappe.datetime.comment_when(activity.modified),
-			user: employeeMap.get(activity.responsible_person) || activity.modified_by
-		}));
-	}
-
-	async get_priority_alerts() {
-		const alerts = [];
-		const today = frappe.datetime.get_today();
-
-		// Check ESG Metrics that need updating
-		const overdueMetrics = await frappe.db.get_list('ESG Metric Entry', {
-			fields: ['name', 'metric', 'reporting_period', 'modified'],
-			filters: {
-				...this.get_base_filters(),
-				docstatus: 0,
-				modified: ['<', frappe.datetime.add_days(today, -30)]
-			},
-			limit: 5
-		});
-
-		overdueMetrics.forEach(entry => {
-			alerts.push({
-				message: `Metric Entry ${entry.metric} needs updating`,
-				priority: 'high',
-				days: frappe.datetime.get_day_diff(today, entry.modified)
-			});
-		});
-
-		// Check initiatives near deadline
-		const nearingDeadlines = await frappe.db.get_list('ESG Initiative', {
-			fields: ['name', 'initiative_name', 'end_date'],
-			filters: {
-				...this.get_base_filters(),
-				docstatus: 0,
-				status: ['in', ['Planned', 'Ongoing']],
-				end_date: ['between', [today, frappe.datetime.add_days(today, 14)]]
-			},
-			limit: 5
-		});
-
-		nearingDeadlines.forEach(initiative => {
-			alerts.push({
-				message: `Initiative ${initiative.initiative_name || initiative.name} due soon`,
-				priority: 'medium',
-				days: frappe.datetime.get_day_diff(initiative.end_date, today)
-			});
-		});
-
-		// Check policies expiring soon
-		const expiringPolicies = await frappe.db.get_list('ESG Policy', {
-			fields: ['name', 'policy_name', 'expiry_date'],
-			filters: {
-				...this.get_base_filters(),
-				docstatus: 0,
-				expiry_date: ['between', [today, frappe.datetime.add_days(today, 30)]]
-			},
-			limit: 5
-		});
-
-		expiringPolicies.forEach(policy => {
-			alerts.push({
-				message: `Policy ${policy.policy_name || policy.name} expires soon`,
-				priority: 'low',
-				days: frappe.datetime.get_day_diff(policy.expiry_date, today)
-			});
-		});
-
-		return alerts;
-	}
 }
\ No newline at end of file
@@ -1,81 +1,51 @@
 import frappe
 from frappe import _
-from datetime import datetime, timedelta
+from frappe.utils import add_months, flt, getdate
+from datetime import timedelta
 
-@frappe.whitelist()
-def get_metrics_trend(filters=None):
-    try:
-        if isinstance(filters, str):
-            filters = frappe.parse_json(filters)
-
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=180)
-        
-        # Get initiatives with proper category mapping
-        initiatives = frappe.get_all('ESG Initiative',
-            filters={
-                'company': filters.get('company'),
-                'docstatus': 0,
-                'status': ['not in', ['Completed', 'Cancelled']]
-            },
-            fields=['name', 'related_policy', 'start_date', 'end_date']
-        )
+import numpy as np
 
-        # Generate monthly labels
-        labels = []
-        current = start_date
-        while current <= end_date:
-            labels.append(current.strftime('%b %Y'))
-            current += timedelta(days=30)
-
-        # Calculate progress for each category
-        categories = {
-            'Environmental': {'color': '#4ade80', 'data': []},
-            'Social': {'color': '#60a5fa', 'data': []},
-            'Governance': {'color': '#a78bfa', 'data': []}
-        }
+from esg_compliance.cache import get_cached_result
+from esg_compliance.kpi import get_dashboard_kpis
+from esg_compliance.partitioning import company_condition
+from esg_compliance.utils import check_company_access, get_metric_entry_keys, run_concurrently
 
-        # Calculate monthly progress
-        for month_start in range(0, 180, 30):
-            month_date = end_date - timedelta(days=month_start)
-            period_start = month_date - timedelta(days=30)
-
-            for category in categories:
-                # Filter initiatives by policy type
-                category_initiatives = [
-                    i for i in initiatives 
-                    if (i.related_policy and (
-                        (category == 'Environmental' and any(term in i.related_policy.lower() for term in ['environmental', 'carbon', 'energy'])) or
-                        (category == 'Social' and any(term in i.related_policy.lower() for term in ['social', 'employee', 'community'])) or
-                        (category == 'Governance' and any(term in i.related_policy.lower() for term in ['governance', 'compliance', 'policy']))
-                    ))
-                ]
-
-                if category_initiatives:
-                    # Calculate average progress
-                    progress = sum(
-                        min(100, max(0, (
-                            frappe.utils.date_diff(month_date, i.start_date) / 
-                            max(1, frappe.utils.date_diff(i.end_date, i.start_date))
-                        ) * 100))
-                        for i in category_initiatives
-                    ) / len(category_initiatives)
-                else:
-                    progress = 0
-
-                categories[category]['data'].insert(0, round(progress, 2))
+TREND_MONTHS = 6
 
-        return {
-            'labels': labels,
-            'datasets': [
-                {
-                    'label': category,
-                    'data': data['data'],
-                    'color': data['color']
-                }
-                for category, data in categories.items()
-            ]
-        }
+# Small on purpose: every worker holds its own database connection
+DASHBOARD_WORKERS = 4
+
+ENTRY_CONDITIONS = "reporting_period BETWEEN %(from_date)s AND %(to_date)s"
+
+CATEGORY_COLORS = {
+    'Environmental': '#4ade80',
+    'Social': '#60a5fa',
+    'Governance': '#a78bfa'
+}
+
+# Fallback for policies that do not have an ESG Category set yet
+CATEGORY_KEYWORDS = {
+    'Environmental': ['environmental', 'carbon', 'energy'],
+    'Social': ['social', 'employee', 'community'],
+    'Governance': ['governance', 'compliance', 'policy']
+}
+
+# Entries that count towards each pillar of the ESG score
+SCORE_PILLARS = {
+    'environmental': "(metric LIKE '%%Carbon%%' OR source_doctype = 'Stock Entry')",
+    'social': "source_doctype IN ('Work Order', 'Production Plan')",
+    'governance': "(source_doctype = 'Purchase Invoice' OR verification_status = 'Verified')"
+}
+
+@frappe.whitelist()
+def get_metrics_trend(filters=None):
+    if isinstance(filters, str):
+        filters = frappe.parse_json(filters)
+    filters = filters or {}
+    check_company_access(filters.get('company'), 'ESG Initiative')
+
+    try:
+        return get_initiative_trend(filters.get('company'))
 
     except Exception as e:
         error_msg = str(e)[:130] if len(str(e)) > 130 else str(e)
@@ -84,3 +54,358 @@ def get_metrics_trend(filters=None):
             'labels': [],
             'datasets': []
         }
+
+def get_initiative_trend(company):
+    as_on = getdate()
+
+    # Cached per company and day; initiative and policy writes bump the ESG data generation
+    return get_cached_result(
+        "ESG Overview Trend",
+        {'company': company, 'as_on': as_on},
+        lambda: build_metrics_trend(company, as_on)
+    )
+
+def build_metrics_trend(company, as_on):
+    """Average initiative progress per category for the last TREND_MONTHS months"""
+    month_dates = [as_on - timedelta(days=30 * i) for i in reversed(range(TREND_MONTHS))]
+    month_ordinals = [d.toordinal() for d in month_dates]
+
+    categories = list(CATEGORY_COLORS)
+    initiatives = [
+        i for i in get_categorized_initiatives(company)
+        if i.category in CATEGORY_COLORS and i.start_date and i.end_date
+    ]
+
+    # Initiative x month progress matrix, summed per category in one step
+    totals = np.zeros((len(categories), TREND_MONTHS))
+    counts = np.zeros(len(categories))
+    if initiatives:
+        starts = np.array([getdate(i.start_date).toordinal() for i in initiatives], dtype=float)
+        ends = np.array([getdate(i.end_date).toordinal() for i in initiatives], dtype=float)
+        durations = np.maximum(1, ends - starts)
+        progress = np.clip((np.array(month_ordinals)[None, :] - starts[:, None]) / durations[:, None] * 100, 0, 100)
+
+        category_idx = np.array([categories.index(i.category) for i in initiatives])
+        np.add.at(totals, category_idx, progress)
+        counts = np.bincount(category_idx, minlength=len(categories))
+
+    averages = np.divide(totals, counts[:, None], out=np.zeros_like(totals), where=counts[:, None] > 0)
+
+    return {
+        'labels': [d.strftime('%b %Y') for d in month_dates],
+        'datasets': [
+            {
+                'label': category,
+                'data': [round(float(v), 2) for v in averages[idx]],
+                'color': CATEGORY_COLORS[category]
+            }
+            for idx, category in enumerate(categories)
+        ]
+    }
+
+def get_categorized_initiatives(company):
+    """Open initiatives with their ESG category resolved from the related policy"""
+    initiatives = frappe.db.sql("""
+        SELECT
+            ini.name,
+            ini.related_policy,
+            ini.start_date,
+            ini.end_date,
+            pol.esg_category as category
+        FROM `tabESG Initiative` ini
+        LEFT JOIN `tabESG Policy` pol ON pol.name = ini.related_policy
+        WHERE IFNULL(ini.company, '') = %(company)s
+            AND ini.docstatus = 0
+            AND IFNULL(ini.status, '') NOT IN ('Completed', 'Cancelled')
+    """, {'company': company or ''}, as_dict=True)
+
+    for initiative in initiatives:
+        if not initiative.category:
+            initiative.category = get_category_from_policy_name(initiative.related_policy)
+
+    return initiatives
+
+def get_category_from_policy_name(policy):
+    if not policy:
+        return None
+
+    policy = policy.lower()
+    for category, keywords in CATEGORY_KEYWORDS.items():
+        if any(term in policy for term in keywords):
+            return category
+
+    return None
+
+@frappe.whitelist()
+def get_dashboard_data(company=None, from_date=None, to_date=None, dashboard=None):
+    """Compute every ESG Overview widget in one call.
+
+    Independent widgets run concurrently, each on its own database connection,
+    and the payload reports how long each widget took.
+    """
+    check_company_access(company)
+    to_date = getdate(to_date)
+    from_date = getdate(from_date) if from_date else add_months(to_date, -12)
+    if from_date > to_date:
+        frappe.throw(_("From Date cannot be greater than To Date"))
+
+    config = get_dashboard_config(company, dashboard)
+    period = {'company': company, 'from_date': from_date, 'to_date': to_date}
+
+    tasks = {
+        'scores': (get_esg_scores, period),
+        'initiative_categories': (get_initiative_categories, {'company': company}),
+        'initiative_trend': (get_initiative_trend, {'company': company}),
+        'kpi_cards': (get_dashboard_kpis, {**period, 'dashboard': config.get('name')}),
+        'chart_metrics': (get_chart_metrics, {**period, 'chart_metrics': config.get('chart_metrics', [])}),
+        'performance_distribution': (get_performance_distribution, period),
+        'verification_backlog': (get_verification_backlog, period),
+        'stats': (get_overview_stats, {'company': company}),
+        'activities': (get_recent_activities, {'company': company}),
+        'alerts': (get_priority_alerts, {'company': company})
+    }
+
+    widgets = run_concurrently(tasks, max_workers=DASHBOARD_WORKERS)
+
+    return {
+        'dashboard': config.get('name'),
+        'company': company,
+        'from_date': from_date,
+        'to_date': to_date,
+        'widgets': widgets,
+        'timings': {key: widget['time'] for key, widget in widgets.items()}
+    }
+
+def get_dashboard_config(company=None, dashboard=None):
+    """Resolve the ESG Dashboard to use: explicit, company default, then global default"""
+    if not dashboard:
+        candidates = frappe.get_all('ESG Dashboard',
+            filters={'company': ['in', [company, '']] if company else ['is', 'not set']},
+            fields=['name', 'company', 'is_default'],
+            order_by='is_default desc, modified desc'
+        )
+        # Prefer a dashboard configured for this company over a company-less one
+        candidates.sort(key=lambda d: (d.company != company, not d.is_default))
+        dashboard = candidates[0].name if candidates else None
+
+    if not dashboard:
+        return {}
+
+    doc = frappe.get_cached_doc('ESG Dashboard', dashboard)
+    return {
+        'name': doc.name,
+        'chart_metrics': [{'metric': d.metric, 'color': d.color} for d in doc.chart_metrics]
+    }
+
+def get_chart_metrics(company, from_date, to_date, chart_metrics):
+    """Monthly totals for every configured chart metric in one grouped query"""
+    if not chart_metrics:
+        return {'labels': [], 'datasets': []}
+
+    keys = get_metric_entry_keys({d['metric'] for d in chart_metrics})
+    series = {}
+    if keys:
+        rows = frappe.db.sql(f"""
+            SELECT metric, DATE_FORMAT(reporting_period, '%%Y-%%m') as month, SUM(value) as total
+            FROM `tabESG Metric Entry`
+            WHERE {company_condition(company)} AND {ENTRY_CONDITIONS} AND metric IN %(keys)s
+            GROUP BY metric, month
+        """, {'company': company or '', 'from_date': from_date, 'to_date': to_date, 'keys': tuple(keys)}, as_dict=True)
+
+        for row in rows:
+            months = series.setdefault(keys[row.metric], {})
+            months[row.month] = months.get(row.month, 0) + flt(row.total)
+
+    labels = []
+    month = getdate(from_date).replace(day=1)
+    while month <= getdate(to_date):
+        labels.append(month.strftime('%Y-%m'))
+        month = add_months(month, 1)
+
+    return {
+        'labels': labels,
+        'datasets': [
+            {
+                'metric': d['metric'],
+                'color': d.get('color'),
+                'data': [flt(series.get(d['metric'], {}).get(label), 2) for label in labels]
+            }
+            for d in chart_metrics
+        ]
+    }
+
+def get_performance_distribution(company, from_date, to_date):
+    rows = frappe.db.sql(f"""
+        SELECT IFNULL(performance, 'Not Set') as performance, COUNT(*) as entries
+        FROM `tabESG Metric Entry`
+        WHERE {company_condition(company)} AND {ENTRY_CONDITIONS}
+        GROUP BY IFNULL(performance, 'Not Set')
+    """, {'company': company or '', 'from_date': from_date, 'to_date': to_date}, as_dict=True)
+
+    return {row.performance: row.entries for row in rows}
+
+def get_verification_backlog(company, from_date, to_date):
+    """Entry counts per verification status, plus pending entries past their verification date"""
+    params = {'company': company or '', 'from_date': from_date, 'to_date': to_date, 'today': getdate()}
+    rows = frappe.db.sql(f"""
+        SELECT
+            IFNULL(verification_status, 'Pending') as status,
+            COUNT(*) as entries,
+            SUM(CASE WHEN verification_date < %(today)s THEN 1 ELSE 0 END) as overdue
+        FROM `tabESG Metric Entry`
+        WHERE {company_condition(company)} AND {ENTRY_CONDITIONS}
+        GROUP BY IFNULL(verification_status, 'Pending')
+    """, params, as_dict=True)
+
+    backlog = {'Pending': 0, 'Verified': 0, 'Rejected': 0, 'overdue': 0}
+    for row in rows:
+        backlog[row.status] = row.entries
+        if row.status == 'Pending':
+            backlog['overdue'] = int(row.overdue or 0)
+
+    return backlog
+
+def get_esg_scores(company, from_date, to_date):
+    """Share of Green entries per pillar, and its change over the last month of the period"""
+    params = {
+        'company': company or '', 'from_date': from_date, 'to_date': to_date,
+        'last_month': add_months(to_date, -1)
+    }
+    columns = []
+    for pillar, condition in SCORE_PILLARS.items():
+        for window, window_condition in (('old', '<'), ('current', '>=')):
+            in_window = f"{condition} AND reporting_period {window_condition} %(last_month)s"
+            columns += [
+                f"SUM(CASE WHEN {in_window} THEN 1 ELSE 0 END) as {pillar}_{window}",
+                f"SUM(CASE WHEN {in_window} AND performance = 'Green' THEN 1 ELSE 0 END) as {pillar}_{window}_green"
+            ]
+
+    row = frappe.db.sql(f"""
+        SELECT {', '.join(columns)}
+        FROM `tabESG Metric Entry`
+        WHERE {company_condition(company)} AND {ENTRY_CONDITIONS}
+    """, params, as_dict=True)[0]
+
+    def score(entries, green):
+        return round(flt(green) / flt(entries) * 100) if flt(entries) else 0
+
+    scores, trends = {}, {}
+    for pillar in SCORE_PILLARS:
+        old, current = f'{pillar}_old', f'{pillar}_current'
+        scores[pillar] = score(
+            flt(row[old]) + flt(row[current]), flt(row[f'{old}_green']) + flt(row[f'{current}_green'])
+        )
+        trends[pillar] = score(row[current], row[f'{current}_green']) - score(row[old], row[f'{old}_green'])
+
+    scores['overall'] = round(sum(scores.values()) / len(SCORE_PILLARS))
+    trends['overall'] = flt(sum(trends.values()) / len(SCORE_PILLARS), 1)
+    return {**scores, 'trends': trends}
+
+def get_initiative_categories(company):
+    """Open initiatives per ESG category; uncategorized ones count as Governance"""
+    counts = {category: 0 for category in CATEGORY_COLORS}
+    for initiative in get_categorized_initiatives(company):
+        counts[initiative.category if initiative.category in counts else 'Governance'] += 1
+
+    return {
+        'labels': list(counts),
+        'data': list(counts.values()),
+        'colors': list(CATEGORY_COLORS.values())
+    }
+
+def get_overview_stats(company):
+    """Policy, initiative and action item counts for the summary cards"""
+    params = {'company': company or '', 'today': getdate(), 'week_later': getdate() + timedelta(days=7)}
+
+    policies = frappe.db.sql(f"""
+        SELECT
+            COUNT(*) as total,
+            SUM(CASE WHEN effective_date <= %(today)s AND expiry_date >= %(today)s THEN 1 ELSE 0 END) as active
+        FROM `tabESG Policy`
+        WHERE {company_condition(company)} AND docstatus = 0
+    """, params, as_dict=True)[0]
+
+    initiatives = frappe.db.sql(f"""
+        SELECT COUNT(*) as running, AVG(IFNULL(progress_, 0)) as avg_completion
+        FROM `tabESG Initiative`
+        WHERE {company_condition(company)} AND docstatus = 0 AND status IN ('Planned', 'Ongoing')
+    """, params, as_dict=True)[0]
+
+    # Action items live on the ESG Compliance Reports of the company
+    actions = frappe.db.sql(f"""
+        SELECT
+            SUM(CASE WHEN ai.due_date < %(today)s THEN 1 ELSE 0 END) as overdue,
+            SUM(CASE WHEN ai.due_date BETWEEN %(today)s AND %(week_later)s THEN 1 ELSE 0 END) as due_this_week
+        FROM `tabESG Action Item` ai
+        JOIN `tabESG Compliance Report` cr ON cr.name = ai.parent AND ai.parenttype = 'ESG Compliance Report'
+        WHERE {company_condition(company, 'cr')} AND cr.docstatus < 2 AND IFNULL(ai.status, '') != 'Completed'
+    """, params, as_dict=True)[0]
+
+    return {
+        'policies': {'active': int(policies.active or 0), 'total': policies.total},
+        'initiatives': {'running': initiatives.running, 'avg_completion': round(flt(initiatives.avg_completion))},
+        'actions': {'overdue': int(actions.overdue or 0), 'due_this_week': int(actions.due_this_week or 0)}
+    }
+
+def get_recent_activities(company):
+    """Initiatives changed in the last week"""
+    return frappe.db.sql(f"""
+        SELECT
+            'Initiative' as type,
+            IFNULL(NULLIF(ini.initiative_name, ''), ini.name) as name,
+            ini.status,
+            ini.modified,
+            IFNULL(emp.employee_name, ini.modified_by) as user
+        FROM `tabESG Initiative` ini
+        LEFT JOIN `tabEmployee` emp ON emp.name = ini.responsible_person
+        WHERE {company_condition(company, 'ini')} AND ini.docstatus = 0 AND ini.modified > %(since)s
+        ORDER BY ini.modified DESC
+        LIMIT 5
+    """, {'company': company or '', 'since': getdate() - timedelta(days=7)}, as_dict=True)
+
+def get_priority_alerts(company):
+    """Stale metric entries, initiatives due within two weeks and policies expiring within a month"""
+    today = getdate()
+    params = {
+        'company': company or '', 'today': today,
+        'stale_before': today - timedelta(days=30),
+        'due_before': today + timedelta(days=14),
+        'expires_before': today + timedelta(days=30)
+    }
+    alerts = []
+
+    for entry in frappe.db.sql(f"""
+        SELECT metric, modified FROM `tabESG Metric Entry`
+        WHERE {company_condition(company)} AND docstatus = 0 AND modified < %(stale_before)s
+        LIMIT 5
+    """, params, as_dict=True):
+        alerts.append({
+            'message': _('Metric Entry {0} needs updating').format(entry.metric),
+            'priority': 'high',
+            'days': (today - getdate(entry.modified)).days
+        })
+
+    for initiative in frappe.db.sql(f"""
+        SELECT IFNULL(NULLIF(initiative_name, ''), name) as name, end_date FROM `tabESG Initiative`
+        WHERE {company_condition(company)} AND docstatus = 0 AND status IN ('Planned', 'Ongoing')
+            AND end_date BETWEEN %(today)s AND %(due_before)s
+        LIMIT 5
+    """, params, as_dict=True):
+        alerts.append({
+            'message': _('Initiative {0} due soon').format(initiative.name),
+            'priority': 'medium',
+            'days': (getdate(initiative.end_date) - today).days
+        })
+
+    for policy in frappe.db.sql(f"""
+        SELECT IFNULL(NULLIF(policy_name, ''), name) as name, expiry_date FROM `tabESG Policy`
+        WHERE {company_condition(company)} AND docstatus = 0 AND expiry_date BETWEEN %(today)s AND %(expires_before)s
+        LIMIT 5
+    """, params, as_dict=True):
+        alerts.append({
+            'message': _('Policy {0} expires soon').format(policy.name),
+            'priority': 'low',
+            'days': (getdate(policy.expiry_date) - today).days
+        })
+
+    return alerts
@@ -5,12 +5,21 @@ import frappe
 from frappe import _
 from frappe.utils import getdate, formatdate, flt
 
+from esg_compliance.cache import get_cached_result
+from esg_compliance.partitioning import partition_conditions
+
 def execute(filters=None):
     """Main report execution"""
     if not filters:
         filters = frappe._dict({})
     
     validate_filters(filters)
+    
+    # Repeat views with the same filters are served from the report cache
+    return get_cached_result("ESG Activity Log", filters, lambda: build_report(filters))
+
+def build_report(filters):
+    """Build the report output for validated filters"""
     columns = get_columns()
     data = get_data(filters)
     chart = get_chart_data(data)
@@ -98,10 +107,7 @@ def get_columns():
     ]
 
 def get_conditions(filters):
-    conditions = ["1=1"]
-    
-    if filters.get("company"):
-        conditions.append("company = %(company)s")
+    conditions = partition_conditions("ESG Metric Entry", filters, prune_by_dates=True)
     
     if filters.get("from_date"):
         conditions.append("entry_date >= %(from_date)s")
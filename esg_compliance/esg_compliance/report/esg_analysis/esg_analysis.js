@@ -145,6 +145,41 @@ frappe.query_reports["ESG Analysis"] = {
 			frappe.tools.downloadify(report.data, null, report.report_name);
 		});
 
+		report.page.add_inner_button(__("Export All Entries"), function() {
+			frappe.prompt([
+				{
+					fieldname: "file_format",
+					label: __("Format"),
+					fieldtype: "Select",
+					options: "CSV\nXLSX\nParquet",
+					default: "CSV",
+					reqd: 1
+				}
+			], function(values) {
+				frappe.realtime.off("esg_export_ready");
+				frappe.realtime.on("esg_export_ready", function(data) {
+					frappe.msgprint({
+						title: __("Export Ready"),
+						message: __("Download {0}", [`<a href="${data.file_url}" target="_blank">${data.file_name}</a>`]),
+						indicator: "green"
+					});
+				});
+
+				frappe.call({
+					method: "esg_compliance.metric_export.export_metric_entries",
+					args: {
+						filters: report.get_values(),
+						file_format: values.file_format
+					},
+					callback: function(r) {
+						if (!r.exc) {
+							frappe.show_alert({ message: __("Export queued, you will be notified when it is ready"), indicator: "blue" });
+						}
+					}
+				});
+			}, __("Export ESG Metric Entries"), __("Export"));
+		});
+
 		report.page.add_inner_button(__("Send Email Report"), function() {
 			frappe.prompt([
 				{
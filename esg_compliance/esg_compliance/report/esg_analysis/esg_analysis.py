@@ -7,6 +7,9 @@ from frappe.utils import flt, getdate, formatdate, add_months, get_first_day, ge
 from datetime import datetime, timedelta
 import json
 
+from esg_compliance.cache import get_cached_result
+from esg_compliance.partitioning import partition_conditions
+
 def execute(filters=None):
 	"""
 	Execute ESG Analysis Report
@@ -24,6 +27,11 @@ def execute(filters=None):
 	# Validate required filters
 	validate_filters(filters)
 	
+	# Repeat views with the same filters are served from the report cache
+	return get_cached_result("ESG Analysis", filters, lambda: build_report(filters))
+
+def build_report(filters):
+	"""Build columns and data for validated filters"""
 	# Get columns based on filters
 	columns = get_columns(filters)
 	
@@ -232,10 +240,7 @@ def get_data(filters):
 
 def get_conditions(filters):
 	"""Build WHERE conditions based on filters"""
-	conditions = []
-	
-	if filters.get("company"):
-		conditions.append("eme.company = %(company)s")
+	conditions = partition_conditions("ESG Metric Entry", filters, "eme", prune_by_dates=True)
 	
 	if filters.get("metric"):
 		conditions.append("eme.metric = %(metric)s")
@@ -264,7 +269,7 @@ def get_conditions(filters):
 	if filters.get("data_source"):
 		conditions.append("eme.data_source = %(data_source)s")
 	
-	return " AND ".join(conditions) if conditions else "1=1"
+	return " AND ".join(conditions)
 
 def process_row(row, filters):
 	"""Process individual row data"""
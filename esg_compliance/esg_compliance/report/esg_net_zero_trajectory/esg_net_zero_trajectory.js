@@ -0,0 +1,45 @@
+// Copyright (c) 2025, K. Ronoh and contributors
+// For license information, please see license.txt
+
+frappe.query_reports["ESG Net Zero Trajectory"] = {
+	"filters": [
+		{
+			"fieldname": "company",
+			"label": __("Company"),
+			"fieldtype": "Link",
+			"options": "Company",
+			"default": frappe.defaults.get_user_default("Company"),
+			"reqd": 1
+		},
+		{
+			"fieldname": "from_date",
+			"label": __("From Date"),
+			"fieldtype": "Date",
+			"default": frappe.datetime.add_months(frappe.datetime.month_start(), -11),
+			"reqd": 1
+		},
+		{
+			"fieldname": "to_date",
+			"label": __("To Date"),
+			"fieldtype": "Date",
+			"default": frappe.datetime.month_end(),
+			"reqd": 1
+		}
+	],
+
+	"formatter": function(value, row, column, data, default_formatter) {
+		value = default_formatter(value, row, column, data);
+		if (!data) return value;
+
+		if (column.fieldname === "status") {
+			const color = data.actual <= data.target ? "green" : "red";
+			return `<span class="indicator-pill ${color}">${value}</span>`;
+		}
+
+		if (column.fieldname === "variance" && data.variance > 0) {
+			return `<span style="color: #dc3545;">${value}</span>`;
+		}
+
+		return value;
+	}
+};
@@ -0,0 +1,168 @@
+# Copyright (c) 2025, K. Ronoh and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe import _
+from frappe.utils import add_months, flt, get_first_day, getdate
+
+from esg_compliance.cache import get_cached_result
+from esg_compliance.period_close import MONTHLY_TOTALS
+from esg_compliance.trajectory import get_emission_metrics
+
+
+def execute(filters=None):
+	"""
+	Execute ESG Net Zero Trajectory Report
+
+	Compares actual monthly emissions with the precomputed company trajectory
+	"""
+	filters = frappe._dict(filters or {})
+	validate_filters(filters)
+
+	return get_cached_result("ESG Net Zero Trajectory", filters, lambda: build_report(filters))
+
+
+def validate_filters(filters):
+	if not filters.get("company"):
+		frappe.throw(_("Company is required"))
+
+	if not filters.get("to_date"):
+		filters["to_date"] = getdate()
+
+	if not filters.get("from_date"):
+		filters["from_date"] = add_months(getdate(filters.to_date), -11)
+
+	if getdate(filters.from_date) > getdate(filters.to_date):
+		frappe.throw(_("From Date cannot be greater than To Date"))
+
+
+def build_report(filters):
+	metrics = get_emission_metrics()
+	data = get_data(filters, metrics)
+	message = None
+	if not metrics:
+		message = _("No ESG Metric is marked Counts Toward Net Zero, so actual emissions are zero.")
+	return get_columns(), data, message, get_chart(data), get_summary(data)
+
+
+def get_columns():
+	return [
+		{"fieldname": "month", "label": _("Month"), "fieldtype": "Date", "width": 110},
+		{
+			"fieldname": "target",
+			"label": _("Target (kg CO2e)"),
+			"fieldtype": "Float",
+			"precision": 2,
+			"width": 150,
+		},
+		{
+			"fieldname": "actual",
+			"label": _("Actual (kg CO2e)"),
+			"fieldtype": "Float",
+			"precision": 2,
+			"width": 150,
+		},
+		{
+			"fieldname": "variance",
+			"label": _("Variance (kg CO2e)"),
+			"fieldtype": "Float",
+			"precision": 2,
+			"width": 150,
+		},
+		{"fieldname": "variance_pct", "label": _("Variance %"), "fieldtype": "Percent", "width": 100},
+		{
+			"fieldname": "cumulative_target",
+			"label": _("Cumulative Target"),
+			"fieldtype": "Float",
+			"precision": 2,
+			"width": 150,
+		},
+		{
+			"fieldname": "cumulative_actual",
+			"label": _("Cumulative Actual"),
+			"fieldtype": "Float",
+			"precision": 2,
+			"width": 150,
+		},
+		{"fieldname": "status", "label": _("Status"), "fieldtype": "Data", "width": 100},
+	]
+
+
+def get_data(filters, metrics):
+	"""Join the trajectory with the monthly totals of the emission metrics in one query"""
+	rows = frappe.db.sql(
+		f"""
+		SELECT
+			t.month,
+			t.target_emissions as target,
+			IFNULL(SUM(s.total_value), 0) as actual
+		FROM `tabESG Emission Trajectory` t
+		LEFT JOIN {MONTHLY_TOTALS} s
+			ON s.company = t.company
+			AND s.month = t.month
+			AND s.metric IN %(metrics)s
+		WHERE t.company = %(company)s
+			AND t.month BETWEEN %(from_date)s AND %(to_date)s
+		GROUP BY t.month, t.target_emissions
+		ORDER BY t.month
+		""",
+		{
+			"company": filters.company,
+			"from_date": get_first_day(filters.from_date),
+			"to_date": getdate(filters.to_date),
+			# An empty IN () is invalid SQL; no metric is stored under ""
+			"metrics": tuple(metrics) or ("",),
+		},
+		as_dict=True,
+	)
+
+	cumulative_target = cumulative_actual = 0
+	for row in rows:
+		row.variance = flt(row.actual - row.target, 2)
+		row.variance_pct = flt(row.variance / row.target * 100, 2) if row.target else 0
+		cumulative_target += flt(row.target)
+		cumulative_actual += flt(row.actual)
+		row.cumulative_target = cumulative_target
+		row.cumulative_actual = cumulative_actual
+		row.status = _("On Track") if row.actual <= row.target else _("Off Track")
+
+	return rows
+
+
+def get_chart(data):
+	if not data:
+		return None
+
+	return {
+		"data": {
+			"labels": [row.month.strftime("%b %Y") for row in data],
+			"datasets": [
+				{"name": _("Target"), "values": [flt(row.target, 2) for row in data]},
+				{"name": _("Actual"), "values": [flt(row.actual, 2) for row in data]},
+			],
+		},
+		"type": "line",
+		"colors": ["#60a5fa", "#f87171"],
+	}
+
+
+def get_summary(data):
+	if not data:
+		return []
+
+	target, actual = data[-1].cumulative_target, data[-1].cumulative_actual
+	return [
+		{"value": target, "label": _("Target (kg CO2e)"), "datatype": "Float", "indicator": "Blue"},
+		{
+			"value": actual,
+			"label": _("Actual (kg CO2e)"),
+			"datatype": "Float",
+			"indicator": "Green" if actual <= target else "Red",
+		},
+		{
+			"value": sum(1 for row in data if row.actual > row.target),
+			"label": _("Months Off Track"),
+			"datatype": "Int",
+			"indicator": "Orange",
+		},
+	]
@@ -0,0 +1,46 @@
+// Copyright (c) 2025, K. Ronoh and contributors
+// For license information, please see license.txt
+
+frappe.query_reports["ESG Scope Breakdown"] = {
+	"filters": [
+		{
+			"fieldname": "company",
+			"label": __("Company"),
+			"fieldtype": "Link",
+			"options": "Company"
+		},
+		{
+			"fieldname": "from_date",
+			"label": __("From Date"),
+			"fieldtype": "Date",
+			"default": frappe.datetime.add_months(frappe.datetime.get_today(), -12),
+			"reqd": 1
+		},
+		{
+			"fieldname": "to_date",
+			"label": __("To Date"),
+			"fieldtype": "Date",
+			"default": frappe.datetime.get_today(),
+			"reqd": 1
+		},
+		{
+			"fieldname": "group_by",
+			"label": __("Group By"),
+			"fieldtype": "Select",
+			"options": "Scope\nEmission Source\nScope and Emission Source\nVoucher Type",
+			"default": "Scope and Emission Source"
+		},
+		{
+			"fieldname": "voucher_type",
+			"label": __("Voucher Type"),
+			"fieldtype": "Select",
+			"options": "\nSales Invoice\nPurchase Invoice\nDelivery Note\nStock Entry\nWork Order"
+		},
+		{
+			"fieldname": "use_snapshot",
+			"label": __("Use Nightly Snapshot"),
+			"fieldtype": "Check",
+			"description": __("Read from the columnar snapshot built each night instead of the database")
+		}
+	]
+};
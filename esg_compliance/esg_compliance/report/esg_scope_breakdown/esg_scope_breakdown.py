@@ -0,0 +1,179 @@
+# Copyright (c) 2025, K. Ronoh and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe import _
+from frappe.utils import add_months, flt, getdate
+
+from esg_compliance.analytics_snapshot import aggregate, snapshot_available
+from esg_compliance.cache import get_cached_result
+from esg_compliance.partitioning import partition_conditions
+
+GROUP_BY_FIELDS = {
+	"Scope": ["carbon_scope"],
+	"Emission Source": ["emission_source"],
+	"Scope and Emission Source": ["carbon_scope", "emission_source"],
+	"Voucher Type": ["voucher_type"],
+}
+
+
+def execute(filters=None):
+	"""
+	Execute ESG Scope Breakdown Report
+
+	Aggregates the emission ledger by company and GHG scope / emission source
+	"""
+	filters = frappe._dict(filters or {})
+	validate_filters(filters)
+
+	return get_cached_result("ESG Scope Breakdown", filters, lambda: build_report(filters))
+
+
+def validate_filters(filters):
+	if not filters.get("to_date"):
+		filters["to_date"] = getdate()
+
+	if not filters.get("from_date"):
+		filters["from_date"] = add_months(getdate(filters.to_date), -12)
+
+	if getdate(filters.from_date) > getdate(filters.to_date):
+		frappe.throw(_("From Date cannot be greater than To Date"))
+
+	filters["group_by"] = filters.get("group_by") or "Scope and Emission Source"
+	if filters.group_by not in GROUP_BY_FIELDS:
+		frappe.throw(_("Invalid Group By {0}").format(filters.group_by))
+
+
+def build_report(filters):
+	data = get_data(filters)
+	return get_columns(filters), data, None, get_chart(data, filters)
+
+
+def get_columns(filters):
+	labels = {
+		"carbon_scope": _("Carbon Scope"),
+		"emission_source": _("Emission Source"),
+		"voucher_type": _("Voucher Type"),
+	}
+	columns = [
+		{
+			"fieldname": "company",
+			"label": _("Company"),
+			"fieldtype": "Link",
+			"options": "Company",
+			"width": 180,
+		}
+	]
+	columns += [
+		{"fieldname": field, "label": labels[field], "fieldtype": "Data", "width": 180}
+		for field in GROUP_BY_FIELDS[filters.group_by]
+	]
+	columns += [
+		{
+			"fieldname": "emissions_kg",
+			"label": _("Emissions (kg CO2e)"),
+			"fieldtype": "Float",
+			"precision": 2,
+			"width": 160,
+		},
+		{
+			"fieldname": "emissions_tonnes",
+			"label": _("Emissions (t CO2e)"),
+			"fieldtype": "Float",
+			"precision": 3,
+			"width": 140,
+		},
+		{"fieldname": "share", "label": _("Share of Company %"), "fieldtype": "Percent", "width": 140},
+		{"fieldname": "vouchers", "label": _("Documents"), "fieldtype": "Int", "width": 100},
+	]
+	return columns
+
+
+def get_data(filters):
+	if filters.get("use_snapshot") and snapshot_available():
+		rows = get_snapshot_rows(filters)
+	else:
+		rows = get_ledger_rows(filters)
+
+	company_totals = {}
+	for row in rows:
+		company_totals[row.company] = company_totals.get(row.company, 0) + flt(row.emissions_kg)
+
+	for row in rows:
+		total = company_totals[row.company]
+		row.emissions_tonnes = flt(row.emissions_kg / 1000, 3)
+		row.share = flt(row.emissions_kg / total * 100, 2) if total else 0
+
+	return rows
+
+
+def get_ledger_rows(filters):
+	group_fields = GROUP_BY_FIELDS[filters.group_by]
+	conditions = [
+		"is_cancelled = 0",
+		*partition_conditions(
+			"ESG Emission Ledger", filters, from_date=filters.from_date, to_date=filters.to_date
+		),
+	]
+	if filters.get("voucher_type"):
+		conditions.append("voucher_type = %(voucher_type)s")
+
+	group_by = ", ".join(["company", *group_fields])
+	return frappe.db.sql(
+		f"""
+		SELECT {group_by},
+			SUM(emissions_kg_co2e) as emissions_kg,
+			COUNT(DISTINCT voucher_type, voucher_no) as vouchers
+		FROM `tabESG Emission Ledger`
+		WHERE {" AND ".join(conditions)}
+		GROUP BY {group_by}
+		ORDER BY {group_by}
+		""",
+		filters,
+		as_dict=True,
+	)
+
+
+def get_snapshot_rows(filters):
+	"""Same aggregation as `get_ledger_rows`, read from the nightly columnar snapshot"""
+	group_by = ["company", *GROUP_BY_FIELDS[filters.group_by]]
+	result = aggregate(
+		"ledger",
+		"emissions_kg_co2e",
+		group_by=group_by,
+		date_column="posting_date",
+		from_date=filters.from_date,
+		to_date=filters.to_date,
+		companies=get_snapshot_companies(filters),
+		where={"voucher_type": filters.voucher_type} if filters.get("voucher_type") else None,
+		distinct=("voucher_type", "voucher_no"),
+	)
+	return [
+		frappe._dict(zip(group_by, key, strict=True), emissions_kg=value["sum"], vouchers=value["distinct"])
+		for key, value in sorted(result.items())
+	]
+
+
+def get_snapshot_companies(filters):
+	"""The filtered company, else every company the user may read (and entries stored without one)"""
+	if filters.get("company"):
+		return [filters.company]
+	return ["", *frappe.get_list("Company", pluck="name")]
+
+
+def get_chart(data, filters):
+	field = GROUP_BY_FIELDS[filters.group_by][0]
+	totals = {}
+	for row in data:
+		totals[row[field]] = totals.get(row[field], 0) + flt(row.emissions_kg)
+
+	if not totals:
+		return None
+
+	return {
+		"data": {
+			"labels": list(totals),
+			"datasets": [{"name": _("Emissions (kg CO2e)"), "values": [flt(v, 2) for v in totals.values()]}],
+		},
+		"type": "donut",
+	}
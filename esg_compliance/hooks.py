@@ -44,7 +44,13 @@ app_license = "mit"
 
 # include js in doctype views
 # doctype_js = {"doctype" : "public/js/doctype.js"}
+doctype_js = {
+    "ESG Audit": "public/js/esg_audit.js",
+    "ESG Compliance Report": "public/js/esg_compliance_report.js",
+    "ESG Entry Archive": "public/js/esg_entry_archive.js"
+}
 # doctype_list_js = {"doctype" : "public/js/doctype_list.js"}
+doctype_list_js = {"ESG Metric Entry": "public/js/esg_metric_entry_list.js"}
 # doctype_tree_js = {"doctype" : "public/js/doctype_tree.js"}
 # doctype_calendar_js = {"doctype" : "public/js/doctype_calendar.js"}
 
@@ -85,6 +91,15 @@ app_license = "mit"
 # before_install = "esg_compliance.install.before_install"
 # after_install = "esg_compliance.install.after_install"
 
+# Runs after fixtures are synced, unlike post_model_sync patches, so the ESG
+# doctypes and custom fields exist by then
+after_migrate = [
+    "esg_compliance.trajectory.build_missing_trajectories",
+    "esg_compliance.supplier_carbon.build_missing_supplier_buckets",
+    "esg_compliance.partitioning.partition_tables",
+    "esg_compliance.partitioning.add_indexes"
+]
+
 # Uninstallation
 # ------------
 
@@ -138,52 +153,154 @@ app_license = "mit"
 # Hook on document methods and events
 
 doc_events = {
+    "Company": {
+        "on_update": "esg_compliance.trajectory.on_company_update"
+    },
     "Sales Invoice": {
-        "on_submit": "esg_compliance.api.create_esg_metric_entry",
-        "on_cancel": "esg_compliance.api.delete_esg_metric_entry"
+        "validate": "esg_compliance.carbon_offset.set_offset_cost",
+        "on_submit": [
+            "esg_compliance.api.create_esg_metric_entry",
+            "esg_compliance.emission_ledger.make_ledger_entries"
+        ],
+        "on_cancel": [
+            "esg_compliance.api.delete_esg_metric_entry",
+            "esg_compliance.emission_ledger.cancel_ledger_entries"
+        ]
     },
     "Purchase Invoice": {
-        "on_submit": "esg_compliance.api.create_purchase_esg_metric_entry",
-        "on_cancel": "esg_compliance.api.delete_esg_metric_entry"
+        "on_submit": [
+            "esg_compliance.api.create_purchase_esg_metric_entry",
+            "esg_compliance.emission_ledger.make_ledger_entries",
+            "esg_compliance.supplier_carbon.update_supplier_profile"
+        ],
+        "on_cancel": [
+            "esg_compliance.api.delete_esg_metric_entry",
+            "esg_compliance.emission_ledger.cancel_ledger_entries",
+            "esg_compliance.supplier_carbon.revert_supplier_profile"
+        ]
     },
     "Stock Entry": {
-        "on_submit": "esg_compliance.api.create_stock_esg_metric_entry",
-        "on_cancel": "esg_compliance.api.delete_esg_metric_entry"
+        "on_submit": [
+            "esg_compliance.api.create_stock_esg_metric_entry",
+            "esg_compliance.emission_ledger.make_ledger_entries"
+        ],
+        "on_cancel": [
+            "esg_compliance.api.delete_esg_metric_entry",
+            "esg_compliance.emission_ledger.cancel_ledger_entries"
+        ]
     },
     "Work Order": {
-        "on_submit": "esg_compliance.api.create_workorder_esg_metric_entry",
-        "on_cancel": "esg_compliance.api.delete_esg_metric_entry"
+        "on_submit": [
+            "esg_compliance.api.create_workorder_esg_metric_entry",
+            "esg_compliance.emission_ledger.make_ledger_entries"
+        ],
+        "on_cancel": [
+            "esg_compliance.api.delete_esg_metric_entry",
+            "esg_compliance.emission_ledger.cancel_ledger_entries"
+        ]
     },
     "Production Plan": {
         "on_submit": "esg_compliance.api.create_production_plan_esg_metric_entry",
         "on_cancel": "esg_compliance.api.delete_esg_metric_entry"
     },
     "Delivery Note": {
-        "on_submit": "esg_compliance.api.create_delivery_esg_metric_entry",
-        "on_cancel": "esg_compliance.api.delete_esg_metric_entry"
+        "on_submit": [
+            "esg_compliance.api.create_delivery_esg_metric_entry",
+            "esg_compliance.emission_ledger.make_ledger_entries"
+        ],
+        "on_cancel": [
+            "esg_compliance.api.delete_esg_metric_entry",
+            "esg_compliance.emission_ledger.cancel_ledger_entries"
+        ]
+    },
+    "ESG Metric Entry": {
+        "validate": [
+            "esg_compliance.partitioning.set_partition_defaults",
+            "esg_compliance.period_close.validate_open_period",
+            "esg_compliance.performance.classify_entry"
+        ],
+        "on_update": [
+            "esg_compliance.cache.invalidate",
+            "esg_compliance.metric_series.mark_bucket_dirty"
+        ],
+        "on_trash": [
+            "esg_compliance.period_close.validate_open_period",
+            "esg_compliance.cache.invalidate",
+            "esg_compliance.metric_series.mark_bucket_dirty"
+        ]
+    },
+    "ESG Period Close": {
+        "validate": "esg_compliance.period_close.validate_period_close",
+        "before_submit": "esg_compliance.period_close.validate_completeness",
+        "on_submit": "esg_compliance.period_close.close_period",
+        "before_cancel": "esg_compliance.entry_archive.validate_not_archived",
+        "on_cancel": "esg_compliance.period_close.reopen_period"
+    },
+    "ESG Initiative": {
+        "on_update": "esg_compliance.cache.invalidate",
+        "on_trash": "esg_compliance.cache.invalidate"
+    },
+    "ESG Policy": {
+        "on_update": "esg_compliance.cache.invalidate",
+        "on_trash": "esg_compliance.cache.invalidate"
+    },
+    "ESG Metric": {
+        "validate": [
+            "esg_compliance.metric_formula.validate_formula",
+            "esg_compliance.metric_integration.validate_integrations",
+            "esg_compliance.performance.validate_thresholds"
+        ],
+        "on_update": [
+            "esg_compliance.cache.invalidate",
+            "esg_compliance.performance.on_metric_update",
+            "esg_compliance.report_template.clear_template_plans"
+        ],
+        "on_trash": [
+            "esg_compliance.cache.invalidate",
+            "esg_compliance.performance.clear_metric_bands",
+            "esg_compliance.report_template.clear_template_plans"
+        ]
+    },
+    "ESG Report Template": {
+        "on_update": "esg_compliance.report_template.clear_template_plan",
+        "on_trash": "esg_compliance.report_template.clear_template_plan"
+    },
+    "ESG Carbon Offset Price": {
+        "on_update": "esg_compliance.carbon_offset.on_price_change",
+        "on_trash": "esg_compliance.carbon_offset.on_price_change"
+    },
+    "ESG Anomaly": {
+        "on_update": "esg_compliance.anomaly.sync_entry_flag",
+        "on_trash": "esg_compliance.anomaly.sync_entry_flag"
+    },
+    "ESG Dashboard": {
+        "on_update": "esg_compliance.cache.invalidate",
+        "on_trash": "esg_compliance.cache.invalidate"
     }
 }
 
 # Scheduled Tasks
 # ---------------
 
-# scheduler_events = {
-# 	"all": [
-# 		"esg_compliance.tasks.all"
-# 	],
-# 	"daily": [
-# 		"esg_compliance.tasks.daily"
-# 	],
-# 	"hourly": [
-# 		"esg_compliance.tasks.hourly"
-# 	],
-# 	"weekly": [
-# 		"esg_compliance.tasks.weekly"
-# 	],
-# 	"monthly": [
-# 		"esg_compliance.tasks.monthly"
-# 	],
-# }
+scheduler_events = {
+    "hourly": [
+        "esg_compliance.metric_series.refresh_metric_series",
+        "esg_compliance.metric_scheduler.enqueue_due_metrics",
+        "esg_compliance.anomaly.detect_anomalies"
+    ],
+    "daily": [
+        "esg_compliance.metric_formula.run_calculated_metrics",
+        "esg_compliance.supplier_carbon.compact_supplier_profiles",
+        "esg_compliance.partitioning.maintain_partitions"
+    ],
+    "monthly": [
+        "esg_compliance.carbon_statement.generate_last_month_statements"
+    ],
+    "daily_long": [
+        "esg_compliance.entry_archive.archive_closed_periods",
+        "esg_compliance.analytics_snapshot.build_snapshot"
+    ]
+}
 
 # Testing
 # -------
@@ -279,7 +396,7 @@ fixtures = [
                 "Company",
                 "Customer",
                 "Supplier",
-                "Work Order", 
+                "Work Order",
                 "Production Plan",
                 "Stock Entry",
                 "Delivery Note",
@@ -0,0 +1,148 @@
+# Copyright (c) 2025, K. Ronoh and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe import _
+from frappe.utils import add_days, add_months, date_diff, flt, getdate
+
+from esg_compliance.cache import get_cached_result
+from esg_compliance.partitioning import company_condition
+from esg_compliance.utils import check_company_access, get_metric_entry_keys
+
+SPARKLINE_MONTHS = 12
+
+# Metrics of these data types are averaged over a period instead of summed
+AVERAGED_DATA_TYPES = ("Percentage", "Ratio")
+
+
+@frappe.whitelist()
+def get_dashboard_kpis(company=None, from_date=None, to_date=None, dashboard=None):
+	"""KPI card values for an ESG Dashboard, cached per company and period"""
+	check_company_access(company)
+	to_date = getdate(to_date)
+	from_date = getdate(from_date) if from_date else add_months(to_date, -1)
+	if from_date > to_date:
+		frappe.throw(_("From Date cannot be greater than To Date"))
+
+	filters = {"company": company, "from_date": from_date, "to_date": to_date, "dashboard": dashboard}
+	return get_cached_result(
+		"ESG KPI Cards",
+		filters,
+		lambda: compute_kpi_cards(company, from_date, to_date, get_dashboard_cards(dashboard)),
+	)
+
+
+def get_dashboard_cards(dashboard):
+	if not dashboard:
+		return []
+
+	return frappe.get_all(
+		"ESG KPI Card",
+		filters={"parent": dashboard, "parenttype": "ESG Dashboard"},
+		fields=["metric", "card_title", "display_order", "show_trend"],
+		order_by="display_order asc, idx asc",
+	)
+
+
+def compute_kpi_cards(company, from_date, to_date, cards):
+	"""Resolve all cards with a single grouped query over ESG Metric Entry.
+
+	Each card gets the current period value, the value for the equally long period
+	immediately before it, and monthly sparkline buckets when `show_trend` is set.
+	"""
+	if not cards:
+		return []
+
+	from_date, to_date = getdate(from_date), getdate(to_date)
+	prev_to = add_days(from_date, -1)
+	prev_from = add_days(prev_to, -date_diff(to_date, from_date))
+	spark_from = add_months(to_date, -(SPARKLINE_MONTHS - 1)).replace(day=1)
+
+	metrics = frappe.get_all(
+		"ESG Metric",
+		filters={"name": ["in", list({card.metric for card in cards})]},
+		fields=["name", "metric_name", "unit", "data_type", "target_value"],
+	)
+	metrics = {m.name: m for m in metrics}
+	keys = get_metric_entry_keys(metrics)
+
+	buckets = {}
+	if keys:
+		rows = frappe.db.sql(
+			f"""
+			SELECT
+				metric,
+				DATE_FORMAT(reporting_period, '%%Y-%%m') as bucket,
+				SUM(CASE WHEN reporting_period BETWEEN %(from_date)s AND %(to_date)s THEN value ELSE 0 END) as current_total,
+				SUM(CASE WHEN reporting_period BETWEEN %(from_date)s AND %(to_date)s THEN 1 ELSE 0 END) as current_count,
+				SUM(CASE WHEN reporting_period BETWEEN %(prev_from)s AND %(prev_to)s THEN value ELSE 0 END) as previous_total,
+				SUM(CASE WHEN reporting_period BETWEEN %(prev_from)s AND %(prev_to)s THEN 1 ELSE 0 END) as previous_count,
+				SUM(value) as bucket_total,
+				COUNT(*) as bucket_count
+			FROM `tabESG Metric Entry`
+			WHERE {company_condition(company)}
+				AND metric IN %(keys)s
+				AND reporting_period BETWEEN %(start)s AND %(to_date)s
+			GROUP BY metric, bucket
+			""",
+			{
+				"company": company or "",
+				"keys": tuple(keys),
+				"from_date": from_date,
+				"to_date": to_date,
+				"prev_from": prev_from,
+				"prev_to": prev_to,
+				"start": min(prev_from, spark_from),
+			},
+			as_dict=True,
+		)
+
+		for row in rows:
+			metric = keys[row.metric]
+			acc = buckets.setdefault(metric, {"current": [0.0, 0], "previous": [0.0, 0], "sparkline": {}})
+			acc["current"][0] += flt(row.current_total)
+			acc["current"][1] += int(row.current_count or 0)
+			acc["previous"][0] += flt(row.previous_total)
+			acc["previous"][1] += int(row.previous_count or 0)
+			spark = acc["sparkline"].setdefault(row.bucket, [0.0, 0])
+			spark[0] += flt(row.bucket_total)
+			spark[1] += int(row.bucket_count or 0)
+
+	spark_labels = [add_months(spark_from, i).strftime("%Y-%m") for i in range(SPARKLINE_MONTHS)]
+
+	result = []
+	for card in sorted(cards, key=lambda c: c.display_order or 0):
+		metric = metrics.get(card.metric) or frappe._dict(name=card.metric)
+		acc = buckets.get(card.metric, {"current": [0.0, 0], "previous": [0.0, 0], "sparkline": {}})
+		averaged = metric.data_type in AVERAGED_DATA_TYPES
+
+		current = _aggregate(acc["current"], averaged)
+		previous = _aggregate(acc["previous"], averaged)
+
+		kpi = {
+			"metric": card.metric,
+			"card_title": card.card_title or metric.metric_name or card.metric,
+			"display_order": card.display_order,
+			"unit": metric.unit,
+			"target_value": metric.target_value,
+			"current_value": current,
+			"previous_value": previous,
+			"change_percent": flt((current - previous) / previous * 100, 2) if previous else None,
+		}
+		if card.show_trend:
+			kpi["sparkline"] = {
+				"labels": spark_labels,
+				"values": [
+					_aggregate(acc["sparkline"].get(label, [0.0, 0]), averaged) for label in spark_labels
+				],
+			}
+		result.append(kpi)
+
+	return result
+
+
+def _aggregate(total_and_count, averaged):
+	total, count = total_and_count
+	if averaged:
+		return flt(total / count, 2) if count else 0
+	return flt(total, 2)
@@ -0,0 +1,214 @@
+# Copyright (c) 2025, K. Ronoh and contributors
+# For license information, please see license.txt
+
+"""Streaming export of ESG Metric Entries to CSV, XLSX or Parquet.
+
+Rows are read from an unbuffered cursor with the filters of the ESG Analysis
+report and written in chunks, so memory stays flat however many entries match.
+XLSX uses openpyxl's write-only workbook; Parquet needs pyarrow and is only
+offered when it is installed.
+
+The file is written straight into the site's private files and registered as
+a File without being read back, then the user is notified over realtime.
+"""
+
+import csv
+import hashlib
+import os
+from itertools import islice
+
+import frappe
+from frappe import _
+from frappe.utils import cint, getdate, now_datetime
+
+from esg_compliance.esg_compliance.report.esg_analysis.esg_analysis import get_conditions
+
+try:
+	import pyarrow as pa
+	import pyarrow.parquet as pq
+except ImportError:
+	pa = pq = None
+
+CHUNK_SIZE = 10000
+
+# Rows per worksheet, below the XLSX limit of 1,048,576 including the header
+XLSX_SHEET_ROWS = 1000000
+
+# (fieldname, pyarrow type name)
+EXPORT_FIELDS = (
+	("name", "string"),
+	("metric", "string"),
+	("company", "string"),
+	("reporting_period", "date"),
+	("period_from", "date"),
+	("period_to", "date"),
+	("entry_date", "string"),
+	("value", "float"),
+	("unit", "string"),
+	("target_value", "string"),
+	("variance", "string"),
+	("performance", "string"),
+	("source_doctype", "string"),
+	("source_document", "string"),
+	("party_type", "string"),
+	("party", "string"),
+	("data_source", "string"),
+	("verification_status", "string"),
+	("verified_by", "string"),
+	("verification_date", "string"),
+	("is_anomalous", "int"),
+	("remarks", "string"),
+)
+
+FORMATS = {"CSV": "csv", "XLSX": "xlsx", "Parquet": "parquet"}
+
+
+def get_available_formats():
+	return [file_format for file_format in FORMATS if file_format != "Parquet" or pa]
+
+
+@frappe.whitelist()
+def export_metric_entries(filters=None, file_format="CSV"):
+	"""Queue an export of the entries matching the ESG Analysis filters"""
+	frappe.has_permission("ESG Metric Entry", "export", throw=True)
+	if file_format not in get_available_formats():
+		frappe.throw(_("Export format {0} is not available").format(file_format))
+
+	filters = frappe.parse_json(filters) if isinstance(filters, str) else (filters or {})
+	frappe.enqueue(
+		"esg_compliance.metric_export.run_export",
+		queue="long",
+		timeout=7200,
+		enqueue_after_commit=True,
+		filters=filters,
+		file_format=file_format,
+		user=frappe.session.user,
+	)
+	return {"queued": True}
+
+
+def stream_rows(filters):
+	"""Yield entry tuples in EXPORT_FIELDS order from an unbuffered cursor"""
+	columns = ", ".join(f"eme.`{fieldname}`" for fieldname, _type in EXPORT_FIELDS)
+	with frappe.db.unbuffered_cursor():
+		yield from frappe.db.sql(
+			f"""
+			SELECT {columns}
+			FROM `tabESG Metric Entry` eme
+			WHERE {get_conditions(filters)}
+			ORDER BY eme.name
+			""",
+			filters,
+			as_iterator=True,
+		)
+
+
+def chunked(rows, size=CHUNK_SIZE):
+	rows = iter(rows)
+	while chunk := list(islice(rows, size)):
+		yield chunk
+
+
+def write_csv(path, rows):
+	with open(path, "w", newline="", encoding="utf-8") as f:
+		writer = csv.writer(f)
+		writer.writerow([fieldname for fieldname, _type in EXPORT_FIELDS])
+		for chunk in chunked(rows):
+			writer.writerows(chunk)
+
+
+def write_xlsx(path, rows):
+	from openpyxl import Workbook
+
+	header = [fieldname for fieldname, _type in EXPORT_FIELDS]
+	workbook = Workbook(write_only=True)
+	sheet = workbook.create_sheet("ESG Metric Entries 1")
+	sheet.append(header)
+	for count, row in enumerate(rows, 1):
+		sheet.append(row)
+		if count % XLSX_SHEET_ROWS == 0:
+			sheet = workbook.create_sheet(f"ESG Metric Entries {count // XLSX_SHEET_ROWS + 1}")
+			sheet.append(header)
+	workbook.save(path)
+
+
+def get_parquet_schema():
+	types = {"string": pa.string(), "date": pa.date32(), "float": pa.float64(), "int": pa.int8()}
+	return pa.schema([(fieldname, types[type_]) for fieldname, type_ in EXPORT_FIELDS])
+
+
+def write_parquet(path, rows):
+	schema = get_parquet_schema()
+	with pq.ParquetWriter(path, schema, compression="snappy") as writer:
+		for chunk in chunked(rows):
+			columns = list(zip(*chunk, strict=True))
+			arrays = [
+				pa.array(
+					[str(v) if v is not None and field.type == pa.string() else v for v in column],
+					type=field.type,
+				)
+				for field, column in zip(schema, columns, strict=True)
+			]
+			writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+
+
+WRITERS = {"CSV": write_csv, "XLSX": write_xlsx, "Parquet": write_parquet}
+
+
+def run_export(filters, file_format="CSV", user=None):
+	filters = frappe._dict(filters or {})
+	for field in ("from_date", "to_date"):
+		if filters.get(field):
+			filters[field] = getdate(filters[field])
+
+	file_name = "esg-metric-entries-{}-{}.{}".format(
+		now_datetime().strftime("%Y%m%d-%H%M%S"), frappe.generate_hash(length=6), FORMATS[file_format]
+	)
+	path = frappe.get_site_path("private", "files", file_name)
+
+	try:
+		WRITERS[file_format](path, stream_rows(filters))
+		file_doc = register_file(path, file_name, user or frappe.session.user)
+	except Exception:
+		if os.path.exists(path):
+			os.remove(path)
+		frappe.log_error(title="ESG Metric Entry Export Failed")
+		frappe.publish_realtime("esg_export_failed", {"file_format": file_format}, user=user)
+		raise
+
+	frappe.db.commit()
+	frappe.publish_realtime(
+		"esg_export_ready",
+		{"file_url": file_doc.file_url, "file_name": file_name, "file_size": cint(file_doc.file_size)},
+		user=user,
+	)
+	return file_doc.file_url
+
+
+def register_file(path, file_name, user):
+	"""Insert the File row for a file already on disk, hashing it in blocks instead of reading it whole"""
+	content_hash = hashlib.md5()
+	with open(path, "rb") as f:
+		for block in iter(lambda: f.read(1 << 20), b""):
+			content_hash.update(block)
+
+	now = now_datetime()
+	file_doc = frappe.get_doc(
+		{
+			"doctype": "File",
+			"name": frappe.generate_hash(length=10),
+			"owner": user,
+			"modified_by": user,
+			"creation": now,
+			"modified": now,
+			"file_name": file_name,
+			"file_url": f"/private/files/{file_name}",
+			"is_private": 1,
+			"folder": "Home",
+			"file_size": os.path.getsize(path),
+			"content_hash": content_hash.hexdigest(),
+		}
+	)
+	# File.before_insert would load the whole file to hash and copy it
+	file_doc.db_insert()
+	return file_doc
@@ -0,0 +1,430 @@
+# Copyright (c) 2025, K. Ronoh and contributors
+# For license information, please see license.txt
+
+"""Evaluator for `ESG Metric.auto_calculation_formula`.
+
+Formulas are Python-style expressions restricted to numbers, arithmetic
+(+ - * / % **), the functions in FUNCTIONS and references to other metrics,
+either by metric code (`ENV_001`) or by name (`metric("Carbon Footprint")`).
+
+Each formula is parsed and validated once and cached by its hash. Referenced
+metrics are resolved in dependency order and every formula is evaluated over a
+(company x month) array of values in one step, instead of once per entry.
+
+	ENV_001 * 0.233 + metric("Fuel Usage") * 2.68
+	rolling_avg(SOC_001, 3)
+	(ENV_002 - lag(ENV_002)) / lag(ENV_002) * 100
+"""
+
+import ast
+from functools import lru_cache
+from graphlib import CycleError, TopologicalSorter
+
+import frappe
+import numpy as np
+from frappe import _
+from frappe.utils import add_months, cstr, get_first_day, get_last_day, getdate
+
+from esg_compliance.kpi import AVERAGED_DATA_TYPES
+from esg_compliance.metric_integration import save_metric_entries
+from esg_compliance.period_close import MONTHLY_TOTALS
+from esg_compliance.utils import get_metric_entry_keys
+
+# Months of history loaded so windowed functions (lag, rolling_*) have context
+HISTORY_MONTHS = 12
+
+
+class FormulaError(frappe.ValidationError):
+	pass
+
+
+def _series(x):
+	return np.atleast_1d(np.asarray(x, dtype=float))
+
+
+def _lag(x, periods=1):
+	x, periods = _series(x), int(periods)
+	out = np.zeros_like(x)
+	if periods < x.shape[-1]:
+		out[..., periods:] = x[..., :-periods] if periods else x
+	return out
+
+
+def _rolling_sum(x, periods):
+	x, periods = _series(x), max(1, int(periods))
+	total = np.cumsum(x, axis=-1)
+	out = total.copy()
+	out[..., periods:] = total[..., periods:] - total[..., :-periods]
+	return out
+
+
+def _rolling_avg(x, periods):
+	x, periods = _series(x), max(1, int(periods))
+	counts = np.minimum(np.arange(1, x.shape[-1] + 1), periods)
+	return _rolling_sum(x, periods) / counts
+
+
+# Elementwise functions take any number of arguments; window functions work along months
+FUNCTIONS = {
+	"abs": np.abs,
+	"round": lambda x, digits=0: np.round(x, int(digits)),
+	"min": lambda *args: np.minimum.reduce(np.broadcast_arrays(*args)),
+	"max": lambda *args: np.maximum.reduce(np.broadcast_arrays(*args)),
+	"sum": lambda *args: np.add.reduce(np.broadcast_arrays(*args)),
+	"avg": lambda *args: np.add.reduce(np.broadcast_arrays(*args)) / len(args),
+	"cumsum": lambda x: np.cumsum(_series(x), axis=-1),
+	"lag": _lag,
+	"rolling_sum": _rolling_sum,
+	"rolling_avg": _rolling_avg,
+}
+
+ALLOWED_NODES = (
+	ast.Expression,
+	ast.BinOp,
+	ast.UnaryOp,
+	ast.Call,
+	ast.Name,
+	ast.Load,
+	ast.Constant,
+	ast.Add,
+	ast.Sub,
+	ast.Mult,
+	ast.Div,
+	ast.Mod,
+	ast.Pow,
+	ast.USub,
+	ast.UAdd,
+)
+
+# Distinct formulas kept compiled per worker
+COMPILED_FORMULA_CACHE_SIZE = 512
+
+
+class CompiledFormula:
+	"""A validated formula compiled to a code object.
+
+	`references` maps the placeholder variables used in the code object to
+	("code" | "name", value) tuples that still need resolving to ESG Metrics.
+	"""
+
+	def __init__(self, code, references):
+		self.code = code
+		self.references = references
+
+	def evaluate(self, values):
+		"""Evaluate with `values` mapping each placeholder to an array"""
+		with np.errstate(all="ignore"):
+			try:
+				result = eval(self.code, {"__builtins__": {}}, {**FUNCTIONS, **values})
+			except (ArithmeticError, TypeError, ValueError) as e:
+				raise FormulaError(_("Formula could not be evaluated: {0}").format(e))
+
+		return np.asarray(result, dtype=float)
+
+
+class _ReferenceRewriter(ast.NodeTransformer):
+	"""Validate the tree and replace metric references with placeholder names"""
+
+	def __init__(self):
+		self.references = {}
+
+	def placeholder(self, reference):
+		for key, value in self.references.items():
+			if value == reference:
+				return ast.Name(id=key, ctx=ast.Load())
+
+		key = f"_ref{len(self.references)}"
+		self.references[key] = reference
+		return ast.Name(id=key, ctx=ast.Load())
+
+	def generic_visit(self, node):
+		if not isinstance(node, ALLOWED_NODES):
+			raise FormulaError(_("{0} is not allowed in a formula").format(type(node).__name__))
+		return super().generic_visit(node)
+
+	def visit_Constant(self, node):
+		if isinstance(node.value, bool) or not isinstance(node.value, int | float):
+			raise FormulaError(_("Only numbers are allowed as constants in a formula"))
+		# Floats overflow instead of building arbitrarily large integers
+		return ast.Constant(value=float(node.value))
+
+	def visit_Name(self, node):
+		if node.id.startswith("_"):
+			raise FormulaError(_("{0} is not a valid metric code").format(node.id))
+		return self.placeholder(("code", node.id))
+
+	def visit_Call(self, node):
+		if not isinstance(node.func, ast.Name) or node.keywords:
+			raise FormulaError(_("Only plain function calls are allowed in a formula"))
+
+		if node.func.id == "metric":
+			if len(node.args) != 1 or not (
+				isinstance(node.args[0], ast.Constant) and isinstance(node.args[0].value, str)
+			):
+				raise FormulaError(_('metric() takes a single metric name, e.g. metric("Carbon Footprint")'))
+			return self.placeholder(("name", node.args[0].value))
+
+		if node.func.id not in FUNCTIONS:
+			raise FormulaError(_("Unknown function {0} in formula").format(node.func.id))
+
+		node.args = [self.visit(arg) for arg in node.args]
+		return node
+
+
+def compile_formula(formula):
+	"""Parse and validate a formula, reusing the compiled form for identical formulas"""
+	return _compile_formula(cstr(formula).strip())
+
+
+@lru_cache(maxsize=COMPILED_FORMULA_CACHE_SIZE)
+def _compile_formula(formula):
+	try:
+		tree = ast.parse(formula, mode="eval")
+	except SyntaxError as e:
+		raise FormulaError(_("Invalid formula: {0}").format(e.msg))
+
+	rewriter = _ReferenceRewriter()
+	tree = ast.fix_missing_locations(rewriter.visit(tree))
+	return CompiledFormula(compile(tree, "<esg formula>", "eval"), rewriter.references)
+
+
+def validate_formula(doc, method=None):
+	"""validate hook for ESG Metric"""
+	if not doc.auto_calculation_formula:
+		if doc.collection_method == "Calculated" and doc.active:
+			frappe.throw(_("Auto Calculation Formula is required for Calculated metrics"))
+		return
+
+	index = get_metric_index()
+	compiled = compile_formula(doc.auto_calculation_formula)
+	resolved = resolve_references(compiled, index)
+	if doc.name in resolved.values():
+		frappe.throw(_("A metric formula cannot reference the metric itself"), FormulaError)
+
+	if doc.collection_method != "Calculated" or not doc.active:
+		return
+
+	calculated = {m.name: m.references for m in load_calculated_metrics(index) if m.name != doc.name}
+	calculated[doc.name] = resolved
+	cycle = find_cycle(get_dependency_graph(calculated))
+	if cycle:
+		frappe.throw(
+			_("Metric formulas would reference each other in a cycle: {0}").format(" → ".join(cycle)),
+			FormulaError,
+		)
+
+
+def get_metric_index():
+	"""Lookup of ESG Metrics by code, name and metric name"""
+	index = {"code": {}, "name": {}}
+	for m in frappe.get_all("ESG Metric", fields=["name", "metric_name", "metric_code"]):
+		if m.metric_code:
+			index["code"][m.metric_code] = m.name
+		index["name"][m.name] = m.name
+		if m.metric_name:
+			index["name"].setdefault(m.metric_name, m.name)
+
+	return index
+
+
+def resolve_references(compiled, index):
+	"""Map each placeholder of a compiled formula to an ESG Metric name"""
+	resolved = {}
+	for key, (kind, value) in compiled.references.items():
+		if value not in index[kind]:
+			raise FormulaError(_("Formula references unknown metric {0}").format(value))
+		resolved[key] = index[kind][value]
+
+	return resolved
+
+
+def load_calculated_metrics(index, metrics=None):
+	"""Active calculated metrics with their compiled formulas and resolved references.
+
+	Metrics whose formula does not compile or resolve are logged and skipped.
+	"""
+	filters = {"active": 1, "collection_method": "Calculated", "auto_calculation_formula": ["is", "set"]}
+	if metrics:
+		filters["name"] = ["in", list(metrics)]
+
+	calculated = []
+	for m in frappe.get_all(
+		"ESG Metric", filters=filters, fields=["name", "company", "auto_calculation_formula"]
+	):
+		try:
+			compiled = compile_formula(m.auto_calculation_formula)
+			calculated.append(
+				frappe._dict(m, compiled=compiled, references=resolve_references(compiled, index))
+			)
+		except FormulaError as e:
+			frappe.log_error(message=f"{m.name}: {e}", title="ESG Metric Formula Error")
+
+	return calculated
+
+
+def get_dependency_graph(references):
+	"""{metric: calculated metrics it references} from {metric: {placeholder: metric}}"""
+	return {name: {ref for ref in refs.values() if ref in references} for name, refs in references.items()}
+
+
+def find_cycle(graph):
+	"""One cycle of the graph as a list of metrics (first repeated last), or None"""
+	try:
+		TopologicalSorter(graph).prepare()
+	except CycleError as e:
+		return e.args[1]
+
+
+def get_calculated_metrics(metrics=None):
+	"""Active calculated metrics with their compiled formulas, in dependency order.
+
+	Metrics whose formulas reference each other in a cycle are logged and
+	skipped; the rest are still evaluated.
+	"""
+	calculated = {m.name: m for m in load_calculated_metrics(get_metric_index(), metrics)}
+	graph = get_dependency_graph({name: m.references for name, m in calculated.items()})
+
+	while cycle := find_cycle(graph):
+		frappe.log_error(
+			message=" → ".join(cycle), title="ESG Metric Formula Cycle", reference_doctype="ESG Metric"
+		)
+		members = set(cycle)
+		for name in members:
+			graph.pop(name, None)
+			calculated.pop(name, None)
+		for refs in graph.values():
+			refs -= members
+
+	return [calculated[name] for name in TopologicalSorter(graph).static_order()]
+
+
+def load_metric_values(metrics, companies, months):
+	"""Monthly values of `metrics` from the materialized series as {metric: array(company x month)}"""
+	values = {metric: np.zeros((len(companies), len(months))) for metric in metrics}
+	if not metrics:
+		return values
+
+	keys = get_metric_entry_keys(metrics)
+	averaged = set(
+		frappe.get_all(
+			"ESG Metric",
+			filters={"name": ["in", list(metrics)], "data_type": ["in", AVERAGED_DATA_TYPES]},
+			pluck="name",
+		)
+	)
+	company_idx = {company: i for i, company in enumerate(companies)}
+	month_idx = {month: i for i, month in enumerate(months)}
+
+	rows = frappe.db.sql(
+		f"""
+		SELECT IFNULL(company, '') as company, metric, month,
+			SUM(total_value) as total, SUM(entry_count) as entries
+		FROM {MONTHLY_TOTALS} s
+		WHERE metric IN %(keys)s AND month BETWEEN %(from_date)s AND %(to_date)s
+		GROUP BY IFNULL(company, ''), metric, month
+		""",
+		{"keys": tuple(keys), "from_date": months[0], "to_date": months[-1]},
+		as_dict=True,
+	)
+	for row in rows:
+		metric = keys.get(row.metric)
+		i, j = company_idx.get(row.company), month_idx.get(getdate(row.month))
+		if metric not in values or i is None or j is None:
+			continue
+		if metric in averaged:
+			values[metric][i, j] = row.total / row.entries if row.entries else 0
+		else:
+			values[metric][i, j] += row.total or 0
+
+	return values
+
+
+def evaluate_calculated_metrics(from_date, to_date, metrics=None):
+	"""Evaluate calculated metrics for every company and month in the range.
+
+	Returns ({(metric, company): array of monthly values}, months). Formulas are
+	evaluated in dependency order, so a formula may use other calculated metrics.
+	"""
+	months = []
+	month = get_first_day(getdate(from_date))
+	while month <= getdate(to_date):
+		months.append(month)
+		month = add_months(month, 1)
+
+	calculated = get_calculated_metrics(metrics)
+	if not calculated or not months:
+		return {}, months
+
+	companies = ["", *frappe.get_all("Company", pluck="name", order_by="name")]
+	inputs = {ref for m in calculated for ref in m.references.values()} - {m.name for m in calculated}
+	values = load_metric_values(inputs, companies, months)
+
+	results = {}
+	for m in calculated:
+		try:
+			out = m.compiled.evaluate({key: values[ref] for key, ref in m.references.items()})
+			# A result that does not fit (companies, months) raises ValueError here
+			values[m.name] = np.broadcast_to(out, (len(companies), len(months)))
+		except (FormulaError, KeyError, ValueError) as e:
+			frappe.log_error(message=f"{m.name}: {e}", title="ESG Metric Formula Error")
+			continue
+
+		for i, company in enumerate(companies):
+			if m.company and company != m.company:
+				continue
+			results[(m.name, company)] = values[m.name][i]
+
+	return results, months
+
+
+def run_calculated_metrics(from_date=None, to_date=None, metrics=None):
+	"""Evaluate calculated metrics and store one entry per metric, company and month.
+
+	Only months from `from_date` are stored, but HISTORY_MONTHS before it are
+	loaded so windowed functions see prior periods. Non-finite results (e.g. a
+	division by zero) and companies without any values are skipped.
+	"""
+	to_date = getdate(to_date)
+	from_date = get_first_day(getdate(from_date) if from_date else add_months(to_date, -1))
+
+	results, months = evaluate_calculated_metrics(
+		add_months(from_date, -HISTORY_MONTHS), to_date, metrics=metrics
+	)
+
+	saved = []
+	for j, month in enumerate(months):
+		if month < from_date:
+			continue
+
+		period = {}
+		for (metric, company), series in results.items():
+			value = float(series[j])
+			if np.isfinite(value) and series.any():
+				period[(metric, company)] = round(value, 6)
+
+		saved += save_metric_entries(
+			period,
+			month,
+			get_last_day(month),
+			data_source="Calculated",
+			remarks="Calculated from the metric formula",
+		)
+
+	frappe.db.commit()
+	return saved
+
+
+@frappe.whitelist()
+def enqueue_calculated_metrics(from_date=None, to_date=None, metrics=None):
+	"""Evaluate calculated metrics for a period in the long queue"""
+	frappe.only_for("System Manager")
+	if isinstance(metrics, str):
+		metrics = frappe.parse_json(metrics)
+
+	frappe.enqueue(
+		run_calculated_metrics,
+		queue="long",
+		from_date=from_date,
+		to_date=to_date,
+		metrics=metrics,
+	)
@@ -0,0 +1,372 @@
+# Copyright (c) 2025, K. Ronoh and contributors
+# For license information, please see license.txt
+
+"""Bulk import of externally measured ESG Metric Entries from CSV or JSONL.
+
+The file is streamed in batches. Metric, company and party lookups are
+loaded into dicts once per run, values and dates of a batch are parsed and
+checked as NumPy arrays, performance is classified per metric with
+`searchsorted`, and valid rows are written with multi-row INSERTs, one
+transaction per batch. Rejected rows go to a CSV attached to the
+`ESG Metric Import Log` with the reason for each row.
+
+Expected columns: metric (name, metric name or code), company, reporting_period,
+value, and optionally period_from, period_to, entry_date, unit, party_type,
+party and remarks.
+"""
+
+import csv
+import json
+import os
+import time
+from itertools import islice
+
+import frappe
+import numpy as np
+from frappe import _
+from frappe.utils import cstr, flt, get_first_day, now_datetime
+
+from esg_compliance.cache import invalidate
+from esg_compliance.metric_export import register_file
+from esg_compliance.partitioning import get_stored_company
+from esg_compliance.performance import LABELS, get_metric_bands
+from esg_compliance.period_close import get_closed_periods
+
+BATCH_SIZE = 5000
+
+PARTY_TYPES = ("Customer", "Supplier", "Item", "Warehouse", "Employee")
+
+ENTRY_FIELDS = [
+	"name",
+	"creation",
+	"modified",
+	"owner",
+	"modified_by",
+	"metric",
+	"company",
+	"reporting_period",
+	"period_from",
+	"period_to",
+	"entry_date",
+	"value",
+	"measured_value",
+	"target_value",
+	"variance",
+	"unit",
+	"party_type",
+	"party",
+	"performance",
+	"data_source",
+	"verification_status",
+	"remarks",
+]
+
+
+@frappe.whitelist()
+def import_metric_entries(file_url):
+	"""Queue an import of an uploaded CSV or JSONL file; returns the ESG Metric Import Log"""
+	frappe.has_permission("ESG Metric Entry", "create", throw=True)
+	if get_file_format(file_url) is None:
+		frappe.throw(_("Only .csv and .jsonl files can be imported"))
+
+	file_name = frappe.db.get_value("File", {"file_url": file_url})
+	if not file_name:
+		frappe.throw(_("File {0} does not exist").format(file_url), frappe.DoesNotExistError)
+	# The job reads the file from disk, which would bypass the File's own permissions
+	frappe.get_doc("File", file_name).check_permission("read")
+
+	log = frappe.get_doc({"doctype": "ESG Metric Import Log", "source_file": file_url, "status": "Queued"})
+	log.insert(ignore_permissions=True)
+	frappe.enqueue(
+		"esg_compliance.metric_import.run_import",
+		queue="long",
+		timeout=7200,
+		enqueue_after_commit=True,
+		log=log.name,
+		user=frappe.session.user,
+	)
+	return log.name
+
+
+def get_file_format(file_url):
+	extension = os.path.splitext(cstr(file_url).lower())[1]
+	return {".csv": "CSV", ".jsonl": "JSONL", ".ndjson": "JSONL"}.get(extension)
+
+
+def normalize_key(key):
+	return cstr(key).strip().lower().replace(" ", "_")
+
+
+def read_rows(path, file_format):
+	"""Yield (line number, row dict or None, error) without loading the file"""
+	with open(path, newline="", encoding="utf-8-sig") as f:
+		if file_format == "CSV":
+			reader = csv.DictReader(f)
+			reader.fieldnames = [normalize_key(key) for key in reader.fieldnames or []]
+			for row in reader:
+				yield reader.line_num, row, None
+			return
+
+		for line_num, line in enumerate(f, 1):
+			if not line.strip():
+				continue
+			try:
+				row = json.loads(line)
+			except ValueError as e:
+				yield line_num, None, _("Invalid JSON: {0}").format(e)
+				continue
+			if not isinstance(row, dict):
+				yield line_num, None, _("Each line must be a JSON object")
+				continue
+			yield line_num, {normalize_key(k): v for k, v in row.items()}, None
+
+
+class Lookups:
+	"""Metric, company and party maps, each loaded once per import"""
+
+	def __init__(self):
+		self.metrics = {}
+		for m in frappe.get_all(
+			"ESG Metric",
+			fields=["name", "metric_name", "metric_code", "company", "unit", "data_type", "target_value"],
+		):
+			for key in (m.metric_code, m.metric_name, m.name):
+				if key:
+					self.metrics[cstr(key).strip().lower()] = m
+		# Runs as the importing user, so rows for companies they cannot see are rejected
+		self.companies = set(frappe.get_list("Company", pluck="name"))
+		self.bands = get_metric_bands()
+		self.closed_periods = get_closed_periods()
+		self.parties = {}
+
+	def get_metric(self, value):
+		return self.metrics.get(cstr(value).strip().lower())
+
+	def has_party(self, party_type, party):
+		if party_type not in self.parties:
+			self.parties[party_type] = set(frappe.get_all(party_type, pluck="name"))
+		return party in self.parties[party_type]
+
+
+def parse_floats(raw):
+	"""Float array with NaN for anything that is not a number"""
+	try:
+		return np.array([np.nan if v in (None, "") else v for v in raw], dtype=np.float64)
+	except (TypeError, ValueError):
+		values = np.full(len(raw), np.nan)
+		for i, v in enumerate(raw):
+			try:
+				values[i] = float(cstr(v).replace(",", ""))
+			except ValueError:
+				pass
+		return values
+
+
+def parse_dates(raw):
+	"""datetime64[D] array with NaT for missing or invalid ISO dates"""
+	cleaned = [cstr(v).strip()[:10] or "NaT" for v in raw]
+	try:
+		return np.array(cleaned, dtype="datetime64[D]")
+	except ValueError:
+		dates = np.full(len(raw), np.datetime64("NaT"), dtype="datetime64[D]")
+		for i, v in enumerate(cleaned):
+			try:
+				dates[i] = np.datetime64(v, "D")
+			except ValueError:
+				pass
+		return dates
+
+
+def validate_batch(rows, lookups):
+	"""Return (entries, errors) for a batch of row dicts; errors[i] is "" for valid rows"""
+	errors = np.full(len(rows), "", dtype=object)
+	if not rows:
+		return [], errors
+
+	def reject(mask, message):
+		errors[mask & (errors == "")] = message
+
+	metrics = [lookups.get_metric(row.get("metric")) for row in rows]
+	reject(np.array([m is None for m in metrics]), _("Unknown metric"))
+
+	companies = [
+		cstr(row.get("company")).strip() or (m.company if m else "")
+		for row, m in zip(rows, metrics, strict=True)
+	]
+	reject(np.array([c not in lookups.companies for c in companies]), _("Unknown or inaccessible company"))
+
+	values = parse_floats([row.get("value") for row in rows])
+	reject(~np.isfinite(values), _("Value must be a number"))
+
+	percentage = np.array([bool(m) and m.data_type == "Percentage" for m in metrics])
+	reject(percentage & ((values < 0) | (values > 100)), _("Percentage must be between 0 and 100"))
+
+	reporting_period = parse_dates([row.get("reporting_period") for row in rows])
+	reject(np.isnat(reporting_period), _("Reporting Period must be a date (YYYY-MM-DD)"))
+	if lookups.closed_periods:
+		reject(
+			np.array(
+				[
+					not np.isnat(d) and (c, get_first_day(d.astype(object))) in lookups.closed_periods
+					for c, d in zip(companies, reporting_period, strict=True)
+				]
+			),
+			_("Reporting Period is in a closed period"),
+		)
+
+	period_from = parse_dates([row.get("period_from") or row.get("reporting_period") for row in rows])
+	period_to = parse_dates([row.get("period_to") or row.get("reporting_period") for row in rows])
+	reject(
+		np.isnat(period_from) | np.isnat(period_to), _("Period From and Period To must be dates (YYYY-MM-DD)")
+	)
+	reject(period_from > period_to, _("Period From cannot be after Period To"))
+
+	party_types = [cstr(row.get("party_type")).strip() for row in rows]
+	parties = [cstr(row.get("party")).strip() for row in rows]
+	reject(
+		np.array([bool(p) and t not in PARTY_TYPES for t, p in zip(party_types, parties, strict=True)]),
+		_("Party Type must be one of {0}").format(", ".join(PARTY_TYPES)),
+	)
+	reject(
+		np.array(
+			[
+				bool(p) and errors[i] == "" and not lookups.has_party(t, p)
+				for i, (t, p) in enumerate(zip(party_types, parties, strict=True))
+			]
+		),
+		_("Unknown party"),
+	)
+
+	performance = classify_batch(metrics, values, errors == "", lookups.bands)
+
+	now, user = now_datetime(), frappe.session.user
+	entries = []
+	for i in np.flatnonzero(errors == ""):
+		row, metric, value = rows[i], metrics[i], float(values[i])
+		target = flt(metric.target_value)
+		entries.append(
+			(
+				frappe.generate_hash(length=10),
+				now,
+				now,
+				user,
+				user,
+				metric.name,
+				get_stored_company(companies[i]),
+				str(reporting_period[i]),
+				str(period_from[i]),
+				str(period_to[i]),
+				cstr(row.get("entry_date")).strip() or str(reporting_period[i]),
+				value,
+				cstr(value),
+				cstr(target) if target else None,
+				target - value if target else None,
+				cstr(row.get("unit")).strip() or metric.unit,
+				party_types[i] if parties[i] else None,
+				parties[i] or None,
+				performance[i],
+				"Imported",
+				"Pending",
+				cstr(row.get("remarks")).strip() or None,
+			)
+		)
+
+	return entries, errors
+
+
+def classify_batch(metrics, values, valid, bands):
+	"""Performance label per row, vectorized per metric with the compiled threshold bands"""
+	performance = np.full(len(metrics), None, dtype=object)
+	labels = np.array(LABELS, dtype=object)
+	names = np.array([m.name if m else "" for m in metrics], dtype=object)
+	for name in set(names[valid]):
+		band = bands.get(name)
+		if not band:
+			continue
+		sign, bounds = band
+		mask = valid & (names == name)
+		performance[mask] = labels[np.searchsorted(bounds, values[mask] * sign, side="left")]
+	return performance
+
+
+def run_import(log, user=None):
+	log = frappe.get_doc("ESG Metric Import Log", log)
+	started = time.monotonic()
+	log.db_set({"status": "Running", "started_on": now_datetime()})
+	frappe.db.commit()
+
+	reject_name = f"esg-import-rejects-{log.name}.csv"
+	reject_path = frappe.get_site_path("private", "files", reject_name)
+	total = imported = rejected = 0
+	rejects = open(reject_path, "w", newline="", encoding="utf-8")
+	reject_writer = csv.writer(rejects)
+	reject_writer.writerow(["line", "error", "row"])
+	try:
+		path = frappe.get_doc("File", {"file_url": log.source_file}).get_full_path()
+		lookups = Lookups()
+		rows = read_rows(path, get_file_format(log.source_file))
+		while batch := list(islice(rows, BATCH_SIZE)):
+			parsed = [(line, row) for line, row, error in batch if row is not None]
+			for line, _row, error in batch:
+				if error:
+					reject_writer.writerow([line, error, ""])
+
+			entries, errors = validate_batch([row for _line, row in parsed], lookups)
+			for (line, row), error in zip(parsed, errors, strict=True):
+				if error:
+					reject_writer.writerow([line, error, json.dumps(row, default=str)])
+
+			if entries:
+				frappe.db.bulk_insert(
+					"ESG Metric Entry", fields=ENTRY_FIELDS, values=entries, chunk_size=BATCH_SIZE
+				)
+			frappe.db.commit()
+
+			total += len(batch)
+			imported += len(entries)
+			rejected = total - imported
+			frappe.publish_realtime(
+				"esg_import_progress",
+				{"log": log.name, "total": total, "imported": imported, "rejected": rejected},
+				user=user,
+			)
+	except Exception:
+		frappe.db.rollback()
+		rejects.close()
+		os.remove(reject_path)
+		# Batches committed before the failure stay imported
+		log.db_set(
+			{
+				"status": "Failed",
+				"error": frappe.get_traceback(),
+				"total_rows": total,
+				"imported_rows": imported,
+				"rejected_rows": rejected,
+				"duration": time.monotonic() - started,
+			}
+		)
+		frappe.db.commit()
+		if imported:
+			invalidate()
+		raise
+
+	rejects.close()
+	if imported:
+		invalidate()
+
+	values = {
+		"status": "Completed" if not rejected else ("Partially Completed" if imported else "Failed"),
+		"total_rows": total,
+		"imported_rows": imported,
+		"rejected_rows": rejected,
+		"duration": time.monotonic() - started,
+	}
+	if rejected:
+		values["rejected_file"] = register_file(
+			reject_path, reject_name, user or frappe.session.user
+		).file_url
+	else:
+		os.remove(reject_path)
+	log.db_set(values)
+	frappe.db.commit()
+	return values
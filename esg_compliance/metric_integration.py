@@ -0,0 +1,349 @@
+# Copyright (c) 2025, K. Ronoh and contributors
+# For license information, please see license.txt
+
+"""Aggregation engine for `ESG Metric Integration` rows.
+
+Every integration row (source_doctype, source_field, calculation_method,
+filter_conditions) is compiled into one conditional aggregate expression.
+All rows that read the same source doctype are evaluated together in a
+single grouped scan per period, and the results are written as ESG Metric
+Entries.
+"""
+
+import frappe
+from frappe import _
+from frappe.utils import cstr, flt, getdate
+
+from esg_compliance.period_close import is_period_closed
+
+AUTOMATED_COLLECTION_METHODS = ("Automatic from System", "Integration")
+
+AGGREGATES = {
+	"Sum": "SUM({expr})",
+	"Average": "AVG({expr})",
+	"Count": "COUNT({expr})",
+	"Max": "MAX({expr})",
+	"Min": "MIN({expr})",
+}
+
+# Date field that places a source document in a reporting period. Master
+# doctypes without one are measured cumulatively as of the period end.
+PERIOD_DATE_FIELDS = {
+	"Purchase Invoice": "posting_date",
+	"Sales Invoice": "posting_date",
+	"Stock Entry": "posting_date",
+	"Delivery Note": "posting_date",
+	"Purchase Receipt": "posting_date",
+	"Payroll Entry": "posting_date",
+	"Attendance": "attendance_date",
+}
+
+FILTER_OPERATORS = ("=", "!=", ">", "<", ">=", "<=", "in", "not in", "like", "not like", "is")
+
+STANDARD_FIELDS = ("name", "creation", "modified", "owner", "docstatus")
+
+
+class IntegrationError(frappe.ValidationError):
+	pass
+
+
+def get_integration_metrics(metrics=None):
+	"""Active automated metrics with their integration rows, loaded in two queries"""
+	filters = {"active": 1, "collection_method": ["in", AUTOMATED_COLLECTION_METHODS]}
+	if metrics:
+		filters["name"] = ["in", list(metrics)]
+
+	metric_list = frappe.get_all(
+		"ESG Metric",
+		filters=filters,
+		fields=["name", "metric_name", "company", "unit", "target_value", "frequency"],
+	)
+	by_name = {m.name: frappe._dict(m, integrations=[]) for m in metric_list}
+	if not by_name:
+		return {}
+
+	for row in frappe.get_all(
+		"ESG Metric Integration",
+		filters={"parent": ["in", list(by_name)], "parenttype": "ESG Metric"},
+		fields=[
+			"name",
+			"parent",
+			"source_doctype",
+			"source_field",
+			"calculation_method",
+			"filter_conditions",
+		],
+		order_by="idx asc",
+	):
+		by_name[row.parent].integrations.append(row)
+
+	return {name: metric for name, metric in by_name.items() if metric.integrations}
+
+
+def compile_integration(row):
+	"""Compile one integration row into a SQL aggregate expression.
+
+	Field names are validated against the source doctype and filter values are
+	escaped, so nothing from the row reaches the query unchecked.
+	"""
+	doctype = row.source_doctype
+	method = row.calculation_method or "Sum"
+	if method == "Custom Formula":
+		raise IntegrationError(
+			_(
+				"Custom Formula is not an aggregation. Use the Calculated collection method "
+				"with an Auto Calculation Formula instead."
+			)
+		)
+	if method not in AGGREGATES:
+		raise IntegrationError(_("Calculation method {0} is not supported for aggregation").format(method))
+
+	meta = frappe.get_meta(doctype)
+	condition = compile_filter_conditions(meta, row.filter_conditions)
+
+	if method == "Count" and not row.source_field:
+		value = "1"
+	else:
+		value = f"`{validate_fieldname(meta, row.source_field)}`"
+
+	expr = f"CASE WHEN {condition} THEN {value} END" if condition else value
+	return AGGREGATES[method].format(expr=expr)
+
+
+def validate_fieldname(meta, fieldname):
+	fieldname = cstr(fieldname).strip()
+	if not fieldname or not (fieldname in STANDARD_FIELDS or meta.has_field(fieldname)):
+		raise IntegrationError(_("Field {0} does not exist in {1}").format(fieldname or "''", meta.name))
+
+	return fieldname
+
+
+def compile_filter_conditions(meta, filter_conditions):
+	"""Compile frappe style filters (a dict or a list of [field, operator, value]) into SQL"""
+	# Malformed JSON raises a ValueError, as does a filter that does not unpack into three parts
+	try:
+		return _compile_filter_conditions(meta, filter_conditions)
+	except (ValueError, TypeError) as e:
+		raise IntegrationError(_("Invalid filter conditions: {0}").format(e)) from e
+
+
+def _compile_filter_conditions(meta, filter_conditions):
+	filters = frappe.parse_json(filter_conditions) if filter_conditions else None
+	if not filters:
+		return ""
+
+	if isinstance(filters, dict):
+		filters = [
+			[field, *(value if isinstance(value, list) else ["=", value])] for field, value in filters.items()
+		]
+
+	conditions = []
+	for f in filters:
+		if len(f) == 4:
+			# [doctype, field, operator, value]
+			f = f[1:]
+		fieldname, operator, value = f
+		fieldname = validate_fieldname(meta, fieldname)
+		operator = cstr(operator).lower().strip()
+		if operator not in FILTER_OPERATORS:
+			raise IntegrationError(_("Filter operator {0} is not supported").format(operator))
+
+		if operator in ("in", "not in"):
+			values = value if isinstance(value, (list, tuple)) else cstr(value).split(",")
+			values = ", ".join(frappe.db.escape(cstr(v).strip()) for v in values) or "''"
+			conditions.append(f"`{fieldname}` {operator.upper()} ({values})")
+		elif operator == "is":
+			null_check = "IS NOT NULL" if cstr(value).lower() == "set" else "IS NULL"
+			conditions.append(f"`{fieldname}` {null_check}")
+		else:
+			conditions.append(f"`{fieldname}` {operator.upper()} {frappe.db.escape(cstr(value))}")
+
+	return " AND ".join(conditions)
+
+
+def validate_integrations(doc, method=None):
+	"""validate hook for ESG Metric: integration rows must compile, or they would be skipped when run"""
+	if doc.collection_method not in AUTOMATED_COLLECTION_METHODS:
+		return
+
+	for row in doc.linked_doctypes:
+		if not row.source_doctype or not frappe.db.exists("DocType", row.source_doctype):
+			continue
+		try:
+			compile_integration(row)
+		except IntegrationError as e:
+			frappe.throw(_("Row #{0}: {1}").format(row.idx, e), IntegrationError)
+
+
+def aggregate_source_doctype(doctype, compiled, period_from, period_to):
+	"""Evaluate all compiled expressions for one source doctype in a single scan.
+
+	Returns {company: {key: value}}; doctypes without a company field are
+	returned under the empty company.
+	"""
+	meta = frappe.get_meta(doctype)
+	has_company = meta.has_field("company")
+
+	conditions = []
+	if meta.is_submittable:
+		conditions.append("docstatus = 1")
+
+	date_field = PERIOD_DATE_FIELDS.get(doctype)
+	if date_field:
+		conditions.append(f"`{date_field}` BETWEEN %(period_from)s AND %(period_to)s")
+	else:
+		conditions.append("DATE(creation) <= %(period_to)s")
+
+	columns = ", ".join(f"{expr} AS `{key}`" for key, expr in compiled.items())
+	company = "company" if has_company else "''"
+
+	rows = frappe.db.sql(
+		f"""
+		SELECT {company} AS _company, {columns}
+		FROM `tab{doctype}`
+		WHERE {" AND ".join(conditions)}
+		GROUP BY _company
+		""",
+		{"period_from": period_from, "period_to": period_to},
+		as_dict=True,
+	)
+
+	return {row.pop("_company") or "": row for row in rows}
+
+
+def compute_integration_metrics(period_from, period_to, metrics=None):
+	"""Compute automated metrics for a period.
+
+	Returns {(metric, company): value}. Integration rows of one metric are
+	summed, so a metric may combine several sources.
+	"""
+	period_from, period_to = getdate(period_from), getdate(period_to)
+	metric_map = get_integration_metrics(metrics)
+
+	# Group compiled expressions by source doctype, so each doctype is scanned once
+	by_doctype = {}
+	for metric in metric_map.values():
+		for row in metric.integrations:
+			if not frappe.db.exists("DocType", row.source_doctype):
+				continue
+			try:
+				by_doctype.setdefault(row.source_doctype, {})[row.name] = compile_integration(row)
+			except IntegrationError as e:
+				frappe.log_error(
+					message=f"{metric.name} / {row.source_doctype}: {e}", title="ESG Metric Integration Error"
+				)
+
+	# {integration row: {company: value}}
+	aggregates = {}
+	for doctype, compiled in by_doctype.items():
+		for company, values in aggregate_source_doctype(doctype, compiled, period_from, period_to).items():
+			for key, value in values.items():
+				if value is not None:
+					aggregates.setdefault(key, {})[company] = value
+
+	results = {}
+	for metric in metric_map.values():
+		for row in metric.integrations:
+			for company, value in aggregates.get(row.name, {}).items():
+				# Company-specific metrics only read their own company
+				if metric.company and company and company != metric.company:
+					continue
+				key = (metric.name, company or metric.company or "")
+				results[key] = results.get(key, 0) + flt(value)
+
+	return results
+
+
+def save_metric_entries(
+	results, period_from, period_to, frequency="Monthly", data_source="System Generated", remarks=None
+):
+	"""Create or update one ESG Metric Entry per (metric, company) result"""
+	if not results:
+		return []
+
+	metric_names = list({metric for metric, _company in results})
+	metrics = {
+		m.name: m
+		for m in frappe.get_all(
+			"ESG Metric", filters={"name": ["in", metric_names]}, fields=["name", "unit", "target_value"]
+		)
+	}
+	existing = {
+		(d.metric, d.company or ""): d.name
+		for d in frappe.get_all(
+			"ESG Metric Entry",
+			filters={
+				"metric": ["in", metric_names],
+				"period_from": period_from,
+				"period_to": period_to,
+				"data_source": data_source,
+				"source_doctype": ["is", "not set"],
+			},
+			fields=["name", "metric", "company"],
+		)
+	}
+
+	saved = []
+	for (metric, company), value in results.items():
+		# Closed periods keep the entries they were closed with
+		if is_period_closed(company, period_from):
+			continue
+
+		target = flt(metrics[metric].target_value)
+		values = {
+			"value": value,
+			"measured_value": str(value),
+			"target_value": str(target),
+			"variance": target - value,
+			"variance_": str(target - value),
+			"performance": ("Green" if value <= target else "Red") if target else None,
+		}
+
+		if (metric, company) in existing:
+			doc = frappe.get_doc("ESG Metric Entry", existing[(metric, company)])
+			doc.update(values)
+			doc.save(ignore_permissions=True)
+		else:
+			doc = frappe.get_doc(
+				{
+					"doctype": "ESG Metric Entry",
+					"metric": metric,
+					"company": company,
+					"reporting_period": period_from,
+					"period_from": period_from,
+					"period_to": period_to,
+					"entry_date": str(getdate()),
+					"unit": metrics[metric].unit,
+					"data_source": data_source,
+					"verification_status": "Pending",
+					"remarks": remarks or f"Computed from metric integrations ({frequency})",
+					**values,
+				}
+			)
+			doc.insert(ignore_permissions=True)
+		saved.append(doc.name)
+
+	return saved
+
+
+def run_metric_integrations(period_from, period_to, metrics=None):
+	results = compute_integration_metrics(period_from, period_to, metrics=metrics)
+	saved = save_metric_entries(results, getdate(period_from), getdate(period_to))
+	frappe.db.commit()
+	return saved
+
+
+@frappe.whitelist()
+def enqueue_metric_integrations(period_from, period_to, metrics=None):
+	"""Run the integration engine for a period in the long queue"""
+	frappe.only_for("System Manager")
+	if isinstance(metrics, str):
+		metrics = frappe.parse_json(metrics)
+
+	frappe.enqueue(
+		run_metric_integrations,
+		queue="long",
+		period_from=period_from,
+		period_to=period_to,
+		metrics=metrics,
+	)
@@ -0,0 +1,247 @@
+# Copyright (c) 2025, K. Ronoh and contributors
+# For license information, please see license.txt
+
+"""Frequency-aware scheduler for automated ESG Metrics.
+
+Every active integration metric keeps a watermark (`last_computed_period`, the
+end of the last closed period computed for it). Each run only recomputes:
+
+- the periods after the watermark, up to and including the open period, and
+- closed periods whose source documents changed since the metric last ran.
+
+Due metrics are grouped by frequency and source doctypes and every group runs
+as one long-queue job, so each source doctype is scanned once per period.
+"""
+
+import time
+
+import frappe
+from frappe.utils import (
+	add_days,
+	cstr,
+	get_datetime,
+	get_first_day,
+	get_first_day_of_week,
+	get_last_day,
+	get_last_day_of_week,
+	get_quarter_ending,
+	get_quarter_start,
+	get_year_ending,
+	get_year_start,
+	getdate,
+	now_datetime,
+)
+
+from esg_compliance.metric_integration import (
+	PERIOD_DATE_FIELDS,
+	compute_integration_metrics,
+	get_integration_metrics,
+	save_metric_entries,
+)
+
+# Periods computed for a metric that has never run
+INITIAL_PERIODS = 1
+
+# Upper bound on periods a single run may catch up on for one metric
+MAX_PERIODS_PER_RUN = 24
+
+
+def get_period(date, frequency):
+	"""Return the (start, end) of the period of `frequency` containing `date`"""
+	date = getdate(date)
+	if frequency == "Daily":
+		return date, date
+	if frequency == "Weekly":
+		return get_first_day_of_week(date), get_last_day_of_week(date)
+	if frequency == "Quarterly":
+		return get_quarter_start(date), get_quarter_ending(date)
+	if frequency == "Annually":
+		return get_year_start(date), get_year_ending(date)
+
+	return get_first_day(date), get_last_day(date)
+
+
+def get_due_periods(metric, today=None):
+	"""Periods after the metric's watermark, up to and including the open period"""
+	today = getdate(today)
+	current = get_period(today, metric.frequency)
+
+	if metric.last_computed_period:
+		period = get_period(add_days(metric.last_computed_period, 1), metric.frequency)
+	else:
+		period = current
+		for _i in range(INITIAL_PERIODS - 1):
+			period = get_period(add_days(period[0], -1), metric.frequency)
+
+	periods = []
+	while period[0] <= current[0] and len(periods) < MAX_PERIODS_PER_RUN:
+		periods.append(period)
+		period = get_period(add_days(period[1], 1), metric.frequency)
+
+	return periods
+
+
+def get_changed_dates(doctype, since):
+	"""Distinct posting dates of `doctype` documents modified since `since`"""
+	date_field = PERIOD_DATE_FIELDS.get(doctype)
+	if not date_field or not frappe.db.exists("DocType", doctype):
+		return []
+
+	return frappe.db.sql_list(
+		f"""
+		SELECT DISTINCT `{date_field}`
+		FROM `tab{doctype}`
+		WHERE modified >= %(since)s AND `{date_field}` IS NOT NULL
+		""",
+		{"since": since},
+	)
+
+
+def get_due_metrics(today=None):
+	"""Map each active integration metric to the periods it needs recomputed"""
+	today = getdate(today)
+	metrics = get_integration_metrics()
+	if not metrics:
+		return {}
+
+	for d in frappe.get_all(
+		"ESG Metric",
+		filters={"name": ["in", list(metrics)]},
+		fields=["name", "last_computed_period", "last_run_on"],
+	):
+		metrics[d.name].update(last_computed_period=d.last_computed_period, last_run_on=d.last_run_on)
+
+	# Late changes to source documents: one scan per source doctype from the oldest run
+	last_runs = {}
+	for metric in metrics.values():
+		if not metric.last_run_on:
+			continue
+		since = get_datetime(metric.last_run_on)
+		for row in metric.integrations:
+			last_runs[row.source_doctype] = min(since, last_runs.get(row.source_doctype, since))
+
+	changed = {doctype: get_changed_dates(doctype, since) for doctype, since in last_runs.items()}
+
+	due = {}
+	for metric in metrics.values():
+		periods = set(get_due_periods(metric, today))
+
+		if metric.last_computed_period and metric.last_run_on:
+			watermark = getdate(metric.last_computed_period)
+			for row in metric.integrations:
+				for date in changed.get(row.source_doctype, []):
+					if getdate(date) <= watermark:
+						periods.add(get_period(date, metric.frequency))
+
+		if periods:
+			due[metric.name] = frappe._dict(
+				frequency=metric.frequency or "Monthly",
+				source_doctypes=sorted({row.source_doctype for row in metric.integrations}),
+				periods=sorted(periods),
+			)
+
+	return due
+
+
+def enqueue_due_metrics():
+	"""Hourly scheduler job: enqueue one long-queue job per group of due metrics"""
+	groups = {}
+	for metric, d in get_due_metrics().items():
+		key = (d.frequency, tuple(d.source_doctypes))
+		groups.setdefault(key, {})[metric] = [[str(start), str(end)] for start, end in d.periods]
+
+	for (frequency, source_doctypes), periods in groups.items():
+		frappe.enqueue(
+			run_metric_group,
+			queue="long",
+			job_id=f"esg_metric_run::{frequency}::{','.join(source_doctypes)}",
+			deduplicate=True,
+			frequency=frequency,
+			source_doctypes=list(source_doctypes),
+			periods=periods,
+		)
+
+
+def run_metric_group(frequency, source_doctypes, periods):
+	"""Compute the due periods of a group of metrics that share their source doctypes.
+
+	`periods` maps each metric to a list of [period_from, period_to]. Metrics due
+	for the same period are computed together, so each source doctype is scanned
+	once per period.
+	"""
+	started = now_datetime()
+	today = getdate()
+
+	by_period = {}
+	for metric, metric_periods in periods.items():
+		for period_from, period_to in metric_periods:
+			by_period.setdefault((getdate(period_from), getdate(period_to)), []).append(metric)
+
+	stats = {metric: frappe._dict(periods=0, rows=0, duration=0.0, error=None) for metric in periods}
+
+	for (period_from, period_to), metrics in sorted(by_period.items()):
+		start = time.monotonic()
+		try:
+			results = compute_integration_metrics(period_from, period_to, metrics=metrics)
+			save_metric_entries(results, period_from, period_to, frequency=frequency)
+			frappe.db.commit()
+		except Exception:
+			frappe.db.rollback()
+			error = frappe.get_traceback()
+			frappe.log_error(message=error, title="ESG Metric Scheduler Error")
+			for metric in metrics:
+				stats[metric].error = error
+			continue
+
+		duration = time.monotonic() - start
+		for metric in metrics:
+			stats[metric].periods += 1
+			stats[metric].duration += duration
+		for metric, _company in results:
+			stats[metric].rows += 1
+
+	for metric, metric_periods in periods.items():
+		stat = stats[metric]
+		if not stat.error:
+			update_watermark(metric, metric_periods, today, started)
+
+		frappe.get_doc(
+			{
+				"doctype": "ESG Metric Run Log",
+				"metric": metric,
+				"frequency": frequency,
+				"source_doctypes": ", ".join(source_doctypes),
+				"status": "Failed" if stat.error else "Success",
+				"started_on": started,
+				"periods": stat.periods,
+				"rows": stat.rows,
+				"duration": stat.duration,
+				"error": stat.error,
+			}
+		).insert(ignore_permissions=True)
+
+	frappe.db.commit()
+
+
+def update_watermark(metric, metric_periods, today, started):
+	"""Advance the watermark to the last closed period computed; the open period stays due"""
+	closed = [getdate(period_to) for _period_from, period_to in metric_periods if getdate(period_to) < today]
+	values = {"last_run_on": started}
+
+	current = frappe.db.get_value("ESG Metric", metric, "last_computed_period")
+	if closed and (not current or max(closed) > getdate(current)):
+		values["last_computed_period"] = max(closed)
+
+	frappe.db.set_value("ESG Metric", metric, values, update_modified=False)
+
+
+@frappe.whitelist()
+def reset_metric_watermark(metric):
+	"""Clear the watermark so the next run recomputes the metric from its current period"""
+	frappe.only_for("System Manager")
+	frappe.db.set_value(
+		"ESG Metric",
+		cstr(metric),
+		{"last_computed_period": None, "last_run_on": None},
+		update_modified=False,
+	)
@@ -0,0 +1,204 @@
+# Copyright (c) 2025, K. Ronoh and contributors
+# For license information, please see license.txt
+
+"""Monthly materialized series of ESG Metric Entry values.
+
+`tabESG Metric Series` holds one row per (company, metric, month) and is
+refreshed incrementally from a `modified` watermark, so dashboard charts read a
+few dozen pre-aggregated rows instead of re-aggregating every entry.
+"""
+
+import json
+
+import frappe
+from frappe.utils import (
+	add_months,
+	add_to_date,
+	flt,
+	get_datetime,
+	get_first_day,
+	get_last_day,
+	getdate,
+	now_datetime,
+)
+
+from esg_compliance.period_close import MONTHLY_TOTALS
+from esg_compliance.utils import get_metric_entry_keys
+
+WATERMARK_KEY = "esg_metric_series_watermark"
+
+# Buckets an entry left since the last refresh (deleted, moved to another company,
+# metric or month, or archived); they cannot be found via `modified`
+DIRTY_BUCKETS_KEY = "esg_compliance:dirty_series_buckets"
+
+# Re-read a little before the watermark so rows from transactions that were still
+# open at the last run are not missed. Recomputing a bucket is idempotent.
+WATERMARK_OVERLAP_MINUTES = 10
+
+
+def refresh_metric_series(full=False):
+	"""Recompute every series bucket touched since the last refresh"""
+	started = now_datetime()
+	watermark = frappe.db.get_global(WATERMARK_KEY)
+
+	if full or not watermark:
+		rebuild_metric_series()
+	else:
+		since = add_to_date(get_datetime(watermark), minutes=-WATERMARK_OVERLAP_MINUTES)
+		buckets = get_changed_buckets(since) | pop_dirty_buckets()
+		refresh_buckets(buckets)
+
+	sync_series_categories()
+	frappe.db.set_global(WATERMARK_KEY, str(started))
+	frappe.db.commit()
+
+
+def get_changed_buckets(since):
+	rows = frappe.db.sql(
+		"""
+		SELECT DISTINCT company, metric, DATE_FORMAT(reporting_period, '%%Y-%%m-01') as month
+		FROM `tabESG Metric Entry`
+		WHERE modified >= %(since)s AND reporting_period IS NOT NULL
+		""",
+		{"since": since},
+	)
+	return {(company or "", metric, str(month)) for company, metric, month in rows}
+
+
+def mark_bucket_dirty(doc, method=None):
+	"""on_update / on_trash hook for ESG Metric Entry: remember the bucket the entry leaves.
+
+	That is the bucket of a deleted entry, or the bucket an edited entry was in
+	before the save.
+	"""
+	previous = doc if method == "on_trash" else doc.get_doc_before_save()
+	if previous and previous.reporting_period:
+		add_dirty_buckets([(previous.company, previous.metric, get_first_day(previous.reporting_period))])
+
+
+def add_dirty_buckets(buckets):
+	"""Queue (company, metric, month) buckets for the next refresh, e.g. after raw SQL deletes"""
+	members = [json.dumps([company or "", metric, str(month)]) for company, metric, month in buckets]
+	if members:
+		frappe.cache().sadd(DIRTY_BUCKETS_KEY, *members)
+
+
+def pop_dirty_buckets():
+	cache = frappe.cache()
+	members = cache.smembers(DIRTY_BUCKETS_KEY) or []
+	if members:
+		cache.srem(DIRTY_BUCKETS_KEY, *members)
+
+	return {tuple(json.loads(frappe.safe_decode(member))) for member in members}
+
+
+def rebuild_metric_series():
+	frappe.db.sql("DELETE FROM `tabESG Metric Series`")
+	insert_series_rows("reporting_period IS NOT NULL", {})
+
+
+def refresh_buckets(buckets):
+	"""Replace the given (company, metric, month) buckets with freshly aggregated rows"""
+	by_month = {}
+	for company, metric, month in buckets:
+		by_month.setdefault(month, set()).add((company, metric))
+
+	for month, pairs in by_month.items():
+		params = {
+			"month": month,
+			"month_end": get_last_day(month),
+			"pairs": tuple(pairs),
+		}
+		frappe.db.sql(
+			"""
+			DELETE FROM `tabESG Metric Series`
+			WHERE month = %(month)s AND (IFNULL(company, ''), metric) IN %(pairs)s
+			""",
+			params,
+		)
+		insert_series_rows(
+			"""reporting_period BETWEEN %(month)s AND %(month_end)s
+			AND (IFNULL(company, ''), metric) IN %(pairs)s""",
+			params,
+		)
+
+
+def insert_series_rows(conditions, params):
+	frappe.db.sql(
+		f"""
+		INSERT INTO `tabESG Metric Series`
+			(name, creation, modified, modified_by, owner, docstatus, idx,
+			company, metric, month, total_value, entry_count, verified_count, rejected_count)
+		SELECT
+			MD5(CONCAT_WS('|', IFNULL(company, ''), metric, DATE_FORMAT(reporting_period, '%%Y-%%m-01'))),
+			NOW(), NOW(), 'Administrator', 'Administrator', 0, 0,
+			IFNULL(company, ''), metric, DATE_FORMAT(reporting_period, '%%Y-%%m-01'),
+			SUM(value), COUNT(*),
+			SUM(CASE WHEN verification_status = 'Verified' THEN 1 ELSE 0 END),
+			SUM(CASE WHEN verification_status = 'Rejected' THEN 1 ELSE 0 END)
+		FROM `tabESG Metric Entry`
+		WHERE {conditions}
+		GROUP BY IFNULL(company, ''), metric, DATE_FORMAT(reporting_period, '%%Y-%%m-01')
+		""",
+		params,
+	)
+
+
+def sync_series_categories():
+	"""Copy the ESG Metric category onto series rows whose category is stale"""
+	frappe.db.sql(
+		"""
+		UPDATE `tabESG Metric Series` s
+		JOIN `tabESG Metric` em ON em.metric_name = s.metric OR em.name = s.metric
+		SET s.category = em.category
+		WHERE IFNULL(s.category, '') != IFNULL(em.category, '')
+		"""
+	)
+
+
+def get_series(company=None, metric=None, category=None, from_date=None, to_date=None, companies=None):
+	"""Monthly totals, frozen for closed periods, as an ordered list of (month, value).
+
+	Without `company`, `companies` restricts the totals to those companies.
+	"""
+	to_date = getdate(to_date)
+	from_date = get_first_day(getdate(from_date) if from_date else add_months(to_date, -11))
+
+	conditions = ["month BETWEEN %(from_date)s AND %(to_date)s"]
+	params = {"from_date": from_date, "to_date": to_date}
+
+	if company:
+		conditions.append("company = %(company)s")
+		params["company"] = company
+	elif companies is not None:
+		conditions.append("company IN %(companies)s")
+		params["companies"] = tuple(companies)
+
+	if metric:
+		keys = [key for key, name in get_metric_entry_keys([metric]).items() if name == metric]
+		conditions.append("metric IN %(metrics)s")
+		params["metrics"] = tuple(set(keys) | {metric})
+
+	if category:
+		conditions.append("category = %(category)s")
+		params["category"] = category
+
+	totals = dict(
+		frappe.db.sql(
+			f"""
+			SELECT month, SUM(total_value)
+			FROM {MONTHLY_TOTALS} s
+			WHERE {" AND ".join(conditions)}
+			GROUP BY month
+			""",
+			params,
+		)
+	)
+
+	series = []
+	month = from_date
+	while month <= to_date:
+		series.append((month, flt(totals.get(month))))
+		month = add_months(month, 1)
+
+	return series
@@ -0,0 +1,247 @@
+# Copyright (c) 2025, K. Ronoh and contributors
+# For license information, please see license.txt
+
+"""Optional MariaDB partitioning of the ESG entry and ledger tables.
+
+Set `esg_partition_by` in site config to "company" or "year" and run
+`bench migrate` (or `bench execute esg_compliance.partitioning.partition_tables`)
+to partition `tabESG Metric Entry` and `tabESG Emission Ledger`:
+
+- "company": LIST COLUMNS partitions, one per company plus a default
+  partition that receives companies created later.
+- "year": RANGE COLUMNS partitions on the reporting / posting date, one per
+  year plus a partition for later dates.
+
+MariaDB requires the partition column in the primary key, so the key becomes
+(name, <column>) and the column NOT NULL; entries saved without a company get
+"" instead, including rows bulk inserted past the validate hook
+(`get_stored_company`). The daily `maintain_partitions` job gives new companies
+and the coming year their own partition.
+
+Note that the (name, <column>) key no longer makes `name` unique by itself: the
+database would accept two rows with the same name in different partitions.
+Frappe's hash names keep that from happening in practice, but code that inserts
+rows with a given name (e.g. restoring an archive) must not reuse a live one.
+
+Reports build their WHERE clause with `partition_conditions`, which always
+puts a condition on the company, and under the "year" scheme on the
+partition date, so that MariaDB only reads the partitions a query needs.
+"""
+
+import hashlib
+
+import frappe
+from frappe import _
+from frappe.utils import cstr, getdate, nowdate
+
+SCHEMES = ("company", "year")
+
+# doctype: {scheme: partition column}
+PARTITION_KEYS = {
+	"ESG Metric Entry": {"company": "company", "year": "reporting_period"},
+	"ESG Emission Ledger": {"company": "company", "year": "posting_date"},
+}
+
+DEFAULT_PARTITION = "p_default"
+FUTURE_PARTITION = "p_future"
+
+# doctype: secondary indexes added after migrate, for the company / period / metric filters of reports
+INDEXES = {
+	"ESG Metric Entry": (("company", "reporting_period"), ("metric", "reporting_period")),
+}
+
+
+def get_partition_scheme():
+	scheme = frappe.conf.get("esg_partition_by")
+	return scheme if scheme in SCHEMES else None
+
+
+def get_partitions(doctype):
+	"""Names of the partitions of a table, in order; empty when it is not partitioned"""
+	return frappe.db.sql_list(
+		"""
+		SELECT partition_name FROM information_schema.partitions
+		WHERE table_schema = DATABASE() AND table_name = %(table)s AND partition_name IS NOT NULL
+		ORDER BY partition_ordinal_position
+		""",
+		{"table": f"tab{doctype}"},
+	)
+
+
+def company_condition(company, alias=None):
+	"""Match `%(company)s` with a plain equality for a named company, which MariaDB can prune on.
+
+	Only the blank company needs IFNULL, to also match entries stored without one.
+	"""
+	column = f"{alias}.company" if alias else "company"
+	return f"{column} = %(company)s" if company else f"IFNULL({column}, '') = %(company)s"
+
+
+def partition_conditions(doctype, filters, alias=None, from_date=None, to_date=None, prune_by_dates=False):
+	"""Conditions on the partition columns of `doctype` for a report query.
+
+	The company condition is always present: the filtered company, else every
+	company the user may read. Pass `from_date` / `to_date` when the report
+	restricts the date that `doctype` is partitioned by. Reports that filter
+	`filters.from_date` / `to_date` on another date column pass
+	`prune_by_dates`, so that under the "year" scheme those dates also bound
+	the partition date. Parameters are added to `filters`, which must be the
+	params of the query.
+	"""
+	prefix = f"{alias}." if alias else ""
+	scheme = get_partition_scheme()
+	if filters.get("company"):
+		conditions = [f"{prefix}company = %(company)s"]
+	else:
+		filters["partition_companies"] = ("", *frappe.get_list("Company", pluck="name"))
+		# Only a company-partitioned table stores missing companies as "" instead of NULL
+		column = f"{prefix}company" if scheme == "company" else f"IFNULL({prefix}company, '')"
+		conditions = [f"{column} IN %(partition_companies)s"]
+
+	if prune_by_dates and scheme == "year":
+		from_date, to_date = from_date or filters.get("from_date"), to_date or filters.get("to_date")
+
+	date_column = PARTITION_KEYS[doctype]["year"]
+	if from_date:
+		filters["partition_from_date"] = getdate(from_date)
+		conditions.append(f"{prefix}{date_column} >= %(partition_from_date)s")
+	if to_date:
+		filters["partition_to_date"] = getdate(to_date)
+		conditions.append(f"{prefix}{date_column} <= %(partition_to_date)s")
+
+	return conditions
+
+
+def partition_tables():
+	"""after_migrate: partition every ESG table under the configured scheme.
+
+	Tables already partitioned, or not created yet, are left alone.
+	"""
+	scheme = get_partition_scheme()
+	if not scheme or frappe.db.db_type != "mariadb":
+		return
+
+	for doctype, columns in PARTITION_KEYS.items():
+		if not frappe.db.table_exists(doctype) or get_partitions(doctype):
+			continue
+		try:
+			partition_table(doctype, columns[scheme], scheme)
+		except Exception:
+			frappe.log_error(title="ESG Table Partitioning Failed", reference_doctype=doctype)
+
+
+def set_partition_defaults(doc, method=None):
+	"""validate hook for ESG Metric Entry: a company-partitioned table has no NULL company"""
+	doc.company = get_stored_company(doc.company)
+
+
+def get_stored_company(company):
+	"""The company to write for a row; "" instead of NULL under the "company" scheme"""
+	if company is None and get_partition_scheme() == "company":
+		return ""
+	return company
+
+
+def add_indexes():
+	"""after_migrate: add the secondary INDEXES that are missing"""
+	for doctype, indexes in INDEXES.items():
+		if not frappe.db.table_exists(doctype):
+			continue
+		for fields in indexes:
+			frappe.db.add_index(doctype, list(fields))
+
+
+def partition_table(doctype, column, scheme):
+	table = f"tab{doctype}"
+	unique_keys = frappe.db.sql_list(
+		"""
+		SELECT DISTINCT index_name FROM information_schema.statistics
+		WHERE table_schema = DATABASE() AND table_name = %(table)s
+			AND non_unique = 0 AND index_name != 'PRIMARY'
+		""",
+		{"table": table},
+	)
+	if unique_keys:
+		frappe.throw(
+			_("{0} has unique keys without the partition column: {1}").format(table, ", ".join(unique_keys))
+		)
+
+	if scheme == "company":
+		frappe.db.sql(f"UPDATE `{table}` SET company = '' WHERE company IS NULL")
+		definitions = get_company_partitions(frappe.get_all("Company", pluck="name"))
+		partition_by = f"LIST COLUMNS(`{column}`)"
+		default = "DEFAULT ''"
+	else:
+		if frappe.db.sql(f"SELECT 1 FROM `{table}` WHERE `{column}` IS NULL LIMIT 1"):
+			frappe.throw(
+				_("{0} has rows without {1} and cannot be partitioned by year").format(table, column)
+			)
+		first = frappe.db.sql(f"SELECT YEAR(MIN(`{column}`)) FROM `{table}`")[0][0]
+		definitions = get_year_partitions(first or getdate(nowdate()).year, getdate(nowdate()).year + 1)
+		partition_by = f"RANGE COLUMNS(`{column}`)"
+		default = ""
+
+	column_type = frappe.db.sql(
+		"""
+		SELECT column_type FROM information_schema.columns
+		WHERE table_schema = DATABASE() AND table_name = %(table)s AND column_name = %(column)s
+		""",
+		{"table": table, "column": column},
+	)[0][0]
+	frappe.db.sql_ddl(
+		f"""
+		ALTER TABLE `{table}`
+			MODIFY `{column}` {column_type} NOT NULL {default},
+			DROP PRIMARY KEY,
+			ADD PRIMARY KEY (`name`, `{column}`)
+		PARTITION BY {partition_by} ({", ".join(definitions)})
+		"""
+	)
+
+
+def get_partition_name(company):
+	return "p_" + hashlib.md5(cstr(company).encode()).hexdigest()[:12]
+
+
+def get_company_partitions(companies):
+	definitions = [
+		f"PARTITION {get_partition_name(company)} VALUES IN ({frappe.db.escape(company)})"
+		for company in companies
+	]
+	return [*definitions, f"PARTITION {DEFAULT_PARTITION} DEFAULT"]
+
+
+def get_year_partitions(first, last):
+	definitions = [
+		f"PARTITION p{year} VALUES LESS THAN ('{year + 1}-01-01')" for year in range(first, last + 1)
+	]
+	return [*definitions, f"PARTITION {FUTURE_PARTITION} VALUES LESS THAN (MAXVALUE)"]
+
+
+def maintain_partitions():
+	"""Daily: split a partition for new companies, or for the coming year, off the catch-all partition"""
+	scheme = get_partition_scheme()
+	if not scheme or frappe.db.db_type != "mariadb":
+		return
+
+	for doctype in PARTITION_KEYS:
+		partitions = get_partitions(doctype)
+		catch_all = DEFAULT_PARTITION if scheme == "company" else FUTURE_PARTITION
+		if catch_all not in partitions:
+			continue
+
+		if scheme == "company":
+			new = [
+				c for c in frappe.get_all("Company", pluck="name") if get_partition_name(c) not in partitions
+			]
+			definitions = get_company_partitions(new)
+		else:
+			last = max(int(p[1:]) for p in partitions if p[1:].isdigit())
+			new = range(last + 1, getdate(nowdate()).year + 2)
+			definitions = get_year_partitions(last + 1, getdate(nowdate()).year + 1)
+
+		if not new:
+			continue
+		frappe.db.sql_ddl(
+			f"ALTER TABLE `tab{doctype}` REORGANIZE PARTITION {catch_all} INTO ({', '.join(definitions)})"
+		)
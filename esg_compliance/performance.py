@@ -0,0 +1,176 @@
+# Copyright (c) 2025, K. Ronoh and contributors
+# For license information, please see license.txt
+
+"""Green / Yellow / Red classification of ESG Metric Entries from metric thresholds.
+
+The red, yellow and green thresholds of every ESG Metric are compiled once into
+a band: a direction and an ordered list of upper bounds. Metrics where green is
+above red are "higher is better" and are negated, so every band reads the same
+way: Green up to the green bound, Yellow up to the yellow bound (or the red
+threshold if no yellow one is set), Red beyond.
+
+Bands are used to classify single entries on validate and, as one set-based
+UPDATE, to reclassify stored entries after thresholds change.
+"""
+
+import re
+from bisect import bisect_left
+
+import frappe
+from frappe import _
+
+from esg_compliance.cache import bump_generation
+from esg_compliance.period_close import open_period_condition
+
+BANDS_KEY = "esg_compliance:metric_bands"
+
+LABELS = ("Green", "Yellow", "Red")
+
+NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+
+
+def parse_threshold(value):
+	"""Read a number from a threshold such as "8000", "<= 8,000 kg" or "80%" """
+	match = NUMBER.search((value or "").replace(",", ""))
+	return float(match.group()) if match else None
+
+
+def compile_band(green, yellow=None, red=None):
+	"""Return (sign, [green bound, yellow bound]), or None without a green threshold.
+
+	Without a yellow or red threshold both bounds are equal and there is no
+	Yellow band.
+	"""
+	green, yellow, red = parse_threshold(green), parse_threshold(yellow), parse_threshold(red)
+	if green is None:
+		return None
+
+	other = red if red is not None else yellow
+	sign = -1 if other is not None and other < green else 1
+
+	upper = yellow if yellow is not None else red
+	upper = green if upper is None else upper
+	return sign, [green * sign, max(upper * sign, green * sign)]
+
+
+def get_metric_bands():
+	"""Compiled bands keyed by every value an entry may store in `metric`"""
+	return frappe.cache().get_value(BANDS_KEY, generator=load_metric_bands)
+
+
+def load_metric_bands():
+	bands = {}
+	for m in frappe.get_all(
+		"ESG Metric", fields=["name", "metric_name", "red_threshold", "yellow_threshold", "green_threshold"]
+	):
+		band = compile_band(m.green_threshold, m.yellow_threshold, m.red_threshold)
+		if not band:
+			continue
+		bands[m.name] = band
+		if m.metric_name:
+			bands.setdefault(m.metric_name, band)
+
+	return bands
+
+
+def clear_metric_bands(doc=None, method=None):
+	frappe.cache().delete_value(BANDS_KEY)
+
+
+def classify(band, value):
+	sign, bounds = band
+	return LABELS[bisect_left(bounds, value * sign)]
+
+
+def classify_entry(doc, method=None):
+	"""validate hook for ESG Metric Entry; entries of metrics without thresholds keep their performance"""
+	if doc.value is None:
+		return
+
+	band = get_metric_bands().get(doc.metric)
+	if band:
+		doc.performance = classify(band, doc.value)
+
+
+def validate_thresholds(doc, method=None):
+	"""validate hook for ESG Metric"""
+	for fieldname in ("red_threshold", "yellow_threshold", "green_threshold"):
+		if doc.get(fieldname) and parse_threshold(doc.get(fieldname)) is None:
+			frappe.throw(_("{0} must contain a number").format(doc.meta.get_label(fieldname)))
+
+	green, yellow, red = (
+		parse_threshold(doc.get(f)) for f in ("green_threshold", "yellow_threshold", "red_threshold")
+	)
+	if None not in (green, yellow, red) and not (green <= yellow <= red or green >= yellow >= red):
+		frappe.throw(_("Yellow Threshold must lie between the Green and Red Thresholds"))
+
+
+def on_metric_update(doc, method=None):
+	"""on_update hook for ESG Metric: reclassify its entries when thresholds changed"""
+	clear_metric_bands()
+	if any(doc.has_value_changed(f) for f in ("red_threshold", "yellow_threshold", "green_threshold")):
+		frappe.enqueue(reclassify_entries, queue="long", metrics=[doc.name], enqueue_after_commit=True)
+
+
+def reclassify_entries(metrics=None):
+	"""Reclassify stored entries with one UPDATE joined to a derived table of bands.
+
+	Entries of the given `metrics` that no longer have a green threshold lose
+	their performance. Entries of closed periods keep theirs.
+	"""
+	clear_metric_bands()
+	bands = load_metric_bands()
+	updated = 0
+	if metrics:
+		keep = set(metrics) | set(
+			frappe.get_all("ESG Metric", filters={"name": ["in", list(metrics)]}, pluck="metric_name")
+		)
+		bands = {key: band for key, band in bands.items() if key in keep}
+
+		cleared = tuple(key for key in keep - set(bands) if key)
+		if cleared:
+			frappe.db.sql(
+				f"""
+				UPDATE `tabESG Metric Entry` e SET e.performance = NULL
+				WHERE e.metric IN %(cleared)s AND e.performance IS NOT NULL
+					AND {open_period_condition("e")}
+				""",
+				{"cleared": cleared},
+			)
+			updated += frappe.db.sql("SELECT ROW_COUNT()")[0][0]
+
+	if bands:
+		rows, params = [], []
+		for key, (sign, bounds) in bands.items():
+			rows.append("SELECT %s AS metric, %s AS sign, %s AS green, %s AS yellow")
+			params += [key, sign, *bounds]
+
+		frappe.db.sql(
+			f"""
+			UPDATE `tabESG Metric Entry` e
+			JOIN ({" UNION ALL ".join(rows)}) b ON b.metric = e.metric
+			SET e.performance = CASE
+				WHEN e.value * b.sign <= b.green THEN 'Green'
+				WHEN e.value * b.sign <= b.yellow THEN 'Yellow'
+				ELSE 'Red'
+			END
+			WHERE e.value IS NOT NULL AND {open_period_condition("e")}
+			""",
+			params,
+		)
+		updated += frappe.db.sql("SELECT ROW_COUNT()")[0][0]
+
+	if updated:
+		frappe.db.commit()
+		bump_generation()
+	return updated
+
+
+@frappe.whitelist()
+def enqueue_reclassification(metrics=None):
+	"""Reclassify entries of the given metrics (or all) in the long queue"""
+	frappe.only_for("System Manager")
+	if isinstance(metrics, str):
+		metrics = frappe.parse_json(metrics)
+
+	frappe.enqueue(reclassify_entries, queue="long", metrics=metrics)
@@ -0,0 +1,247 @@
+# Copyright (c) 2025, K. Ronoh and contributors
+# For license information, please see license.txt
+
+"""Monthly period close of ESG data per company.
+
+Submitting an `ESG Period Close` checks that the month is complete (no
+pending verifications, no open anomalies, an entry for every active monthly
+metric), then writes one immutable `ESG Period Snapshot` row per metric from
+the entries of the month. From then on ESG Metric Entries dated in the month
+cannot be created, changed or deleted; cancelling the close reopens it and
+drops the snapshot. Cancelling a source document whose entries fall in a
+closed month does not touch them: each is offset by a reversing entry dated in
+the next open month.
+
+Readers of monthly totals select from `MONTHLY_TOTALS` instead of
+`tabESG Metric Series`: frozen snapshots for closed months, the live series
+for open ones.
+"""
+
+import frappe
+from frappe import _
+from frappe.utils import add_months, flt, get_first_day, get_last_day, getdate, today
+
+from esg_compliance.cache import invalidate
+
+CLOSED_PERIODS_KEY = "esg_compliance:closed_periods"
+
+# ESG Metric Entry.data_source of the offsets made by `reverse_entry`
+REVERSAL_DATA_SOURCE = "Reversal"
+
+# Derived table with the columns of `tabESG Metric Series`
+MONTHLY_TOTALS = """(
+	SELECT company, metric, category, month, total_value, entry_count, verified_count, rejected_count
+	FROM `tabESG Period Snapshot`
+	UNION ALL
+	SELECT s.company, s.metric, s.category, s.month, s.total_value, s.entry_count, s.verified_count, s.rejected_count
+	FROM `tabESG Metric Series` s
+	LEFT JOIN `tabESG Period Close` pc
+		ON pc.company = s.company AND pc.month = s.month AND pc.docstatus = 1
+	WHERE pc.name IS NULL
+)"""
+
+
+def get_closed_periods():
+	"""Set of (company, first day of month) of every submitted ESG Period Close"""
+	return frappe.cache().get_value(CLOSED_PERIODS_KEY, generator=load_closed_periods)
+
+
+def load_closed_periods():
+	return {
+		(d.company, getdate(d.month))
+		for d in frappe.get_all("ESG Period Close", filters={"docstatus": 1}, fields=["company", "month"])
+	}
+
+
+def clear_closed_periods():
+	frappe.cache().delete_value(CLOSED_PERIODS_KEY)
+
+
+def is_period_closed(company, date):
+	return bool(company and date) and (company, get_first_day(date)) in get_closed_periods()
+
+
+def open_period_condition(alias):
+	"""SQL condition that the ESG Metric Entry aliased `alias` is not in a closed period"""
+	return f"""NOT EXISTS (
+		SELECT 1 FROM `tabESG Period Close` pc
+		WHERE pc.docstatus = 1 AND pc.company = {alias}.company
+			AND pc.month = DATE_FORMAT({alias}.reporting_period, '%%Y-%%m-01')
+	)"""
+
+
+def get_next_open_period(company, date):
+	"""First day of the first open month after `date`"""
+	month = add_months(get_first_day(date), 1)
+	while is_period_closed(company, month):
+		month = add_months(month, 1)
+	return month
+
+
+def reverse_entry(name):
+	"""Offset an entry of a closed period with a negative copy in the next open period"""
+	entry = frappe.get_doc("ESG Metric Entry", name)
+	month = get_next_open_period(entry.company, entry.reporting_period)
+	reversal = frappe.copy_doc(entry)
+	reversal.update(
+		{
+			"reporting_period": month,
+			"period_from": month,
+			"period_to": get_last_day(month),
+			"entry_date": today(),
+			"value": -flt(entry.value),
+			"measured_value": str(-flt(entry.value)),
+			"variance": None,
+			"variance_": None,
+			"verification_status": "Pending",
+			"verified_by": None,
+			"verification_date": None,
+			"is_anomalous": 0,
+			"data_source": REVERSAL_DATA_SOURCE,
+			"remarks": _("Reverses {0} of the closed period {1}").format(
+				entry.name, getdate(entry.reporting_period).strftime("%B %Y")
+			),
+		}
+	)
+	reversal.insert(ignore_permissions=True)
+	return reversal.name
+
+
+def validate_open_period(doc, method=None):
+	"""validate / on_trash hook for ESG Metric Entry: refuse changes dated in a closed period"""
+	periods = [(doc.company, doc.reporting_period)]
+	before = doc.get_doc_before_save() if method != "on_trash" else None
+	if before:
+		periods.append((before.company, before.reporting_period))
+
+	for company, date in periods:
+		if is_period_closed(company, date):
+			frappe.throw(
+				_("ESG data of {0} for {1} is closed. Cancel the ESG Period Close to change it.").format(
+					company, getdate(date).strftime("%B %Y")
+				),
+				title=_("Period Closed"),
+			)
+
+
+def validate_period_close(doc, method=None):
+	"""validate hook for ESG Period Close: normalize the month and refresh the summary"""
+	doc.month = get_first_day(doc.month)
+	doc.period_end = get_last_day(doc.month)
+	if getdate(doc.period_end) >= getdate(today()):
+		frappe.throw(_("Only months that have ended can be closed"))
+
+	duplicate = frappe.db.exists(
+		"ESG Period Close",
+		{"company": doc.company, "month": doc.month, "docstatus": ["<", 2], "name": ["!=", doc.name]},
+	)
+	if duplicate:
+		frappe.throw(_("{0} already closes {1} for {2}").format(duplicate, doc.month, doc.company))
+
+	summary = frappe.db.sql(
+		"""
+		SELECT COUNT(*), COUNT(DISTINCT metric),
+			SUM(CASE WHEN verification_status = 'Verified' THEN 1 ELSE 0 END),
+			SUM(CASE WHEN verification_status = 'Rejected' THEN 1 ELSE 0 END)
+		FROM `tabESG Metric Entry`
+		WHERE company = %(company)s AND reporting_period BETWEEN %(month)s AND %(period_end)s
+		""",
+		{"company": doc.company, "month": doc.month, "period_end": doc.period_end},
+	)[0]
+	doc.entry_count, doc.metric_count, doc.verified_count, doc.rejected_count = (v or 0 for v in summary)
+
+
+def validate_completeness(doc, method=None):
+	"""before_submit hook for ESG Period Close: the month must be fully verified and reported"""
+	params = {"company": doc.company, "month": doc.month, "period_end": doc.period_end}
+	problems = []
+
+	pending = frappe.db.sql(
+		"""
+		SELECT COUNT(*) FROM `tabESG Metric Entry`
+		WHERE company = %(company)s AND reporting_period BETWEEN %(month)s AND %(period_end)s
+			AND IFNULL(verification_status, 'Pending') = 'Pending'
+		""",
+		params,
+	)[0][0]
+	if pending:
+		problems.append(_("{0} ESG Metric Entries are pending verification").format(pending))
+
+	anomalies = frappe.db.count(
+		"ESG Anomaly",
+		{
+			"company": doc.company,
+			"reporting_period": ["between", [doc.month, doc.period_end]],
+			"status": "Open",
+		},
+	)
+	if anomalies:
+		problems.append(_("{0} ESG Anomalies are still open").format(anomalies))
+
+	missing = frappe.db.sql_list(
+		"""
+		SELECT em.name FROM `tabESG Metric` em
+		WHERE em.active = 1 AND em.frequency = 'Monthly' AND IFNULL(em.company, '') IN ('', %(company)s)
+			AND NOT EXISTS (
+				SELECT 1 FROM `tabESG Metric Entry` e
+				WHERE e.company = %(company)s AND e.reporting_period BETWEEN %(month)s AND %(period_end)s
+					AND e.metric IN (em.name, em.metric_name)
+			)
+		ORDER BY em.name
+		""",
+		params,
+	)
+	if missing:
+		problems.append(_("No entries for: {0}").format(", ".join(missing)))
+
+	if problems:
+		frappe.throw("<br>".join(problems), title=_("Period Incomplete"))
+
+
+def close_period(doc, method=None):
+	"""on_submit hook for ESG Period Close: write the snapshot and freeze the month"""
+	frappe.db.sql(
+		"""
+		INSERT INTO `tabESG Period Snapshot`
+			(name, creation, modified, modified_by, owner, docstatus, idx,
+			period_close, company, metric, month, total_value, entry_count, verified_count, rejected_count)
+		SELECT
+			MD5(CONCAT_WS('|', %(period_close)s, metric)), NOW(), NOW(), %(user)s, %(user)s, 0, 0,
+			%(period_close)s, %(company)s, metric, %(month)s,
+			SUM(value), COUNT(*),
+			SUM(CASE WHEN verification_status = 'Verified' THEN 1 ELSE 0 END),
+			SUM(CASE WHEN verification_status = 'Rejected' THEN 1 ELSE 0 END)
+		FROM `tabESG Metric Entry`
+		WHERE company = %(company)s AND reporting_period BETWEEN %(month)s AND %(period_end)s
+		GROUP BY metric
+		""",
+		{
+			"period_close": doc.name,
+			"user": frappe.session.user,
+			"company": doc.company,
+			"month": doc.month,
+			"period_end": doc.period_end,
+		},
+	)
+	frappe.db.sql(
+		"""
+		UPDATE `tabESG Period Snapshot` ps
+		JOIN `tabESG Metric` em ON em.metric_name = ps.metric OR em.name = ps.metric
+		SET ps.category = em.category
+		WHERE ps.period_close = %(period_close)s
+		""",
+		{"period_close": doc.name},
+	)
+	on_period_change(doc.company)
+
+
+def reopen_period(doc, method=None):
+	"""on_cancel hook for ESG Period Close: drop the snapshot and unfreeze the month"""
+	frappe.db.delete("ESG Period Snapshot", {"period_close": doc.name})
+	on_period_change(doc.company)
+
+
+def on_period_change(company):
+	clear_closed_periods()
+	frappe.db.after_commit.add(clear_closed_periods)
+	invalidate(company=company)
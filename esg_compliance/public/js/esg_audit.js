@@ -0,0 +1,31 @@
+frappe.ui.form.on("ESG Audit", {
+	refresh(frm) {
+		if (frm.doc.docstatus !== 0 || frm.is_new()) return;
+
+		frm.add_custom_button(__("Draw Sample"), () => {
+			const draw = () =>
+				frappe.call({
+					method: "esg_compliance.audit_sampling.draw_audit_sample",
+					args: { audit: frm.doc.name },
+					freeze: true,
+					freeze_message: __("Drawing sample..."),
+					callback(r) {
+						if (!r.message) return;
+						frappe.show_alert({
+							message: __("{0} entries sampled with seed {1}", [r.message.sampled, r.message.seed]),
+							indicator: "green",
+						});
+						frm.reload_doc();
+					},
+				});
+
+			if (frm.is_dirty()) {
+				frm.save().then(draw);
+			} else if ((frm.doc.sampled_entries || []).length) {
+				frappe.confirm(__("Replace the current sample?"), draw);
+			} else {
+				draw();
+			}
+		});
+	},
+});
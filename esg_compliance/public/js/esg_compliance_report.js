@@ -0,0 +1,38 @@
+frappe.ui.form.on("ESG Compliance Report", {
+	setup(frm) {
+		frappe.realtime.on("esg_compliance_report_progress", (data) => {
+			if (data.report !== frm.doc.name) return;
+
+			frappe.show_progress(__("Generating Report"), data.progress, data.total, __(data.message));
+			if (data.progress === data.total) {
+				frappe.hide_progress();
+				frm.reload_doc();
+			}
+		});
+	},
+
+	refresh(frm) {
+		frm.get_field("performance_summary").$wrapper.html(frm.doc.performance_summary_html || "");
+
+		if (frm.doc.docstatus !== 0 || frm.is_new()) return;
+
+		frm.add_custom_button(__("Generate Metrics"), () => {
+			const generate = () =>
+				frappe.call({
+					method: "esg_compliance.compliance_report.generate_compliance_report",
+					args: { report: frm.doc.name },
+					callback() {
+						frappe.show_alert({ message: __("Report generation queued"), indicator: "blue" });
+					},
+				});
+
+			if (frm.is_dirty()) {
+				frm.save().then(generate);
+			} else if ((frm.doc.esg_report_metric || []).length) {
+				frappe.confirm(__("Replace the current metric analysis?"), generate);
+			} else {
+				generate();
+			}
+		});
+	},
+});
@@ -0,0 +1,58 @@
+frappe.ui.form.on("ESG Entry Archive", {
+	refresh(frm) {
+		if (frm.is_new()) return;
+
+		frm.add_custom_button(__("View Entries"), () => {
+			const metrics = Object.keys(JSON.parse(frm.doc.metric_index || "{}"));
+			frappe.prompt(
+				[
+					{ fieldname: "metric", label: __("Metric"), fieldtype: "Select", options: metrics, reqd: 1 },
+					{ fieldname: "party", label: __("Party"), fieldtype: "Data" },
+				],
+				(values) =>
+					frappe.call({
+						method: "esg_compliance.entry_archive.get_archived_entries",
+						args: { archive: frm.doc.name, ...values },
+						callback(r) {
+							show_entries(values.metric, r.message || []);
+						},
+					}),
+				__("Archived Entries"),
+				__("View")
+			);
+		});
+
+		if (frappe.user.has_role("System Manager")) {
+			frm.add_custom_button(__("Restore"), () => {
+				frappe.confirm(__("Move the {0} archived entries back into the database?", [frm.doc.entry_count]), () =>
+					frappe.call({
+						method: "esg_compliance.entry_archive.restore_archive",
+						args: { archive: frm.doc.name },
+						freeze: true,
+						freeze_message: __("Restoring entries..."),
+						callback(r) {
+							frappe.show_alert({ message: __("{0} entries restored", [r.message]), indicator: "green" });
+							frappe.set_route("List", "ESG Entry Archive");
+						},
+					})
+				);
+			});
+		}
+	},
+});
+
+function show_entries(metric, entries) {
+	const fields = ["name", "reporting_period", "value", "unit", "party", "source_document", "verification_status"];
+	const rows = entries
+		.map((entry) => `<tr>${fields.map((f) => `<td>${frappe.utils.escape_html(String(entry[f] ?? ""))}</td>`).join("")}</tr>`)
+		.join("");
+
+	frappe.msgprint({
+		title: __("{0}: {1} entries", [metric, entries.length]),
+		wide: true,
+		message: `<table class="table table-bordered table-sm">
+			<thead><tr>${fields.map((f) => `<th>${__(frappe.unscrub(f))}</th>`).join("")}</tr></thead>
+			<tbody>${rows}</tbody>
+		</table>`,
+	});
+}
@@ -0,0 +1,76 @@
+frappe.listview_settings["ESG Metric Entry"] = {
+	add_fields: ["is_anomalous", "verification_status"],
+	get_indicator(doc) {
+		if (doc.is_anomalous) {
+			return [__("Anomalous"), "red", "is_anomalous,=,1"];
+		}
+		const colors = { Pending: "orange", Verified: "green", Rejected: "gray" };
+		const status = doc.verification_status || "Pending";
+		return [__(status), colors[status], `verification_status,=,${status}`];
+	},
+	onload(listview) {
+		["Verify", "Reject", "Reopen"].forEach((action) => {
+			listview.page.add_actions_menu_item(__(action), () => {
+				const names = listview.get_checked_items(true);
+				const filters = names.length ? null : listview.get_filters_for_args();
+				const message = names.length
+					? __("{0} {1} selected entries?", [__(action), names.length])
+					: __("{0} all entries matching the current filters?", [__(action)]);
+
+				frappe.confirm(message, () => apply_bulk_transition(listview, action, names, filters));
+			});
+		});
+
+		listview.page.add_menu_item(__("Bulk Import (CSV / JSONL)"), () => {
+			new frappe.ui.FileUploader({
+				restrictions: { allowed_file_types: [".csv", ".jsonl", ".ndjson"] },
+				make_attachments_public: false,
+				on_success(file) {
+					frappe.call({
+						method: "esg_compliance.metric_import.import_metric_entries",
+						args: { file_url: file.file_url },
+						callback(r) {
+							frappe.show_alert({ message: __("Import queued"), indicator: "blue" });
+							frappe.set_route("Form", "ESG Metric Import Log", r.message);
+						},
+					});
+				},
+			});
+		});
+	},
+};
+
+function apply_bulk_transition(listview, action, names, filters) {
+	frappe.realtime.off("esg_bulk_verification_progress");
+	frappe.realtime.on("esg_bulk_verification_progress", (data) => {
+		frappe.show_progress(__("Updating ESG Metric Entries"), data.progress, data.total);
+		if (data.progress === data.total) {
+			frappe.hide_progress();
+			listview.refresh();
+		}
+	});
+
+	frappe.call({
+		method: "esg_compliance.verification.bulk_apply_transition",
+		args: { action, names, filters },
+		freeze: true,
+		freeze_message: __("Updating ESG Metric Entries..."),
+		callback(r) {
+			const result = r.message || {};
+			if (result.queued) {
+				frappe.show_alert({
+					message: __("{0} entries queued for {1}", [result.total, __(action)]),
+					indicator: "blue",
+				});
+				return;
+			}
+
+			frappe.show_alert({
+				message: __("{0} updated, {1} skipped", [result.updated, result.skipped]),
+				indicator: result.skipped ? "orange" : "green",
+			});
+			listview.clear_checked_items();
+			listview.refresh();
+		},
+	});
+}
@@ -0,0 +1,210 @@
+# Copyright (c) 2025, K. Ronoh and contributors
+# For license information, please see license.txt
+
+"""Compiled ESG Report Templates.
+
+A template is a list of section rows, each selecting one metric or every
+active metric of a category, with a period, grouping and aggregation. It is
+compiled once into a plan (resolved metrics, the values they are stored under
+in `ESG Metric Series`, and the periods used) and kept in Redis until the
+template or any ESG Metric changes.
+
+Rendering a plan for any number of companies reads the series in a single
+query covering every metric and period of the template.
+"""
+
+import frappe
+from frappe import _
+from frappe.utils import add_months, cint, flt, get_first_day, get_last_day, getdate
+
+from esg_compliance.period_close import MONTHLY_TOTALS
+
+PLANS_KEY = "esg_compliance:report_template_plans"
+
+PERIODS = ("Report Period", "Previous Period", "Same Period Last Year")
+
+
+def get_template_plan(template):
+	return frappe.cache().hget(PLANS_KEY, template, generator=lambda: compile_template(template))
+
+
+def clear_template_plan(doc, method=None):
+	"""on_update / on_trash hook for ESG Report Template"""
+	frappe.cache().hdel(PLANS_KEY, doc.name)
+
+
+def clear_template_plans(doc=None, method=None):
+	"""on_update / on_trash hook for ESG Metric: metric names and categories feed every plan"""
+	frappe.cache().delete_value(PLANS_KEY)
+
+
+def compile_template(template):
+	doc = frappe.get_doc("ESG Report Template", template)
+	by_category = {}
+	for metric in frappe.get_all(
+		"ESG Metric", filters={"active": 1}, fields=["name", "category"], order_by="metric_name asc"
+	):
+		by_category.setdefault(metric.category, []).append(metric.name)
+
+	metrics, sections = {}, {}
+	for row in doc.sections:
+		names = [row.metric] if row.metric else by_category.get(row.category, [])
+		section = sections.setdefault(row.section_title, {"title": row.section_title, "items": []})
+		for name in names:
+			metrics[name] = None
+			section["items"].append(
+				{
+					"metric": name,
+					"period": row.period or "Report Period",
+					"group_by": row.group_by or "None",
+					"aggregation": row.aggregation or "Sum",
+				}
+			)
+
+	# Metrics picked by name may be inactive, so read them all again
+	details = {
+		m.name: m
+		for m in frappe.get_all(
+			"ESG Metric",
+			filters={"name": ["in", list(metrics) or [""]]},
+			fields=["name", "metric_name", "unit"],
+		)
+	}
+	for name in metrics:
+		metric = details.get(name) or frappe._dict(name=name)
+		metrics[name] = {
+			"label": metric.metric_name or name,
+			"unit": metric.unit,
+			"keys": sorted({name, metric.metric_name or name}),
+		}
+
+	return {
+		"template": template,
+		"metrics": metrics,
+		"sections": list(sections.values()),
+		"periods": sorted(
+			{item["period"] for s in sections.values() for item in s["items"]}, key=PERIODS.index
+		),
+	}
+
+
+def get_windows(from_date, to_date, periods):
+	"""Whole-month (start, end) of each period relative to the report period"""
+	from_date, to_date = get_first_day(from_date), get_last_day(to_date)
+	months = (to_date.year - from_date.year) * 12 + to_date.month - from_date.month + 1
+	windows = {
+		"Report Period": (from_date, to_date),
+		"Previous Period": (add_months(from_date, -months), get_last_day(add_months(from_date, -1))),
+		"Same Period Last Year": (add_months(from_date, -12), get_last_day(add_months(to_date, -12))),
+	}
+	return {period: windows[period] for period in periods}
+
+
+def fetch_series(plan, windows, companies=None):
+	"""{metric: {company: [(month, total, count)]}} for every metric and period of the plan, in one query"""
+	key_to_metric = {key: name for name, metric in plan["metrics"].items() for key in metric["keys"]}
+	if not key_to_metric or not windows:
+		return {}
+
+	conditions = ["metric IN %(keys)s", "month BETWEEN %(start)s AND %(end)s"]
+	if companies:
+		conditions.append("company IN %(companies)s")
+
+	rows = frappe.db.sql(
+		f"""
+		SELECT company, metric, month, total_value, entry_count
+		FROM {MONTHLY_TOTALS} s
+		WHERE {" AND ".join(conditions)}
+		""",
+		{
+			"keys": tuple(key_to_metric),
+			"start": min(start for start, _end in windows.values()),
+			"end": max(end for _start, end in windows.values()),
+			"companies": tuple(companies or ()),
+		},
+	)
+
+	series = {}
+	for company, key, month, total, count in rows:
+		by_company = series.setdefault(key_to_metric[key], {})
+		by_company.setdefault(company or "", []).append((getdate(month), flt(total), count or 0))
+	return series
+
+
+def get_group(group_by, company, month):
+	"""(sort key, label) of the group a series point falls into"""
+	if group_by == "Month":
+		return (month, month.strftime("%b %Y"))
+	if group_by == "Quarter":
+		quarter = (month.month - 1) // 3 + 1
+		return ((month.year, quarter), f"Q{quarter} {month.year}")
+	if group_by == "Company":
+		return (company, company)
+	return ("", "")
+
+
+def aggregate(points, aggregation):
+	total = sum(p[0] for p in points)
+	if aggregation == "Average":
+		count = sum(p[1] for p in points)
+		return total / count if count else 0
+	return total
+
+
+def render_plan(plan, from_date, to_date, companies=None, consolidate=False):
+	"""{company: [section]} for the given companies, or {"": [section]} across them when consolidating"""
+	windows = get_windows(from_date, to_date, plan["periods"])
+	series = fetch_series(plan, windows, companies)
+
+	targets = (
+		[""]
+		if consolidate
+		else (companies or sorted({c for by_company in series.values() for c in by_company}))
+	)
+	output = {}
+	for target in targets:
+		sections = []
+		for section in plan["sections"]:
+			rows = []
+			for item in section["items"]:
+				start, end = windows[item["period"]]
+				groups = {}
+				for company, points in series.get(item["metric"], {}).items():
+					if target and company != target:
+						continue
+					for month, total, count in points:
+						if start <= month <= end:
+							groups.setdefault(get_group(item["group_by"], company, month), []).append(
+								(total, count)
+							)
+
+				metric = plan["metrics"][item["metric"]]
+				for (_key, group), points in sorted(groups.items()) or [(("", ""), [])]:
+					rows.append(
+						{
+							"metric": item["metric"],
+							"metric_name": metric["label"],
+							"unit": metric["unit"],
+							"period": _(item["period"]),
+							"group": group,
+							"value": flt(aggregate(points, item["aggregation"]), 3),
+						}
+					)
+			sections.append({"title": section["title"], "rows": rows})
+		output[target] = sections
+
+	return output
+
+
+@frappe.whitelist()
+def get_template_data(template, from_date, to_date, companies=None, consolidate=False):
+	frappe.has_permission("ESG Report Template", "read", template, throw=True)
+	companies = frappe.parse_json(companies) if isinstance(companies, str) else companies
+
+	# Only companies the user may read, whether requested or not
+	permitted = frappe.get_list("Company", pluck="name", limit_page_length=0)
+	companies = [c for c in companies if c in permitted] if companies else permitted
+	if not companies:
+		frappe.throw(_("Not permitted to read ESG data of these companies"), frappe.PermissionError)
+
+	return render_plan(get_template_plan(template), from_date, to_date, companies, cint(consolidate))
@@ -0,0 +1,258 @@
+# Copyright (c) 2025, K. Ronoh and contributors
+# For license information, please see license.txt
+
+"""Rolling 12 month carbon profile per supplier.
+
+Submitted Purchase Invoices are folded into `tabESG Supplier Carbon Bucket`, one
+row per (supplier, month), and the rolling emissions, spend and intensity on the
+Supplier are adjusted by the same delta. Ranking and rating suppliers is then a
+read of a few Supplier columns instead of a scan over all purchase history.
+
+Months leave the window without any invoice being touched, so a nightly
+compaction recomputes the Supplier totals from the buckets of the window and
+drops buckets older than `RETENTION_MONTHS`.
+"""
+
+import hashlib
+
+import frappe
+from frappe.utils import add_months, cint, flt, get_first_day, getdate, now_datetime
+
+WINDOW_MONTHS = 12
+
+# Buckets kept behind the window, so late cancellations still find their month
+RETENTION_MONTHS = 24
+
+EMISSIONS_FIELD = "custom_rolling_12_month_emissions_kg_co2e"
+SPEND_FIELD = "custom_rolling_12_month_spend"
+INTENSITY_FIELD = "custom_carbon_intensity_kg_co2e_per_currency_unit"
+ANNUAL_TONNES_FIELD = "custom_annual_carbon_emissions_tonnes_co2e"
+RATING_FIELD = "custom_carbon_intensity_rating"
+
+# Upper bound of kg CO2e per unit of spend for each rating; anything above is the last rating
+INTENSITY_RATINGS = (
+	(0.1, "A - Excellent"),
+	(0.25, "B - Good"),
+	(0.5, "C - Average"),
+	(1.0, "D - Poor"),
+)
+WORST_RATING = "E - Very Poor"
+
+
+def get_window_start(date=None):
+	"""First day of the oldest month in the rolling window ending at `date`"""
+	return get_first_day(add_months(getdate(date), -(WINDOW_MONTHS - 1)))
+
+
+def get_rating_sql(spend, emissions):
+	"""SQL expression rating the intensity of the given spend and emissions columns"""
+	cases = " ".join(
+		f"WHEN {emissions} <= {bound} * {spend} THEN '{rating}'" for bound, rating in INTENSITY_RATINGS
+	)
+	return f"CASE WHEN {spend} <= 0 THEN NULL {cases} ELSE '{WORST_RATING}' END"
+
+
+def get_intensity_sql(spend, emissions):
+	return f"IF({spend} > 0, {emissions} / {spend}, 0)"
+
+
+def update_supplier_profile(doc, method=None):
+	"""on_submit hook for Purchase Invoice"""
+	apply_invoice(doc, 1)
+
+
+def revert_supplier_profile(doc, method=None):
+	"""on_cancel hook for Purchase Invoice"""
+	apply_invoice(doc, -1)
+
+
+def apply_invoice(doc, sign):
+	emissions = sign * flt(doc.get("custom_total_carbon_emissions_kg_co2e"))
+	spend = sign * flt(doc.base_net_total)
+	if not doc.supplier or not (emissions or spend):
+		return
+
+	month = get_first_day(doc.posting_date)
+	add_to_bucket(doc.supplier, month, emissions, spend, sign)
+
+	if month >= get_window_start():
+		add_to_supplier(doc.supplier, emissions, spend)
+
+
+def add_to_bucket(supplier, month, emissions, spend, count):
+	now, user = now_datetime(), frappe.session.user
+	frappe.db.sql(
+		"""
+		INSERT INTO `tabESG Supplier Carbon Bucket`
+			(name, creation, modified, owner, modified_by, supplier, month, emissions_kg_co2e, spend, invoice_count)
+		VALUES (%(name)s, %(now)s, %(now)s, %(user)s, %(user)s, %(supplier)s, %(month)s, %(emissions)s, %(spend)s, %(count)s)
+		ON DUPLICATE KEY UPDATE
+			emissions_kg_co2e = emissions_kg_co2e + VALUES(emissions_kg_co2e),
+			spend = spend + VALUES(spend),
+			invoice_count = invoice_count + VALUES(invoice_count),
+			modified = VALUES(modified),
+			modified_by = VALUES(modified_by)
+		""",
+		{
+			"name": get_bucket_name(supplier, month),
+			"now": now,
+			"user": user,
+			"supplier": supplier,
+			"month": month,
+			"emissions": emissions,
+			"spend": spend,
+			"count": count,
+		},
+	)
+
+
+def get_bucket_name(supplier, month):
+	"""Deterministic name, so concurrent submits for the same month meet on the primary key"""
+	return hashlib.sha1(f"{supplier}:{month}".encode()).hexdigest()[:10]
+
+
+def add_to_supplier(supplier, emissions, spend):
+	"""Adjust the rolling totals of one supplier and re-derive intensity and rating in place"""
+	# MariaDB applies SET assignments left to right, so the derived columns read the old totals
+	emissions_sql = f"{EMISSIONS_FIELD} + %(emissions)s"
+	spend_sql = f"{SPEND_FIELD} + %(spend)s"
+	frappe.db.sql(
+		f"""
+		UPDATE `tabSupplier`
+		SET
+			{INTENSITY_FIELD} = {get_intensity_sql(spend_sql, emissions_sql)},
+			{RATING_FIELD} = {get_rating_sql(spend_sql, emissions_sql)},
+			{ANNUAL_TONNES_FIELD} = ({emissions_sql}) / 1000,
+			{EMISSIONS_FIELD} = {emissions_sql},
+			{SPEND_FIELD} = {spend_sql}
+		WHERE name = %(supplier)s
+		""",
+		{"supplier": supplier, "emissions": emissions, "spend": spend},
+	)
+
+
+def compact_supplier_profiles():
+	"""Nightly: recompute every rolling profile from the window's buckets and drop stale buckets"""
+	window_start = get_window_start()
+	frappe.db.sql(
+		f"""
+		UPDATE `tabSupplier` s
+		LEFT JOIN (
+			SELECT supplier, SUM(emissions_kg_co2e) as emissions, SUM(spend) as spend
+			FROM `tabESG Supplier Carbon Bucket`
+			WHERE month >= %(window_start)s
+			GROUP BY supplier
+		) b ON b.supplier = s.name
+		SET
+			s.{EMISSIONS_FIELD} = IFNULL(b.emissions, 0),
+			s.{SPEND_FIELD} = IFNULL(b.spend, 0),
+			s.{ANNUAL_TONNES_FIELD} = IFNULL(b.emissions, 0) / 1000,
+			s.{INTENSITY_FIELD} = {get_intensity_sql("IFNULL(b.spend, 0)", "IFNULL(b.emissions, 0)")},
+			s.{RATING_FIELD} = IF(b.supplier IS NULL, s.{RATING_FIELD},
+				{get_rating_sql("b.spend", "b.emissions")})
+		WHERE b.supplier IS NOT NULL OR s.{SPEND_FIELD} != 0 OR s.{EMISSIONS_FIELD} != 0
+		""",
+		{"window_start": window_start},
+	)
+
+	frappe.db.delete(
+		"ESG Supplier Carbon Bucket",
+		{"month": ["<", add_months(window_start, -(RETENTION_MONTHS - WINDOW_MONTHS))]},
+	)
+	frappe.db.commit()
+
+
+def rebuild_supplier_buckets():
+	"""Rebuild every bucket from submitted Purchase Invoices, then recompute the profiles"""
+	frappe.db.sql("DELETE FROM `tabESG Supplier Carbon Bucket`")
+
+	since = add_months(get_window_start(), -(RETENTION_MONTHS - WINDOW_MONTHS))
+	rows = frappe.db.sql(
+		"""
+		SELECT
+			supplier,
+			DATE_FORMAT(posting_date, '%%Y-%%m-01') as month,
+			SUM(IFNULL(custom_total_carbon_emissions_kg_co2e, 0)) as emissions,
+			SUM(base_net_total) as spend,
+			COUNT(*) as invoice_count
+		FROM `tabPurchase Invoice`
+		WHERE docstatus = 1 AND posting_date >= %(since)s
+		GROUP BY supplier, month
+		""",
+		{"since": since},
+		as_dict=True,
+	)
+
+	if rows:
+		now, user = now_datetime(), frappe.session.user
+		frappe.db.bulk_insert(
+			"ESG Supplier Carbon Bucket",
+			fields=[
+				"name",
+				"creation",
+				"modified",
+				"owner",
+				"modified_by",
+				"supplier",
+				"month",
+				"emissions_kg_co2e",
+				"spend",
+				"invoice_count",
+			],
+			values=[
+				(
+					get_bucket_name(row.supplier, getdate(row.month)),
+					now,
+					now,
+					user,
+					user,
+					row.supplier,
+					getdate(row.month),
+					flt(row.emissions),
+					flt(row.spend),
+					cint(row.invoice_count),
+				)
+				for row in rows
+			],
+		)
+
+	compact_supplier_profiles()
+
+
+def build_missing_supplier_buckets():
+	"""after_migrate: build the buckets once, when the table and Supplier fields exist but hold nothing yet"""
+	if (
+		not frappe.db.table_exists("ESG Supplier Carbon Bucket")
+		or not all(
+			frappe.db.has_column("Supplier", f)
+			for f in (EMISSIONS_FIELD, SPEND_FIELD, INTENSITY_FIELD, ANNUAL_TONNES_FIELD, RATING_FIELD)
+		)
+		or not frappe.db.has_column("Purchase Invoice", "custom_total_carbon_emissions_kg_co2e")
+	):
+		return
+
+	if not frappe.db.count("ESG Supplier Carbon Bucket"):
+		rebuild_supplier_buckets()
+
+
+@frappe.whitelist()
+def get_supplier_ranking(limit=20, order_by="intensity"):
+	"""Suppliers ranked by their stored rolling profile, highest first"""
+	sort_field = {"intensity": INTENSITY_FIELD, "emissions": EMISSIONS_FIELD}.get(order_by)
+	if not sort_field:
+		frappe.throw(frappe._("Invalid sort order {0}").format(order_by))
+
+	return frappe.get_list(
+		"Supplier",
+		filters={SPEND_FIELD: [">", 0]},
+		fields=[
+			"name",
+			"supplier_name",
+			f"{EMISSIONS_FIELD} as emissions_kg_co2e",
+			f"{SPEND_FIELD} as spend",
+			f"{INTENSITY_FIELD} as intensity",
+			f"{RATING_FIELD} as rating",
+		],
+		order_by=f"{sort_field} desc",
+		limit_page_length=cint(limit),
+	)
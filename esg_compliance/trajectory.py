@@ -0,0 +1,131 @@
+# Copyright (c) 2025, K. Ronoh and contributors
+# For license information, please see license.txt
+
+"""Net-zero emission trajectory per company.
+
+The Company baseline (tonnes CO2e in the baseline year), annual reduction target
+and net-zero year are turned into monthly targets in kg CO2e and stored in
+`tabESG Emission Trajectory`, so reports join against them instead of
+recomputing the curve per row.
+
+The annual target compounds the reduction rate from the baseline year and, when
+a net-zero year is set, never exceeds the straight line from the baseline down
+to zero in that year.
+"""
+
+import frappe
+from frappe.utils import cint, flt, getdate, now_datetime
+
+from esg_compliance.cache import invalidate
+from esg_compliance.utils import get_metric_entry_keys
+
+TRAJECTORY_FIELDS = (
+	"custom_baseline_year",
+	"custom_baseline_emissions_tonnes_co2e",
+	"custom_annual_emission_reduction_target_",
+	"custom_net_zero_target_year",
+)
+
+# Years generated when no net-zero year is set
+DEFAULT_HORIZON_YEARS = 30
+
+# Entries from these metrics are estimates, not actual emissions
+ESTIMATE_METRICS = ("Production Planning Carbon Impact",)
+
+
+def get_emission_metrics():
+	"""Values of `ESG Metric Entry.metric` that are actual emissions, per ESG Metric.counts_toward_net_zero"""
+	metrics = frappe.get_all("ESG Metric", filters={"counts_toward_net_zero": 1}, pluck="name")
+	if not metrics:
+		return []
+
+	return [key for key in get_metric_entry_keys(metrics) if key not in ESTIMATE_METRICS]
+
+
+def get_annual_targets(baseline_year, baseline_tonnes, reduction_rate=0, net_zero_year=None):
+	"""Return {year: target kg CO2e} from the baseline year up to the net-zero year"""
+	baseline_year, net_zero_year = cint(baseline_year), cint(net_zero_year)
+	baseline = flt(baseline_tonnes) * 1000
+	rate = flt(reduction_rate) / 100
+	if not baseline_year or baseline <= 0:
+		return {}
+
+	last_year = net_zero_year if net_zero_year > baseline_year else baseline_year + DEFAULT_HORIZON_YEARS
+
+	targets = {}
+	for year in range(baseline_year, last_year + 1):
+		elapsed = year - baseline_year
+		target = baseline * (1 - rate) ** elapsed
+		if net_zero_year > baseline_year:
+			target = min(target, baseline * (net_zero_year - year) / (net_zero_year - baseline_year))
+		targets[year] = max(0.0, target)
+
+	return targets
+
+
+def regenerate_trajectory(company):
+	"""Replace the stored trajectory of a company with one multi-row insert"""
+	values = frappe.db.get_value("Company", company, TRAJECTORY_FIELDS, as_dict=True)
+	targets = get_annual_targets(*(values.get(f) for f in TRAJECTORY_FIELDS)) if values else {}
+
+	frappe.db.delete("ESG Emission Trajectory", {"company": company})
+	invalidate(company=company)
+	if not targets:
+		return 0
+
+	now, user = now_datetime(), frappe.session.user
+	rows = [
+		(
+			frappe.generate_hash(length=10),
+			now,
+			now,
+			user,
+			user,
+			company,
+			getdate(f"{year}-{month:02d}-01"),
+			flt(annual / 12, 3),
+			flt(annual, 3),
+		)
+		for year, annual in targets.items()
+		for month in range(1, 13)
+	]
+	frappe.db.bulk_insert(
+		"ESG Emission Trajectory",
+		fields=[
+			"name",
+			"creation",
+			"modified",
+			"owner",
+			"modified_by",
+			"company",
+			"month",
+			"target_emissions",
+			"annual_target",
+		],
+		values=rows,
+	)
+	return len(rows)
+
+
+def on_company_update(doc, method=None):
+	"""on_update hook for Company: regenerate the trajectory when its inputs change"""
+	if any(doc.has_value_changed(f) for f in TRAJECTORY_FIELDS if doc.meta.has_field(f)):
+		regenerate_trajectory(doc.name)
+
+
+def rebuild_all_trajectories():
+	for company in frappe.get_all("Company", pluck="name"):
+		regenerate_trajectory(company)
+
+
+def build_missing_trajectories():
+	"""after_migrate: generate the trajectory of companies that do not have one yet"""
+	if not frappe.db.table_exists("ESG Emission Trajectory") or not all(
+		frappe.db.has_column("Company", f) for f in TRAJECTORY_FIELDS
+	):
+		return
+
+	built = set(frappe.get_all("ESG Emission Trajectory", pluck="company", distinct=True))
+	for company in frappe.get_all("Company", filters={"custom_baseline_year": ["is", "set"]}, pluck="name"):
+		if company not in built:
+			regenerate_trajectory(company)
@@ -0,0 +1,74 @@
+# Copyright (c) 2025, K. Ronoh and contributors
+# For license information, please see license.txt
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import frappe
+from frappe import _
+
+
+def check_company_access(company=None, doctype="ESG Metric Entry"):
+	"""Throw unless the user may read `doctype` and, when given, `company`"""
+	frappe.has_permission(doctype, "read", throw=True)
+	if company and not frappe.get_list("Company", filters={"name": company}, pluck="name"):
+		frappe.throw(_("Not permitted to read ESG data of {0}").format(company), frappe.PermissionError)
+
+
+def get_metric_entry_keys(metrics=None):
+	"""Map the values stored in `ESG Metric Entry.metric` to ESG Metric names.
+
+	System generated entries store the metric name (e.g. "Carbon Footprint")
+	rather than the ESG Metric document name, so both are accepted.
+	"""
+	filters = {"name": ["in", list(metrics)]} if metrics else {}
+	keys = {}
+	for metric in frappe.get_all("ESG Metric", filters=filters, fields=["name", "metric_name"]):
+		keys[metric.name] = metric.name
+		if metric.metric_name:
+			keys.setdefault(metric.metric_name, metric.name)
+
+	return keys
+
+
+def run_concurrently(tasks, max_workers=4):
+	"""Run independent callables on a thread pool, each with its own DB connection.
+
+	`tasks` maps a key to `(callable, kwargs)`. Returns a dict mapping each key to
+	`{"data": ..., "time": seconds}`, or `{"error": ..., "time": seconds}` if the
+	callable raised.
+	"""
+	site = frappe.local.site
+	sites_path = frappe.local.sites_path
+	user = frappe.session.user
+
+	with ThreadPoolExecutor(max_workers=max_workers) as executor:
+		futures = {
+			key: executor.submit(_run_in_site_context, site, sites_path, user, fn, kwargs)
+			for key, (fn, kwargs) in tasks.items()
+		}
+		results = {key: future.result() for key, future in futures.items()}
+
+	# Errors are logged from the calling thread, which still holds a usable connection
+	for key, result in results.items():
+		if "traceback" in result:
+			frappe.log_error(message=result.pop("traceback"), title=f"ESG: {key} failed")
+
+	return results
+
+
+def _run_in_site_context(site, sites_path, user, fn, kwargs):
+	frappe.init(site=site, sites_path=sites_path)
+	start = time.monotonic()
+	try:
+		frappe.connect()
+		frappe.set_user(user)
+		return {"data": fn(**kwargs), "time": round(time.monotonic() - start, 4)}
+	except Exception as e:
+		return {
+			"error": str(e),
+			"traceback": frappe.get_traceback(),
+			"time": round(time.monotonic() - start, 4),
+		}
+	finally:
+		frappe.destroy()
@@ -0,0 +1,200 @@
+# Copyright (c) 2025, K. Ronoh and contributors
+# For license information, please see license.txt
+
+"""Bulk transitions of the "ESG Metric Verification" workflow.
+
+Entries are processed in chunks. Each chunk is one transaction: permissions
+are checked once for the whole chunk, the transition is applied with a single
+UPDATE and the affected ESG Metric Series buckets (including their verified and
+rejected counters) are recomputed together.
+"""
+
+import time
+
+import frappe
+from frappe import _
+from frappe.utils import get_first_day, getdate, now_datetime
+
+from esg_compliance.cache import invalidate
+from esg_compliance.metric_series import refresh_buckets
+from esg_compliance.period_close import is_period_closed
+
+WORKFLOW = "ESG Metric Verification"
+
+CHUNK_SIZE = 1000
+
+# Larger batches are run in the long queue instead of the request
+SYNC_LIMIT = 5000
+
+# Used when the workflow has not been created on the site: only System Managers
+# verify, and never their own entries
+VERIFIER_ROLE = "System Manager"
+DEFAULT_TRANSITIONS = [
+	frappe._dict(
+		state="Pending", action="Verify", next_state="Verified", allowed=VERIFIER_ROLE, allow_self_approval=0
+	),
+	frappe._dict(
+		state="Pending", action="Reject", next_state="Rejected", allowed=VERIFIER_ROLE, allow_self_approval=0
+	),
+	frappe._dict(
+		state="Rejected", action="Reopen", next_state="Pending", allowed=VERIFIER_ROLE, allow_self_approval=1
+	),
+]
+
+
+def get_transitions(action, user=None):
+	"""Workflow transitions for `action` that `user` may apply"""
+	if frappe.db.exists("Workflow", WORKFLOW):
+		transitions = frappe.get_cached_doc("Workflow", WORKFLOW).transitions
+	else:
+		transitions = DEFAULT_TRANSITIONS
+
+	roles = set(frappe.get_roles(user))
+	allowed = [
+		t
+		for t in transitions
+		if t.action == action
+		and ("System Manager" in roles or not t.allowed or roles & set(t.allowed.split(",")))
+	]
+	if not allowed:
+		frappe.throw(_("Not permitted to {0} ESG Metric Entries").format(_(action)), frappe.PermissionError)
+
+	return allowed
+
+
+@frappe.whitelist()
+def bulk_apply_transition(action, names=None, filters=None):
+	"""Apply a verification workflow action to the selected or filtered entries"""
+	if isinstance(names, str):
+		names = frappe.parse_json(names)
+	if isinstance(filters, str):
+		filters = frappe.parse_json(filters)
+
+	get_transitions(action)
+	if not names:
+		names = frappe.get_list("ESG Metric Entry", filters=filters or {}, pluck="name", limit_page_length=0)
+
+	if len(names) > SYNC_LIMIT:
+		job = frappe.enqueue(
+			apply_transition,
+			queue="long",
+			timeout=3600,
+			action=action,
+			names=names,
+			user=frappe.session.user,
+			publish_progress=True,
+		)
+		return {"queued": True, "job_id": job.id if job else None, "total": len(names)}
+
+	return apply_transition(action, names)
+
+
+def apply_transition(action, names, user=None, publish_progress=False):
+	"""Apply `action` to `names` chunk by chunk and return per-chunk timings"""
+	user = user or frappe.session.user
+	if user != frappe.session.user:
+		frappe.set_user(user)
+
+	transitions = get_transitions(action, user)
+	chunks = [names[i : i + CHUNK_SIZE] for i in range(0, len(names), CHUNK_SIZE)]
+
+	result = {"action": action, "total": len(names), "updated": 0, "skipped": 0, "chunks": []}
+	for idx, chunk in enumerate(chunks):
+		start = time.monotonic()
+		try:
+			updated = apply_transition_to_chunk(chunk, transitions, user)
+			frappe.db.commit()
+		except Exception:
+			frappe.db.rollback()
+			frappe.log_error(message=frappe.get_traceback(), title="ESG Bulk Verification Error")
+			updated, error = 0, True
+		else:
+			error = False
+
+		result["updated"] += updated
+		result["skipped"] += len(chunk) - updated
+		result["chunks"].append(
+			{
+				"chunk": idx + 1,
+				"entries": len(chunk),
+				"updated": updated,
+				"failed": error,
+				"time": round(time.monotonic() - start, 4),
+			}
+		)
+
+		if publish_progress:
+			frappe.publish_realtime(
+				"esg_bulk_verification_progress",
+				{"progress": idx + 1, "total": len(chunks), "updated": result["updated"]},
+				user=user,
+			)
+
+	return result
+
+
+def apply_transition_to_chunk(names, transitions, user):
+	"""Apply the transition to one chunk in a single UPDATE; returns the number of entries changed"""
+	if not frappe.has_permission("ESG Metric Entry", "write", user=user):
+		frappe.throw(_("Not permitted to update ESG Metric Entries"), frappe.PermissionError)
+
+	# One permission query for the whole chunk: the entries this user can access.
+	# Entries of closed periods are frozen and counted as skipped.
+	permitted = [
+		d
+		for d in frappe.get_list(
+			"ESG Metric Entry",
+			filters={"name": ["in", names]},
+			fields=["name", "owner", "verification_status", "company", "metric", "reporting_period"],
+			limit_page_length=0,
+		)
+		if not is_period_closed(d.company, d.reporting_period)
+	]
+
+	now = now_datetime()
+	updated = 0
+	buckets, companies = set(), set()
+	for transition in transitions:
+		entries = [
+			d
+			for d in permitted
+			if (d.verification_status or "Pending") == transition.state
+			and (transition.allow_self_approval or d.owner != user)
+		]
+		if not entries:
+			continue
+
+		# Reopening clears the verifier but keeps the original verification due date
+		reviewed = transition.next_state != "Pending"
+		frappe.db.sql(
+			f"""
+			UPDATE `tabESG Metric Entry`
+			SET verification_status = %(next_state)s,
+				verified_by = %(verified_by)s,
+				{"verification_date = %(today)s," if reviewed else ""}
+				modified = %(now)s,
+				modified_by = %(user)s
+			WHERE name IN %(names)s AND IFNULL(verification_status, 'Pending') = %(state)s
+			""",
+			{
+				"next_state": transition.next_state,
+				"verified_by": user if reviewed else None,
+				"today": getdate(now),
+				"now": now,
+				"user": user,
+				"names": tuple(d.name for d in entries),
+				"state": transition.state,
+			},
+		)
+		updated += frappe.db.sql("SELECT ROW_COUNT()")[0][0]
+
+		for d in entries:
+			companies.add(d.company or "")
+			if d.reporting_period:
+				buckets.add((d.company or "", d.metric, str(get_first_day(d.reporting_period))))
+
+	# Roll the new verified / rejected counts into the materialized series
+	refresh_buckets(buckets)
+	for company in companies:
+		invalidate(company=company)
+	return updated